@@ -7,14 +7,12 @@ import spamwatch
 import telegram.ext as tg
 from telethon import TelegramClient
 
+from SaitamaRobot.logs import setup_logging
+
 StartTime = time.time()
 
 # enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler('log.txt'),
-              logging.StreamHandler()],
-    level=logging.INFO)
+setup_logging()
 
 LOGGER = logging.getLogger(__name__)
 
@@ -75,9 +73,36 @@ if ENV:
     DONATION_LINK = os.environ.get('DONATION_LINK')
     LOAD = os.environ.get("LOAD", "").split()
     NO_LOAD = os.environ.get("NO_LOAD", "translation").split()
+    LAZY_MODULES = os.environ.get(
+        "LAZY_MODULES", "math speed_test stickers gtranslator").split()
+    STARTUP_WORKERS = int(os.environ.get('STARTUP_WORKERS', 4))
     DEL_CMDS = bool(os.environ.get('DEL_CMDS', False))
     STRICT_GBAN = bool(os.environ.get('STRICT_GBAN', False))
     WORKERS = int(os.environ.get('WORKERS', 8))
+    USER_FLUSH_INTERVAL = float(os.environ.get('USER_FLUSH_INTERVAL', 5))
+    USER_FLUSH_BATCH = int(os.environ.get('USER_FLUSH_BATCH', 500))
+    ADMIN_CACHE_SIZE = int(os.environ.get('ADMIN_CACHE_SIZE', 20000))
+    ADMIN_CACHE_TTL = int(os.environ.get('ADMIN_CACHE_TTL', 60 * 10))
+    ADMIN_CACHE_REFRESH = int(os.environ.get('ADMIN_CACHE_REFRESH', 0))
+    CHAT_PROFILE_CACHE_SIZE = int(
+        os.environ.get('CHAT_PROFILE_CACHE_SIZE', 20000))
+    CHAT_CACHE_SIZE = int(os.environ.get('CHAT_CACHE_SIZE', 20000))
+    CHAT_CACHE_TTL = int(os.environ.get('CHAT_CACHE_TTL', 0))
+    CACHE_SNAPSHOT = os.environ.get('CACHE_SNAPSHOT', None)
+    CACHE_SNAPSHOT_INTERVAL = int(
+        os.environ.get('CACHE_SNAPSHOT_INTERVAL', 600))
+    ASYNC_MODULES = os.environ.get("ASYNC_MODULES", "").split()
+    ASYNC_CONCURRENCY = int(os.environ.get('ASYNC_CONCURRENCY', 64))
+    SEND_RATE_GLOBAL = int(os.environ.get('SEND_RATE_GLOBAL', 30))
+    SEND_RATE_CHAT = float(os.environ.get('SEND_RATE_CHAT', 1))
+    SEND_RATE_GROUP = int(os.environ.get('SEND_RATE_GROUP', 20))
+    STATS_RECONCILE_INTERVAL = int(
+        os.environ.get('STATS_RECONCILE_INTERVAL', 60 * 60))
+    METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+    SQL_ACCOUNTING = bool(os.environ.get('SQL_ACCOUNTING', False))
+    SQL_QUERY_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET', 10))
+    SQL_TIME_BUDGET = float(os.environ.get('SQL_TIME_BUDGET', 0.1))
+    BOT_API_URL = os.environ.get('BOT_API_URL', None)
     BAN_STICKER = os.environ.get('BAN_STICKER',
                                  'CAADAgADOwADPPEcAXkko5EB3YGYAg')
     ALLOW_EXCL = os.environ.get('ALLOW_EXCL', False)
@@ -88,6 +113,12 @@ if ENV:
     SUPPORT_CHAT = os.environ.get('SUPPORT_CHAT', None)
     SPAMWATCH_SUPPORT_CHAT = os.environ.get('SPAMWATCH_SUPPORT_CHAT', None)
     SPAMWATCH_API = os.environ.get('SPAMWATCH_API', None)
+    SPAMWATCH_TTL = int(os.environ.get('SPAMWATCH_TTL', 60 * 60))
+    SPAMWATCH_NEGATIVE_TTL = int(
+        os.environ.get('SPAMWATCH_NEGATIVE_TTL', 60 * 10))
+    SPAMWATCH_TIMEOUT = float(os.environ.get('SPAMWATCH_TIMEOUT', 2))
+    SPAMWATCH_SYNC_INTERVAL = int(
+        os.environ.get('SPAMWATCH_SYNC_INTERVAL', 0))
 
     try:
         BL_CHATS = set(int(x) for x in os.environ.get('BL_CHATS', "").split())
@@ -144,9 +175,32 @@ else:
     DONATION_LINK = Config.DONATION_LINK
     LOAD = Config.LOAD
     NO_LOAD = Config.NO_LOAD
+    LAZY_MODULES = Config.LAZY_MODULES
+    STARTUP_WORKERS = Config.STARTUP_WORKERS
     DEL_CMDS = Config.DEL_CMDS
     STRICT_GBAN = Config.STRICT_GBAN
     WORKERS = Config.WORKERS
+    USER_FLUSH_INTERVAL = Config.USER_FLUSH_INTERVAL
+    USER_FLUSH_BATCH = Config.USER_FLUSH_BATCH
+    ADMIN_CACHE_SIZE = Config.ADMIN_CACHE_SIZE
+    ADMIN_CACHE_TTL = Config.ADMIN_CACHE_TTL
+    ADMIN_CACHE_REFRESH = Config.ADMIN_CACHE_REFRESH
+    CHAT_PROFILE_CACHE_SIZE = Config.CHAT_PROFILE_CACHE_SIZE
+    CHAT_CACHE_SIZE = Config.CHAT_CACHE_SIZE
+    CHAT_CACHE_TTL = Config.CHAT_CACHE_TTL
+    CACHE_SNAPSHOT = Config.CACHE_SNAPSHOT
+    CACHE_SNAPSHOT_INTERVAL = Config.CACHE_SNAPSHOT_INTERVAL
+    ASYNC_MODULES = Config.ASYNC_MODULES
+    ASYNC_CONCURRENCY = Config.ASYNC_CONCURRENCY
+    SEND_RATE_GLOBAL = Config.SEND_RATE_GLOBAL
+    SEND_RATE_CHAT = Config.SEND_RATE_CHAT
+    SEND_RATE_GROUP = Config.SEND_RATE_GROUP
+    STATS_RECONCILE_INTERVAL = Config.STATS_RECONCILE_INTERVAL
+    METRICS_PORT = Config.METRICS_PORT
+    SQL_ACCOUNTING = Config.SQL_ACCOUNTING
+    SQL_QUERY_BUDGET = Config.SQL_QUERY_BUDGET
+    SQL_TIME_BUDGET = Config.SQL_TIME_BUDGET
+    BOT_API_URL = Config.BOT_API_URL
     BAN_STICKER = Config.BAN_STICKER
     ALLOW_EXCL = Config.ALLOW_EXCL
     CASH_API_KEY = Config.CASH_API_KEY
@@ -156,6 +210,10 @@ else:
     SUPPORT_CHAT = Config.SUPPORT_CHAT
     SPAMWATCH_SUPPORT_CHAT = Config.SPAMWATCH_SUPPORT_CHAT
     SPAMWATCH_API = Config.SPAMWATCH_API
+    SPAMWATCH_TTL = Config.SPAMWATCH_TTL
+    SPAMWATCH_NEGATIVE_TTL = Config.SPAMWATCH_NEGATIVE_TTL
+    SPAMWATCH_TIMEOUT = Config.SPAMWATCH_TIMEOUT
+    SPAMWATCH_SYNC_INTERVAL = Config.SPAMWATCH_SYNC_INTERVAL
     INFOPIC = Config.INFOPIC
 
     try:
@@ -173,7 +231,8 @@ if not SPAMWATCH_API:
 else:
     sw = spamwatch.Client(SPAMWATCH_API)
 
-updater = tg.Updater(TOKEN, workers=WORKERS, use_context=True)
+updater = tg.Updater(
+    TOKEN, base_url=BOT_API_URL, workers=WORKERS, use_context=True)
 telethn = TelegramClient("saitama", API_ID, API_HASH)
 dispatcher = updater.dispatcher
 
@@ -186,9 +245,15 @@ TIGERS = list(TIGERS)
 # Load at end to ensure all prev variables have been set
 from SaitamaRobot.modules.helper_funcs.handlers import (CustomCommandHandler,
                                                         CustomMessageHandler,
-                                                        CustomRegexHandler)
+                                                        CustomRegexHandler,
+                                                        route_commands)
+from SaitamaRobot.modules.helper_funcs.metrics import instrument_handlers
+from SaitamaRobot.modules.helper_funcs.send_queue import queue_bot
 
 # make sure the regex handler can take extra kwargs
 tg.RegexHandler = CustomRegexHandler
 tg.CommandHandler = CustomCommandHandler
 tg.MessageHandler = CustomMessageHandler
+instrument_handlers(dispatcher)
+route_commands(dispatcher)
+queue_bot(dispatcher.bot)
@@ -1,17 +1,25 @@
-import importlib
 import time
 import re
 from sys import argv
 from typing import Optional
 
-from SaitamaRobot import (ALLOW_EXCL, CERT_PATH, DONATION_LINK, LOGGER,
-                          OWNER_ID, PORT, SUPPORT_CHAT, TOKEN, URL, WEBHOOK,
-                          SUPPORT_CHAT, dispatcher, StartTime, telethn, updater)
+from SaitamaRobot import (ALLOW_EXCL, CERT_PATH, DONATION_LINK, LAZY_MODULES,
+                          LOGGER, OWNER_ID, PORT, SUPPORT_CHAT, TOKEN, URL,
+                          WEBHOOK, SUPPORT_CHAT, dispatcher, StartTime, telethn,
+                          updater)
 # needed to dynamically load modules
 # NOTE: Module order is not guaranteed, specify that in the config file!
 from SaitamaRobot.modules import ALL_MODULES
-from SaitamaRobot.modules.helper_funcs.chat_status import is_user_admin
+from SaitamaRobot.modules.helper_funcs.cache_snapshot import restore_snapshot
+from SaitamaRobot.modules.helper_funcs.chat_status import (
+    invalidate_bot_member, is_rights_error, is_user_admin)
+from SaitamaRobot.modules.helper_funcs.metrics import start_metrics_server
+from SaitamaRobot.modules.helper_funcs import startup
 from SaitamaRobot.modules.helper_funcs.misc import paginate_modules
+from SaitamaRobot.modules.helper_funcs.startup import ModuleStub
+from SaitamaRobot.modules.helper_funcs.stats_registry import \
+    start_stats_reconciler
+from SaitamaRobot.modules.sql.schema import ensure_schema
 from telegram import (InlineKeyboardButton, InlineKeyboardMarkup, ParseMode,
                       Update)
 from telegram.error import (BadRequest, ChatMigrated, NetworkError,
@@ -56,24 +64,6 @@ Mən Sənin Qruplarıvı Qorumaq Üçün Azərbaycanca olan qrup idarə botuyam
 Bütün əmrlər üçün klik et /help.
 """
 
-HELP_STRINGS = """
-Salamlar! Mənim adım *{}*.
-Mənimlə birlikdə qruplarınızı idarə edə bilərsiniz.
-
-*Əsas* əmrlər:
- • /help: Kömək menyusu.
- • /help <modul adı>: müəyyən modul haqqında məlumat verir.
- • /settings:
-   • PM-də : ayarları göstərir.
-   • qrupda: qrup ayarlarını göstərir.
-
-
-{}
-Və aşağıdakılar:
-""".format(
-    dispatcher.bot.first_name, ""
-    if not ALLOW_EXCL else "\nBütün əmrlər / və ya ! ilə işlədilir.\n")
-
 SAITAMA_IMG = "https://telegra.ph/file/7fa4cb7d8268e4e452cae.jpg"
 
 DONATE_STRING = """Bəxşişə ehtiyyac yoxdu təşəkkürlər."""
@@ -88,17 +78,18 @@ DATA_EXPORT = []
 CHAT_SETTINGS = {}
 USER_SETTINGS = {}
 
-for module_name in ALL_MODULES:
-    imported_module = importlib.import_module("SaitamaRobot.modules." +
-                                              module_name)
+
+def register_module(imported_module):
     if not hasattr(imported_module, "__mod_name__"):
         imported_module.__mod_name__ = imported_module.__name__
 
-    if not imported_module.__mod_name__.lower() in IMPORTED:
-        IMPORTED[imported_module.__mod_name__.lower()] = imported_module
-    else:
+    # a lazily loaded module takes its stub's place
+    if not isinstance(
+            IMPORTED.get(imported_module.__mod_name__.lower(), ModuleStub()),
+            ModuleStub):
         raise Exception(
             "Can't have two modules with the same name! Please change one")
+    IMPORTED[imported_module.__mod_name__.lower()] = imported_module
 
     if hasattr(imported_module, "__help__") and imported_module.__help__:
         HELPABLE[imported_module.__mod_name__.lower()] = imported_module
@@ -126,6 +117,46 @@ for module_name in ALL_MODULES:
         USER_SETTINGS[imported_module.__mod_name__.lower()] = imported_module
 
 
+def load_module(module_name):
+    imported_module = startup.import_module(module_name)
+    register_module(imported_module)
+    return imported_module
+
+
+startup.timed("task", "schema", ensure_schema)
+startup.begin()
+startup.defer("get_me", dispatcher.bot.get_me)
+for module_name in ALL_MODULES:
+    if module_name in LAZY_MODULES:
+        stub = startup.defer_module(module_name, load_module)
+        if stub:
+            register_module(stub)
+            continue
+    load_module(module_name)
+
+# every cache has registered itself by now
+restore_snapshot()
+startup.finish()
+
+HELP_STRINGS = """
+Salamlar! Mənim adım *{}*.
+Mənimlə birlikdə qruplarınızı idarə edə bilərsiniz.
+
+*Əsas* əmrlər:
+ • /help: Kömək menyusu.
+ • /help <modul adı>: müəyyən modul haqqında məlumat verir.
+ • /settings:
+   • PM-də : ayarları göstərir.
+   • qrupda: qrup ayarlarını göstərir.
+
+
+{}
+Və aşağıdakılar:
+""".format(
+    dispatcher.bot.first_name, ""
+    if not ALLOW_EXCL else "\nBütün əmrlər / və ya ! ilə işlədilir.\n")
+
+
 # do not async
 def send_help(chat_id, text, keyboard=None):
     if not keyboard:
@@ -231,6 +262,9 @@ def error_callback(update: Update, context: CallbackContext):
         print("no nono2")
         print("BadRequest caught")
         print(error)
+        # our rights changed, don't trust the cached bot member any more
+        if update and update.effective_chat and is_rights_error(error):
+            invalidate_bot_member(update.effective_chat.id)
 
         # handle malformed requests - read more below!
     except TimedOut:
@@ -564,6 +598,9 @@ def main():
 
     dispatcher.add_error_handler(error_callback)
 
+    start_stats_reconciler()
+    start_metrics_server()
+
     if WEBHOOK:
         LOGGER.info("Using webhooks.")
         updater.start_webhook(listen="0.0.0.0", port=PORT, url_path=TOKEN)
@@ -0,0 +1,163 @@
+"""
+Logging set up before anything else in the package: handlers only put
+records on a bounded queue, a listener thread writes them out to a
+rotating log.txt and the console.
+"""
+import atexit
+import glob
+import io
+import logging
+import os
+import queue
+import threading
+import time
+import zipfile
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "log.txt"
+UPDATES_FILE = "updates.txt"
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # rotated at this size
+LOG_BACKUPS = 5
+LOG_QUEUE_SIZE = 10000
+
+# seconds an exception is logged in full once per place and message
+DEDUP_WINDOW = 60
+DEDUP_KEYS = 1000
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Drops records rather than block the caller when the writer lags."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                self.queue.put_nowait(
+                    logging.makeLogRecord({
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": "Dropped %d log records, the writer fell behind",
+                        "args": (dropped,),
+                    }))
+            except queue.Full:
+                self.dropped += dropped
+
+
+class DedupFilter(logging.Filter):
+    """
+    Lets an error through once per DEDUP_WINDOW for each place it's logged
+    from and message, then counts the repeats and mentions them with the
+    next one let through. Runs before the record is queued, so repeats cost
+    no traceback formatting.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.seen = {}  # key -> [window start, repeats]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.ERROR and not record.exc_info:
+            return True
+        excp = record.exc_info[1] if record.exc_info else None
+        key = (record.pathname, record.lineno, type(excp).__name__,
+               str(excp) if excp is not None else record.getMessage())
+        now = time.monotonic()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is not None and now - entry[0] < DEDUP_WINDOW:
+                entry[1] += 1
+                return False
+            repeats = entry[1] if entry is not None else 0
+            if len(self.seen) >= DEDUP_KEYS:
+                self.seen = {
+                    seen_key: seen
+                    for seen_key, seen in self.seen.items()
+                    if now - seen[0] < DEDUP_WINDOW
+                }
+            self.seen[key] = [now, 0]
+        if repeats:
+            record.msg = "{} (repeated {} more times)".format(
+                record.msg, repeats)
+        return True
+
+
+def _listen(log_queue, *handlers):
+    listener = QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def setup_logging():
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUPS,
+        encoding="utf-8")
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = BoundedQueueHandler(log_queue)
+    # prepare() only merges the message and traceback, LOG_FORMAT is applied
+    # by the handlers behind the queue
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    queue_handler.addFilter(DedupFilter())
+    logging.basicConfig(handlers=[queue_handler], level=logging.INFO)
+    _listen(log_queue, file_handler, console_handler)
+
+
+def updates_logger():
+    """Logger of /debug, appending to a rotating updates.txt."""
+    logger = logging.getLogger("SaitamaRobot.updates")
+    if not logger.handlers:
+        file_handler = RotatingFileHandler(
+            UPDATES_FILE,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=1,
+            encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        logger.addHandler(BoundedQueueHandler(log_queue))
+        logger.propagate = False
+        _listen(log_queue, file_handler)
+    return logger
+
+
+def log_tail(lines=200, path=LOG_FILE):
+    """The last `lines` lines of the log as bytes, read from the end."""
+    block = 64 * 1024
+    with open(path, "rb") as log:
+        log.seek(0, os.SEEK_END)
+        end = position = log.tell()
+        data = b""
+        while position and data.count(b"\n") <= lines:
+            position = max(0, position - block)
+            log.seek(position)
+            data = log.read(end - position)
+    return b"\n".join(data.splitlines()[-lines:])
+
+
+def log_archive(path=LOG_FILE):
+    """log.txt and its rotated backups, zipped in memory."""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zipped:
+        for name in sorted(glob.glob(path + "*")):
+            zipped.write(name, os.path.basename(name))
+    archive.seek(0)
+    return archive
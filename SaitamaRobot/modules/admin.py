@@ -11,7 +11,8 @@ from SaitamaRobot.modules.helper_funcs.chat_status import (bot_admin, can_pin,
                                                            can_promote,
                                                            connection_status,
                                                            user_admin,
-                                                           ADMIN_CACHE)
+                                                           invalidate_bot_member,
+                                                           invalidate_chat_admins)
 
 from SaitamaRobot.modules.helper_funcs.extraction import (extract_user,
                                                           extract_user_and_text)
@@ -177,10 +178,8 @@ def demote(update: Update, context: CallbackContext) -> str:
 @run_async
 @user_admin
 def refresh_admin(update, _):
-    try:
-        ADMIN_CACHE.pop(update.effective_chat.id)
-    except KeyError:
-        pass
+    invalidate_chat_admins(update.effective_chat.id)
+    invalidate_bot_member(update.effective_chat.id)
 
     update.effective_message.reply_text("Admin siyahısı yeniləndi!")
 
@@ -4,6 +4,7 @@ from typing import Optional, List
 from telegram import Message, Chat, Update, User, ChatPermissions
 
 from SaitamaRobot import TIGERS, WOLVES, dispatcher
+from SaitamaRobot.modules.helper_funcs.aio import get_actions
 from SaitamaRobot.modules.helper_funcs.chat_status import (bot_admin,
                                                            is_user_admin,
                                                            user_admin,
@@ -17,6 +18,21 @@ from SaitamaRobot.modules.helper_funcs.string_handling import extract_time
 from SaitamaRobot.modules.connection import connected
 from SaitamaRobot.modules.helper_funcs.alternate import send_message
 FLOOD_GROUP = 3
+MAX_FLOOD_TIMER = 60 * 10
+
+
+def _parse_seconds(time_val):
+    # "30", "30s" or "2m"
+    time_val = time_val.lower()
+    unit = 1
+    if time_val.endswith("m"):
+        unit = 60
+        time_val = time_val[:-1]
+    elif time_val.endswith("s"):
+        time_val = time_val[:-1]
+    if not time_val.isdigit():
+        return 0
+    return int(time_val) * unit
 
 
 @run_async
@@ -28,28 +44,34 @@ def check_flood(update, context) -> str:
     if not user:  # ignore channels
         return ""
 
+    if not sql.is_flood_enabled(chat.id):
+        return ""
+
     # ignore admins and whitelists
     if (is_user_admin(chat, user.id) or user.id in WOLVES or user.id in TIGERS):
         sql.update_flood(chat.id, None)
         return ""
 
     should_ban = sql.update_flood(chat.id, user.id)
+    # update both, the timer must see every message
+    should_ban = sql.update_flood_timer(chat.id, user.id) or should_ban
     if not should_ban:
         return ""
 
+    actions = get_actions(context.bot, __name__)
     try:
         getmode, getvalue = sql.get_flood_setting(chat.id)
         if getmode == 1:
-            chat.kick_member(user.id)
+            actions.kick_chat_member(chat.id, user.id)
             execstrings = ("Banlandı")
             tag = "BANNED"
         elif getmode == 2:
-            chat.kick_member(user.id)
-            chat.unban_member(user.id)
+            actions.kick_chat_member(chat.id, user.id)
+            actions.unban_chat_member(chat.id, user.id)
             execstrings = ("Atıldı")
             tag = "KICKED"
         elif getmode == 3:
-            context.bot.restrict_chat_member(
+            actions.restrict_chat_member(
                 chat.id,
                 user.id,
                 permissions=ChatPermissions(can_send_messages=False))
@@ -57,20 +79,20 @@ def check_flood(update, context) -> str:
             tag = "MUTED"
         elif getmode == 4:
             bantime = extract_time(msg, getvalue)
-            chat.kick_member(user.id, until_date=bantime)
+            actions.kick_chat_member(chat.id, user.id, until_date=bantime)
             execstrings = ("{} müddətlik susduruldu".format(getvalue))
             tag = "TBAN"
         elif getmode == 5:
             mutetime = extract_time(msg, getvalue)
-            context.bot.restrict_chat_member(
+            actions.restrict_chat_member(
                 chat.id,
                 user.id,
                 until_date=mutetime,
                 permissions=ChatPermissions(can_send_messages=False))
             execstrings = ("{} müddətlik susduruldu".format(getvalue))
             tag = "TMUTE"
-        send_message(update.effective_message,
-                     "Beep Boop! Boop Beep!\n{}!".format(execstrings))
+        actions.reply_text(update.effective_message,
+                           "Beep Boop! Boop Beep!\n{}!".format(execstrings))
 
         return "<b>{}:</b>" \
                "\n#{}" \
@@ -194,6 +216,67 @@ def set_flood(update, context) -> str:
     return ""
 
 
+@run_async
+@user_admin
+@loggable
+def set_flood_timer(update, context) -> str:
+    chat = update.effective_chat  # type: Optional[Chat]
+    user = update.effective_user  # type: Optional[User]
+    message = update.effective_message  # type: Optional[Message]
+    args = context.args
+
+    conn = connected(context.bot, update, chat, user.id, need_admin=True)
+    if conn:
+        chat_id = conn
+        chat_name = dispatcher.bot.getChat(conn).title
+    else:
+        if update.effective_message.chat.type == "private":
+            send_message(update.effective_message,
+                         "Bu əmr qrupda işlədilə bilər PM-də yox")
+            return ""
+        chat_id = update.effective_chat.id
+        chat_name = update.effective_message.chat.title
+
+    if len(args) == 1 and args[0].lower() in ("off", "no", "0"):
+        sql.set_flood_timer(chat_id, 0, 0)
+        message.reply_text(
+            "{} qrupunda zamanlı antiflood deaktiv edildi.".format(chat_name))
+        return "<b>{}:</b>" \
+               "\n#SETFLOODTIMER" \
+               "\n<b>Admin:</b> {}" \
+               "\nDisable timed antiflood.".format(html.escape(chat_name), mention_html(user.id, html.escape(user.first_name)))
+
+    if len(args) >= 2 and args[0].isdigit():
+        count = int(args[0])
+        seconds = _parse_seconds(args[1])
+        if count <= 3:
+            message.reply_text("Mesaj sayı 3-dən böyük olmalıdır!")
+            return ""
+        if not seconds or seconds > MAX_FLOOD_TIMER:
+            message.reply_text(
+                "Zaman 1 saniyə ilə {} saniyə arasında olmalıdır! "
+                "Məsələn: `30s`, `2m`.".format(MAX_FLOOD_TIMER),
+                parse_mode="markdown")
+            return ""
+
+        sql.set_flood_timer(chat_id, count, seconds)
+        message.reply_text(
+            "{} qrupunda {} saniyə ərzində {} mesajdan çox yazanlar "
+            "cəzalandırılacaq.".format(chat_name, seconds, count))
+        return "<b>{}:</b>" \
+               "\n#SETFLOODTIMER" \
+               "\n<b>Admin:</b> {}" \
+               "\nSet timed antiflood to <code>{}</code> messages in <code>{}s</code>.".format(
+                   html.escape(chat_name), mention_html(user.id, html.escape(user.first_name)), count, seconds)
+
+    message.reply_text(
+        "Zamanlı antiflood üçün `/setfloodtimer <mesaj sayı> <zaman>` "
+        "istifadə edin, məsələn `/setfloodtimer 10 30s`.\n"
+        "Deaktiv etmək üçün `/setfloodtimer off` istifadə edin!",
+        parse_mode="markdown")
+    return ""
+
+
 @run_async
 def flood(update, context):
     chat = update.effective_chat  # type: Optional[Chat]
@@ -213,13 +296,18 @@ def flood(update, context):
         chat_name = update.effective_message.chat.title
 
     limit = sql.get_flood_limit(chat_id)
-    if limit == 0:
+    count, seconds = sql.get_flood_timer(chat_id)
+    if seconds:
+        msg.reply_text(
+            "{} saniyə ərzində {} mesajdan çox yazanlara qarşı tədbir görürəm."
+            .format(seconds, count))
+    if limit == 0 and not seconds:
         if conn:
             text = msg.reply_text(
                 "{} qrupunda flood-a nəzarət etmirəm!".format(chat_name))
         else:
             text = msg.reply_text("Burada flood-a nəzarət etmirəm!")
-    else:
+    elif limit:
         if conn:
             text = msg.reply_text(
                 "{} qrupunda tez-tez {} mesaj yazanlara qarşı tədbir görürəm."
@@ -327,10 +415,14 @@ def __migrate__(old_chat_id, new_chat_id):
 
 def __chat_settings__(chat_id, user_id):
     limit = sql.get_flood_limit(chat_id)
-    if limit == 0:
+    count, seconds = sql.get_flood_timer(chat_id)
+    if limit == 0 and not seconds:
         return "Flood-a nəzarət etmirəm."
-    else:
-        return "Yeni antiflood limiti -->`{}`.".format(limit)
+    text = "Yeni antiflood limiti -->`{}`.".format(limit)
+    if seconds:
+        text += "\nZamanlı antiflood -->`{} saniyədə {}`.".format(
+            seconds, count)
+    return text
 
 
 __help__ = """
@@ -342,6 +434,8 @@ Antiflood sayəsində qrupunuza flood edənlərə qarşl müəyyən tədbirlər
 • *Sadəcə adminlər:*
  • `/setflood <int/'no'/'off'>`*:* flood-a nəzarəti aktiv/deaktiv edir
  *məsələn:* `/setflood 10`
+ • `/setfloodtimer <ədəd> <zaman>`*:* zaman ərzində ədəddən çox mesaj yazanları flood sayır, istifadəçilər növbə ilə yazsa belə
+ *məsələn:* `/setfloodtimer 10 30s`, deaktiv etmək üçün `/setfloodtimer off`
  • `/setfloodmode <ban/kick/mute/tban/tmute> <dəyər>`*:* Flood limitini keçənlərə qarşı ediləcək tədbirlər. ban/kick/mute/tmute/tban
 
 • *Not:*
@@ -358,6 +452,8 @@ __mod_name__ = "Anti-Flood"
 FLOOD_BAN_HANDLER = MessageHandler(
     Filters.all & ~Filters.status_update & Filters.group, check_flood)
 SET_FLOOD_HANDLER = CommandHandler("setflood", set_flood, filters=Filters.group)
+SET_FLOOD_TIMER_HANDLER = CommandHandler(
+    "setfloodtimer", set_flood_timer, filters=Filters.group)
 SET_FLOOD_MODE_HANDLER = CommandHandler(
     "setfloodmode", set_flood_mode, pass_args=True)  #, filters=Filters.group)
 FLOOD_QUERY_HANDLER = CallbackQueryHandler(
@@ -367,8 +463,9 @@ FLOOD_HANDLER = CommandHandler("flood", flood, filters=Filters.group)
 dispatcher.add_handler(FLOOD_BAN_HANDLER, FLOOD_GROUP)
 dispatcher.add_handler(FLOOD_QUERY_HANDLER)
 dispatcher.add_handler(SET_FLOOD_HANDLER)
+dispatcher.add_handler(SET_FLOOD_TIMER_HANDLER)
 dispatcher.add_handler(SET_FLOOD_MODE_HANDLER)
 dispatcher.add_handler(FLOOD_HANDLER)
 
 __handlers__ = [(FLOOD_BAN_HANDLER, FLOOD_GROUP), SET_FLOOD_HANDLER,
-                FLOOD_HANDLER, SET_FLOOD_MODE_HANDLER]
+                SET_FLOOD_TIMER_HANDLER, FLOOD_HANDLER, SET_FLOOD_MODE_HANDLER]
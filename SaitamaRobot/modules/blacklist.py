@@ -1,5 +1,4 @@
 import html
-import re
 
 from telegram import ParseMode, ChatPermissions
 from telegram.error import BadRequest
@@ -9,7 +8,9 @@ from telegram.utils.helpers import mention_html
 import SaitamaRobot.modules.sql.blacklist_sql as sql
 from SaitamaRobot import dispatcher, LOGGER
 from SaitamaRobot.modules.disable import DisableAbleCommandHandler
-from SaitamaRobot.modules.helper_funcs.chat_status import user_admin, user_not_admin
+from SaitamaRobot.modules.helper_funcs.aio import get_actions
+from SaitamaRobot.modules.helper_funcs.chat_status import (
+    invalidate_bot_member, is_rights_error, user_admin, user_not_admin)
 from SaitamaRobot.modules.helper_funcs.extraction import extract_text
 from SaitamaRobot.modules.helper_funcs.misc import split_message
 from SaitamaRobot.modules.log_channel import loggable
@@ -345,83 +346,87 @@ def del_blacklist(update, context):
 
     getmode, value = sql.get_blacklist_setting(chat.id)
 
-    chat_filters = sql.get_chat_blacklist(chat.id)
-    for trigger in chat_filters:
-        pattern = r"( |^|[^\w])" + re.escape(trigger) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            try:
-                if getmode == 0:
-                    return
-                elif getmode == 1:
-                    message.delete()
-                elif getmode == 2:
-                    message.delete()
-                    warn(
-                        update.effective_user,
-                        chat,
-                        ("Qara siyahıdakı sözdən istifadə olundu: {}".format(trigger)),
-                        message,
-                        update.effective_user,
-                    )
-                    return
-                elif getmode == 3:
-                    message.delete()
-                    bot.restrict_chat_member(
-                        chat.id,
-                        update.effective_user.id,
-                        permissions=ChatPermissions(can_send_messages=False),
-                    )
-                    bot.sendMessage(
-                        chat.id,
-                        f"{user.first_name} Qara siyahıda olan: {trigger} işlətdiyinə görə susduruldu!",
-                    )
-                    return
-                elif getmode == 4:
-                    message.delete()
-                    res = chat.unban_member(update.effective_user.id)
-                    if res:
-                        bot.sendMessage(
-                            chat.id,
-                            f"{user.first_name} Qara siyahıda olan: {trigger} işlətdiyinə görə qrupdan atıldı!",
-                        )
-                    return
-                elif getmode == 5:
-                    message.delete()
-                    chat.kick_member(user.id)
-                    bot.sendMessage(
-                        chat.id,
-                        f"{user.first_name} Qara siyahıda olan: {trigger} işlətdiyinə görə banlandı",
-                    )
-                    return
-                elif getmode == 6:
-                    message.delete()
-                    bantime = extract_time(message, value)
-                    chat.kick_member(user.id, until_date=bantime)
-                    bot.sendMessage(
-                        chat.id,
-                        f"{user.first_name} Qara siyahıda olan '{trigger}' işlətdiyinə görə banlandı. {value} qədər!",
-                    )
-                    return
-                elif getmode == 7:
-                    message.delete()
-                    mutetime = extract_time(message, value)
-                    bot.restrict_chat_member(
-                        chat.id,
-                        user.id,
-                        until_date=mutetime,
-                        permissions=ChatPermissions(can_send_messages=False),
-                    )
-                    bot.sendMessage(
-                        chat.id,
-                        f"{user.first_name} Qara siyahıda olan '{trigger}' işlətdiyinə görə susduruldu. {value} qədər!",
-                    )
-                    return
-            except BadRequest as excp:
-                if excp.message == "Message to delete not found":
-                    pass
-                else:
-                    LOGGER.exception("Error while deleting blacklist message.")
-            break
+    trigger = sql.get_chat_blacklist_matcher(chat.id).match(to_match)
+    if trigger is None:
+        return
+
+    actions = get_actions(bot, __name__)
+    try:
+        if getmode == 0:
+            return
+        elif getmode == 1:
+            actions.delete_message(chat.id, message.message_id)
+        elif getmode == 2:
+            actions.delete_message(chat.id, message.message_id)
+            warn(
+                update.effective_user,
+                chat,
+                ("Qara siyahıdakı sözdən istifadə olundu: {}".format(trigger)),
+                message,
+                update.effective_user,
+            )
+            return
+        elif getmode == 3:
+            actions.delete_message(chat.id, message.message_id)
+            actions.restrict_chat_member(
+                chat.id,
+                update.effective_user.id,
+                permissions=ChatPermissions(can_send_messages=False),
+            )
+            actions.send_message(
+                chat.id,
+                f"{user.first_name} Qara siyahıda olan: {trigger} işlətdiyinə görə susduruldu!",
+            )
+            return
+        elif getmode == 4:
+            actions.delete_message(chat.id, message.message_id)
+            res = actions.unban_chat_member(chat.id, update.effective_user.id)
+            actions.on_success(
+                res,
+                lambda _: actions.send_message(
+                    chat.id,
+                    f"{user.first_name} Qara siyahıda olan: {trigger} işlətdiyinə görə qrupdan atıldı!",
+                ),
+            )
+            return
+        elif getmode == 5:
+            actions.delete_message(chat.id, message.message_id)
+            actions.kick_chat_member(chat.id, user.id)
+            actions.send_message(
+                chat.id,
+                f"{user.first_name} Qara siyahıda olan: {trigger} işlətdiyinə görə banlandı",
+            )
+            return
+        elif getmode == 6:
+            actions.delete_message(chat.id, message.message_id)
+            bantime = extract_time(message, value)
+            actions.kick_chat_member(chat.id, user.id, until_date=bantime)
+            actions.send_message(
+                chat.id,
+                f"{user.first_name} Qara siyahıda olan '{trigger}' işlətdiyinə görə banlandı. {value} qədər!",
+            )
+            return
+        elif getmode == 7:
+            actions.delete_message(chat.id, message.message_id)
+            mutetime = extract_time(message, value)
+            actions.restrict_chat_member(
+                chat.id,
+                user.id,
+                until_date=mutetime,
+                permissions=ChatPermissions(can_send_messages=False),
+            )
+            actions.send_message(
+                chat.id,
+                f"{user.first_name} Qara siyahıda olan '{trigger}' işlətdiyinə görə susduruldu. {value} qədər!",
+            )
+            return
+    except BadRequest as excp:
+        if excp.message == "Message to delete not found":
+            pass
+        else:
+            if is_rights_error(excp):
+                invalidate_bot_member(chat.id)
+            LOGGER.exception("Error while deleting blacklist message.")
 
 
 def __import_data__(chat_id, data):
@@ -6,9 +6,12 @@ import SaitamaRobot.modules.sql.chatbot_sql as sql
 from coffeehouse.api import API
 from coffeehouse.exception import CoffeeHouseError as CFError
 from coffeehouse.lydia import LydiaAI
-from SaitamaRobot import AI_API_KEY, OWNER_ID, SUPPORT_CHAT, dispatcher
+from SaitamaRobot import (AI_API_KEY, LOGGER, OWNER_ID, SUPPORT_CHAT,
+                          dispatcher)
 from SaitamaRobot.modules.helper_funcs.chat_status import user_admin
 from SaitamaRobot.modules.helper_funcs.filters import CustomFilters
+from SaitamaRobot.modules.helper_funcs.send_queue import (PRIORITY_BULK,
+                                                          queue_call)
 from SaitamaRobot.modules.log_channel import gloggable
 from telegram import Update
 from telegram.error import BadRequest, RetryAfter, Unauthorized
@@ -123,15 +126,18 @@ def list_chatbot_chats(update: Update, context: CallbackContext):
     text = "<b>AI aktiv olunan qruplar</b>\n"
     for chat in chats:
         try:
-            x = context.bot.get_chat(int(*chat))
+            x = queue_call(
+                None, context.bot.get_chat, int(*chat), priority=PRIORITY_BULK)
             name = x.title if x.title else x.first_name
             text += f"• <code>{name}</code>\n"
         except BadRequest:
             sql.rem_chat(*chat)
         except Unauthorized:
             sql.rem_chat(*chat)
-        except RetryAfter as e:
-            sleep(e.retry_after)
+        except RetryAfter as excp:
+            # the send queue already retried it
+            LOGGER.warning("Skipping AI chat %s, flood wait of %ss", *chat,
+                           excp.retry_after)
     update.effective_message.reply_text(text, parse_mode="HTML")
 
 
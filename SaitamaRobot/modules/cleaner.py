@@ -3,8 +3,10 @@ import html
 from SaitamaRobot import ALLOW_EXCL, CustomCommandHandler, dispatcher
 from SaitamaRobot.modules.disable import DisableAbleCommandHandler
 from SaitamaRobot.modules.helper_funcs.chat_status import (bot_can_delete,
+                                                           can_delete,
                                                            connection_status,
                                                            dev_plus, user_admin)
+from SaitamaRobot.modules.helper_funcs.handlers import CommandRouter
 from SaitamaRobot.modules.sql import cleaner_sql as sql
 from telegram import ParseMode, Update
 from telegram.ext import (CallbackContext, CommandHandler, Filters,
@@ -26,7 +28,9 @@ command_list = [
 
 for handler_list in dispatcher.handlers:
     for handler in dispatcher.handlers[handler_list]:
-        if any(
+        if isinstance(handler, CommandRouter):
+            command_list += list(handler.commands)
+        elif any(
                 isinstance(handler, cmd_handler)
                 for cmd_handler in CommandHandlerList):
             command_list += handler.command
@@ -37,7 +41,7 @@ def clean_blue_text_must_click(update: Update, context: CallbackContext):
     bot = context.bot
     chat = update.effective_chat
     message = update.effective_message
-    if chat.get_member(bot.id).can_delete_messages:
+    if can_delete(chat, bot.id):
         if sql.is_enabled(chat.id):
             fst_word = message.text.strip().split(None, 1)[0]
 
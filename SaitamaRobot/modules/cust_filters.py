@@ -1,4 +1,3 @@
-import re
 import random
 from html import escape
 
@@ -276,208 +275,206 @@ def reply_filter(update, context):
     if not to_match:
         return
 
-    chat_filters = sql.get_chat_triggers(chat.id)
-    for keyword in chat_filters:
-        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            if MessageHandlerChecker.check_user(update.effective_user.id):
-                return
-            filt = sql.get_filter(chat.id, keyword)
-            if filt.reply == "there is should be a new reply":
-                buttons = sql.get_buttons(chat.id, filt.keyword)
-                keyb = build_keyboard_parser(context.bot, chat.id, buttons)
-                keyboard = InlineKeyboardMarkup(keyb)
-
-                VALID_WELCOME_FORMATTERS = [
-                    "first",
-                    "last",
-                    "fullname",
-                    "username",
-                    "id",
-                    "chatname",
-                    "mention",
-                ]
-                if filt.reply_text:
-                    if '%%%' in filt.reply_text:
-                        split = filt.reply_text.split('%%%')
-                        if all(split):
-                            text = random.choice(split)
-                        else:
-                            text = filt.reply_text
+    keyword = sql.get_chat_filter_matcher(chat.id).match(to_match)
+    if keyword is None:
+        return
+
+    if MessageHandlerChecker.check_user(update.effective_user.id):
+        return
+    filt = sql.get_filter(chat.id, keyword)
+    if filt.reply == "there is should be a new reply":
+        buttons = sql.get_buttons(chat.id, filt.keyword)
+        keyb = build_keyboard_parser(context.bot, chat.id, buttons)
+        keyboard = InlineKeyboardMarkup(keyb)
+
+        VALID_WELCOME_FORMATTERS = [
+            "first",
+            "last",
+            "fullname",
+            "username",
+            "id",
+            "chatname",
+            "mention",
+        ]
+        if filt.reply_text:
+            if '%%%' in filt.reply_text:
+                split = filt.reply_text.split('%%%')
+                if all(split):
+                    text = random.choice(split)
+                else:
+                    text = filt.reply_text
+            else:
+                text = filt.reply_text
+            if text.startswith('~!') and text.endswith('!~'):
+                sticker_id = text.replace('~!', '').replace('!~', '')
+                try:
+                    context.bot.send_sticker(
+                        chat.id,
+                        sticker_id,
+                        reply_to_message_id=message.message_id
+                    )
+                    return
+                except BadRequest as excp:
+                    if excp.message == 'Wrong remote file identifier specified: wrong padding in the string':
+                        context.bot.send_message(chat.id, "Mesajı göndərmək uğursuz oldu, stiker id si dəqiq doğrudur?")
+                        return
                     else:
-                        text = filt.reply_text
-                    if text.startswith('~!') and text.endswith('!~'):
-                        sticker_id = text.replace('~!', '').replace('!~', '')
-                        try:
-                            context.bot.send_sticker(
-                                chat.id,
-                                sticker_id,
-                                reply_to_message_id=message.message_id
-                            )
-                            return
-                        except BadRequest as excp:
-                            if excp.message == 'Wrong remote file identifier specified: wrong padding in the string':
-                                context.bot.send_message(chat.id, "Mesajı göndərmək uğursuz oldu, stiker id si dəqiq doğrudur?")
-                                return
-                            else:
-                                LOGGER.exception("Error in filters: " + excp.message)
-                                return
-                    valid_format = escape_invalid_curly_brackets(
-                        text, VALID_WELCOME_FORMATTERS)
-                    if valid_format:
-                        filtext = valid_format.format(
-                            first=escape(message.from_user.first_name),
-                            last=escape(message.from_user.last_name or
-                                        message.from_user.first_name),
-                            fullname=" ".join(
-                                [
-                                    escape(message.from_user.first_name),
-                                    escape(message.from_user.last_name),
-                                ] if message.from_user.last_name else
-                                [escape(message.from_user.first_name)]),
-                            username="@" + escape(message.from_user.username)
-                            if message.from_user.username else mention_html(
-                                message.from_user.id,
-                                message.from_user.first_name),
-                            mention=mention_html(message.from_user.id,
-                                                 message.from_user.first_name),
-                            chatname=escape(message.chat.title)
-                            if message.chat.type != "private" else escape(
+                        LOGGER.exception("Error in filters: " + excp.message)
+                        return
+            valid_format = escape_invalid_curly_brackets(
+                text, VALID_WELCOME_FORMATTERS)
+            if valid_format:
+                filtext = valid_format.format(
+                    first=escape(message.from_user.first_name),
+                    last=escape(message.from_user.last_name or
                                 message.from_user.first_name),
-                            id=message.from_user.id,
-                        )
-                    else:
-                        filtext = ""
-                else:
-                    filtext = ""
-
-                if filt.file_type in (sql.Types.BUTTON_TEXT, sql.Types.TEXT):
+                    fullname=" ".join(
+                        [
+                            escape(message.from_user.first_name),
+                            escape(message.from_user.last_name),
+                        ] if message.from_user.last_name else
+                        [escape(message.from_user.first_name)]),
+                    username="@" + escape(message.from_user.username)
+                    if message.from_user.username else mention_html(
+                        message.from_user.id,
+                        message.from_user.first_name),
+                    mention=mention_html(message.from_user.id,
+                                         message.from_user.first_name),
+                    chatname=escape(message.chat.title)
+                    if message.chat.type != "private" else escape(
+                        message.from_user.first_name),
+                    id=message.from_user.id,
+                )
+            else:
+                filtext = ""
+        else:
+            filtext = ""
+
+        if filt.file_type in (sql.Types.BUTTON_TEXT, sql.Types.TEXT):
+            try:
+                context.bot.send_message(
+                    chat.id,
+                    markdown_to_html(filtext),
+                    reply_to_message_id=message.message_id,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                    reply_markup=keyboard,
+                )
+            except BadRequest as excp:
+                error_catch = get_exception(excp, filt, chat)
+                if error_catch == "noreply":
                     try:
                         context.bot.send_message(
                             chat.id,
                             markdown_to_html(filtext),
-                            reply_to_message_id=message.message_id,
                             parse_mode=ParseMode.HTML,
                             disable_web_page_preview=True,
                             reply_markup=keyboard,
                         )
                     except BadRequest as excp:
-                        error_catch = get_exception(excp, filt, chat)
-                        if error_catch == "noreply":
-                            try:
-                                context.bot.send_message(
-                                    chat.id,
-                                    markdown_to_html(filtext),
-                                    parse_mode=ParseMode.HTML,
-                                    disable_web_page_preview=True,
-                                    reply_markup=keyboard,
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception("Error in filters: " +
-                                                 excp.message)
-                                send_message(
-                                    update.effective_message,
-                                    get_exception(excp, filt, chat),
-                                )
-                        else:
-                            try:
-                                send_message(
-                                    update.effective_message,
-                                    get_exception(excp, filt, chat),
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception("Failed to send message: " +
-                                                 excp.message)
-                                pass
+                        LOGGER.exception("Error in filters: " +
+                                         excp.message)
+                        send_message(
+                            update.effective_message,
+                            get_exception(excp, filt, chat),
+                        )
                 else:
-                    ENUM_FUNC_MAP[filt.file_type](
-                        chat.id,
-                        filt.file_id,
-                        caption=markdown_to_html(filtext),
-                        reply_to_message_id=message.message_id,
-                        parse_mode=ParseMode.HTML,
-                        disable_web_page_preview=True,
-                        reply_markup=keyboard,
-                    )
-                break
-            else:
-                if filt.is_sticker:
-                    message.reply_sticker(filt.reply)
-                elif filt.is_document:
-                    message.reply_document(filt.reply)
-                elif filt.is_image:
-                    message.reply_photo(filt.reply)
-                elif filt.is_audio:
-                    message.reply_audio(filt.reply)
-                elif filt.is_voice:
-                    message.reply_voice(filt.reply)
-                elif filt.is_video:
-                    message.reply_video(filt.reply)
-                elif filt.has_markdown:
-                    buttons = sql.get_buttons(chat.id, filt.keyword)
-                    keyb = build_keyboard_parser(context.bot, chat.id, buttons)
-                    keyboard = InlineKeyboardMarkup(keyb)
-
                     try:
                         send_message(
                             update.effective_message,
+                            get_exception(excp, filt, chat),
+                        )
+                    except BadRequest as excp:
+                        LOGGER.exception("Failed to send message: " +
+                                         excp.message)
+                        pass
+        else:
+            ENUM_FUNC_MAP[filt.file_type](
+                chat.id,
+                filt.file_id,
+                caption=markdown_to_html(filtext),
+                reply_to_message_id=message.message_id,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True,
+                reply_markup=keyboard,
+            )
+    else:
+        if filt.is_sticker:
+            message.reply_sticker(filt.reply)
+        elif filt.is_document:
+            message.reply_document(filt.reply)
+        elif filt.is_image:
+            message.reply_photo(filt.reply)
+        elif filt.is_audio:
+            message.reply_audio(filt.reply)
+        elif filt.is_voice:
+            message.reply_voice(filt.reply)
+        elif filt.is_video:
+            message.reply_video(filt.reply)
+        elif filt.has_markdown:
+            buttons = sql.get_buttons(chat.id, filt.keyword)
+            keyb = build_keyboard_parser(context.bot, chat.id, buttons)
+            keyboard = InlineKeyboardMarkup(keyb)
+
+            try:
+                send_message(
+                    update.effective_message,
+                    filt.reply,
+                    parse_mode=ParseMode.MARKDOWN,
+                    disable_web_page_preview=True,
+                    reply_markup=keyboard,
+                )
+            except BadRequest as excp:
+                if excp.message == "Unsupported url protocol":
+                    try:
+                        send_message(
+                            update.effective_message,
+                            "Görünür ki dəstəklənməyən url istifadə edirsiniz. "
+                            "Telegram bəzi şeyləri dəstəkləmir. "
+                            "Daha sonra yenidən cəhd edin...",
+                        )
+                    except BadRequest as excp:
+                        LOGGER.exception("Error in filters: " +
+                                         excp.message)
+                        pass
+                elif excp.message == "Reply message not found":
+                    try:
+                        context.bot.send_message(
+                            chat.id,
                             filt.reply,
                             parse_mode=ParseMode.MARKDOWN,
                             disable_web_page_preview=True,
                             reply_markup=keyboard,
                         )
                     except BadRequest as excp:
-                        if excp.message == "Unsupported url protocol":
-                            try:
-                                send_message(
-                                    update.effective_message,
-                                    "Görünür ki dəstəklənməyən url istifadə edirsiniz. "
-                                    "Telegram bəzi şeyləri dəstəkləmir. "
-                                    "Daha sonra yenidən cəhd edin...",
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception("Error in filters: " +
-                                                 excp.message)
-                                pass
-                        elif excp.message == "Reply message not found":
-                            try:
-                                context.bot.send_message(
-                                    chat.id,
-                                    filt.reply,
-                                    parse_mode=ParseMode.MARKDOWN,
-                                    disable_web_page_preview=True,
-                                    reply_markup=keyboard,
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception("Error in filters: " +
-                                                 excp.message)
-                                pass
-                        else:
-                            try:
-                                send_message(
-                                    update.effective_message,
-                                    "Mesaj səhv formatlandığından göndərmək uğursuz oldu.",
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception("Error in filters: " +
-                                                 excp.message)
-                                pass
-                            LOGGER.warning("Message %s could not be parsed",
-                                           str(filt.reply))
-                            LOGGER.exception(
-                                "Could not parse filter %s in chat %s",
-                                str(filt.keyword),
-                                str(chat.id),
-                            )
-
+                        LOGGER.exception("Error in filters: " +
+                                         excp.message)
+                        pass
                 else:
-                    # LEGACY - all new filters will have has_markdown set to True.
                     try:
-                        send_message(update.effective_message, filt.reply)
+                        send_message(
+                            update.effective_message,
+                            "Mesaj səhv formatlandığından göndərmək uğursuz oldu.",
+                        )
                     except BadRequest as excp:
-                        LOGGER.exception("Error in filters: " + excp.message)
+                        LOGGER.exception("Error in filters: " +
+                                         excp.message)
                         pass
-                break
+                    LOGGER.warning("Message %s could not be parsed",
+                                   str(filt.reply))
+                    LOGGER.exception(
+                        "Could not parse filter %s in chat %s",
+                        str(filt.keyword),
+                        str(chat.id),
+                    )
+
+        else:
+            # LEGACY - all new filters will have has_markdown set to True.
+            try:
+                send_message(update.effective_message, filt.reply)
+            except BadRequest as excp:
+                LOGGER.exception("Error in filters: " + excp.message)
+                pass
 
 
 @run_async
@@ -1,89 +1,112 @@
-from time import sleep
+import time
+from collections import deque
 
 import SaitamaRobot.modules.sql.global_bans_sql as gban_sql
 import SaitamaRobot.modules.sql.users_sql as user_sql
 from SaitamaRobot import DEV_USERS, OWNER_ID, dispatcher
 from SaitamaRobot.modules.helper_funcs.chat_status import dev_plus
+from SaitamaRobot.modules.helper_funcs.send_queue import (PRIORITY_BULK,
+                                                          queue_submit)
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.error import BadRequest, Unauthorized
+from telegram.error import BadRequest, TelegramError, Unauthorized
 from telegram.ext import (CallbackContext, CallbackQueryHandler, CommandHandler,
                           run_async)
 
 
-def get_invalid_chats(update: Update,
-                      context: CallbackContext,
-                      remove: bool = False):
-    bot = context.bot
-    chat_id = update.effective_chat.id
-    chats = user_sql.get_all_chats()
-    kicked_chats, progress = 0, 0
-    chat_list = []
-    progress_message = None
+PAGE_SIZE = 500
+PROBE_WINDOW = 50  # lookups in flight at once
+PROGRESS_EVERY = 5  # seconds between progress edits
 
-    for chat in chats:
 
-        if ((100 * chats.index(chat)) / len(chats)) > progress:
-            progress_bar = f"{progress}% completed in getting invalid chats."
-            if progress_message:
-                try:
-                    bot.editMessageText(progress_bar, chat_id,
-                                        progress_message.message_id)
-                except:
-                    pass
-            else:
-                progress_message = bot.sendMessage(chat_id, progress_bar)
-            progress += 5
+def _chat_pages():
+    cursor = None
+    while True:
+        page = user_sql.get_chats_page(cursor, PAGE_SIZE)
+        if not page:
+            return
+        yield page
+        cursor = page[-1]
+
+
+def probe_invalid(bot, chat_id, label, pages, total, invalid_errors):
+    """
+    Looks every id up with get_chat and returns those that failed with
+    `invalid_errors`.
 
-        cid = chat.chat_id
-        sleep(0.1)
+    The lookups go through the send queue as bulk jobs, PROBE_WINDOW at a
+    time, and the progress is edited into one message.
+    """
+    invalid = []
+    pending = deque()
+    checked = 0
+    last_edit = time.monotonic()
+    progress_message = bot.sendMessage(chat_id,
+                                       f"Checking {total} {label} ...")
+
+    def settle():
+        target, lookup = pending.popleft()
         try:
-            bot.get_chat(cid, timeout=60)
-        except (BadRequest, Unauthorized):
-            kicked_chats += 1
-            chat_list.append(cid)
-        except:
+            lookup.result()
+        except invalid_errors:
+            invalid.append(target)
+        except TelegramError:
             pass
 
+    for page in pages:
+        for target in page:
+            pending.append((target,
+                            queue_submit(
+                                None,
+                                bot.get_chat,
+                                target,
+                                timeout=60,
+                                priority=PRIORITY_BULK)))
+            if len(pending) < PROBE_WINDOW:
+                continue
+            settle()
+            checked += 1
+            if time.monotonic() - last_edit >= PROGRESS_EVERY:
+                last_edit = time.monotonic()
+                try:
+                    progress_message.edit_text(
+                        f"Checked {checked}/{total} {label}, "
+                        f"{len(invalid)} invalid so far.")
+                except TelegramError:
+                    pass
+    while pending:
+        settle()
+
     try:
         progress_message.delete()
-    except:
+    except TelegramError:
         pass
+    return invalid
+
 
-    if not remove:
-        return kicked_chats
-    else:
-        for muted_chat in chat_list:
-            sleep(0.1)
-            user_sql.rem_chat(muted_chat)
-        return kicked_chats
+def get_invalid_chats(update: Update,
+                      context: CallbackContext,
+                      remove: bool = False):
+    invalid = probe_invalid(context.bot, update.effective_chat.id, "chats",
+                            _chat_pages(), user_sql.num_chats(),
+                            (BadRequest, Unauthorized))
+    if remove:
+        for start in range(0, len(invalid), PAGE_SIZE):
+            user_sql.rem_chats(invalid[start:start + PAGE_SIZE])
+    return len(invalid)
 
 
 def get_invalid_gban(update: Update,
                      context: CallbackContext,
                      remove: bool = False):
-    bot = context.bot
-    banned = gban_sql.get_gban_list()
-    ungbanned_users = 0
-    ungban_list = []
-
-    for user in banned:
-        user_id = user["user_id"]
-        sleep(0.1)
-        try:
-            bot.get_chat(user_id)
-        except BadRequest:
-            ungbanned_users += 1
-            ungban_list.append(user_id)
-        except:
-            pass
-
-    if not remove:
-        return ungbanned_users
-    else:
-        for user_id in ungban_list:
-            sleep(0.1)
-            gban_sql.ungban_user(user_id)
-        return ungbanned_users
+    banned = gban_sql.get_gbanned_ids()
+    pages = (banned[start:start + PAGE_SIZE]
+             for start in range(0, len(banned), PAGE_SIZE))
+    invalid = probe_invalid(context.bot, update.effective_chat.id,
+                            "gbanned users", pages, len(banned), BadRequest)
+    if remove:
+        for start in range(0, len(invalid), PAGE_SIZE):
+            gban_sql.ungban_users(invalid[start:start + PAGE_SIZE])
+    return len(invalid)
 
 
 @run_async
@@ -1,14 +1,20 @@
 import os
 import datetime
+from io import BytesIO
 
 from telethon import events
 from telegram import Update
-from telegram.ext import CallbackContext, CommandHandler, run_async
+from telegram.ext import CallbackContext, CommandHandler, TypeHandler, run_async
 
 from SaitamaRobot import telethn, dispatcher
+from SaitamaRobot.logs import log_archive, log_tail, updates_logger
+from SaitamaRobot.modules.helper_funcs.capture import UpdateCapture
 from SaitamaRobot.modules.helper_funcs.chat_status import dev_plus
 
 DEBUG_MODE = False
+CAPTURE = None  # UpdateCapture while capturing
+CAPTURE_GROUP = -100
+LOG_TAIL_LINES = 200
 
 
 @run_async
@@ -32,22 +38,64 @@ def debug(update: Update, context: CallbackContext):
             message.reply_text("Debug modu hazırda deaktivdir.")
 
 
+UPDATES_LOGGER = updates_logger()
+
+
 @telethn.on(events.NewMessage(pattern="[/!].*"))
 async def i_do_nothing_yes(event):
     global DEBUG_MODE
     if DEBUG_MODE:
         print(f"-{event.from_id} ({event.chat_id}) : {event.text}")
-        if os.path.exists('updates.txt'):
-            with open('updates.txt', 'r') as f:
-                text = f.read()
-            with open('updates.txt', 'w+') as f:
-                f.write(text +
-                        f"\n-{event.from_id} ({event.chat_id}) : {event.text}")
-        else:
-            with open('updates.txt', 'w+') as f:
-                f.write(
-                    f"- {event.from_id} ({event.chat_id}) : {event.text} | {datetime.datetime.now()}"
-                )
+        # queued, the event loop never waits for the disk
+        UPDATES_LOGGER.info("-%s (%s) : %s", event.from_id, event.chat_id,
+                            event.text)
+
+
+def capture_update(update: Update, context: CallbackContext):
+    current = CAPTURE
+    if current is not None:
+        current.add(update)
+
+
+@run_async
+@dev_plus
+def capture(update: Update, context: CallbackContext):
+    global CAPTURE
+    args = update.effective_message.text.split()[1:]
+    message = update.effective_message
+    if args and args[0] in ('yes', 'on'):
+        if CAPTURE is not None:
+            message.reply_text(
+                "Update-lər artıq yazılır: `{}`".format(CAPTURE.path),
+                parse_mode="markdown")
+            return
+        path = datetime.datetime.now().strftime(
+            "updates-%Y%m%d-%H%M%S.jsonl.gz")
+        anonymize = 'anon' in args[1:]
+        CAPTURE = UpdateCapture(
+            path, anonymize=anonymize, keep_ids=[context.bot.id])
+        message.reply_text(
+            "Update-lərin yazılması başladı{}: `{}`".format(
+                " (anonim)" if anonymize else "", path),
+            parse_mode="markdown")
+    elif args and args[0] in ('no', 'off'):
+        if CAPTURE is None:
+            message.reply_text("Update-lər hazırda yazılmır.")
+            return
+        finished, CAPTURE = CAPTURE, None
+        finished.close()
+        message.reply_text(
+            "Update-lərin yazılması dayandı: `{}`, {} update yazıldı, {} "
+            "atlandı.".format(finished.path, finished.written,
+                              finished.dropped),
+            parse_mode="markdown")
+    elif CAPTURE is not None:
+        message.reply_text(
+            "Update-lər hazırda yazılır: `{}`, {} update yazılıb, {} "
+            "atlanıb.".format(CAPTURE.path, CAPTURE.written, CAPTURE.dropped),
+            parse_mode="markdown")
+    else:
+        message.reply_text("Update-lər hazırda yazılmır.")
 
 
 support_chat = os.getenv('SUPPORT_CHAT')
@@ -62,9 +110,16 @@ def logs(update: Update, context: CallbackContext):
     if chat_username != support_chat:
         return
     user = update.effective_user
-    with open('log.txt', 'rb') as f:
-
-        context.bot.send_document(document=f, filename=f.name, chat_id=user.id)
+    args = update.effective_message.text.split()[1:]
+    if args and args[0] == "all":
+        context.bot.send_document(
+            document=log_archive(), filename="logs.zip", chat_id=user.id)
+        return
+    lines = int(args[0]) if args and args[0].isdigit() else LOG_TAIL_LINES
+    context.bot.send_document(
+        document=BytesIO(log_tail(lines)),
+        filename="log-tail.txt",
+        chat_id=user.id)
 
 
 LOG_HANDLER = CommandHandler('logs', logs)
@@ -73,6 +128,13 @@ dispatcher.add_handler(LOG_HANDLER)
 DEBUG_HANDLER = CommandHandler("debug", debug)
 dispatcher.add_handler(DEBUG_HANDLER)
 
+CAPTURE_HANDLER = CommandHandler("capture", capture)
+CAPTURE_UPDATE_HANDLER = TypeHandler(Update, capture_update)
+dispatcher.add_handler(CAPTURE_HANDLER)
+dispatcher.add_handler(CAPTURE_UPDATE_HANDLER, CAPTURE_GROUP)
+
 __mod_name__ = "Debug"
-__command_list__ = ["debug"]
-__handlers__ = [DEBUG_HANDLER]
+__command_list__ = ["debug", "capture"]
+__handlers__ = [
+    DEBUG_HANDLER, CAPTURE_HANDLER, (CAPTURE_UPDATE_HANDLER, CAPTURE_GROUP)
+]
@@ -3,8 +3,13 @@ import subprocess
 import sys
 from time import sleep
 
-from SaitamaRobot import dispatcher
-from SaitamaRobot.modules.helper_funcs.chat_status import dev_plus
+from SaitamaRobot import SQL_ACCOUNTING, dispatcher
+from SaitamaRobot.modules.helper_funcs.chat_cache import cache_info
+from SaitamaRobot.modules.helper_funcs.chat_status import (admin_cache_stats,
+                                                           dev_plus)
+from SaitamaRobot.modules.helper_funcs.metrics import (handler_snapshot,
+                                                       worker_queue_depth)
+from SaitamaRobot.modules.helper_funcs.send_queue import queue_depth
 from telegram import TelegramError, Update
 from telegram.ext import CallbackContext, CommandHandler, run_async
 
@@ -55,13 +60,70 @@ def restart(update: Update, context: CallbackContext):
     os.execv('start.bat', sys.argv)
 
 
+@run_async
+@dev_plus
+def send_queue(update: Update, context: CallbackContext):
+    depth = queue_depth()
+    update.effective_message.reply_text(
+        "Göndərmə növbəsi:\n"
+        "• Növbədə: {interactive} interaktiv, {bulk} toplu\n"
+        "• Limit gözləyən: {rate_limited}\n"
+        "• Göndərilir: {in_flight}\n"
+        "• Göndərildi: {sent}, təkrar: {retried}, uğursuz: {failed}".format(
+            **depth))
+
+
+@run_async
+@dev_plus
+def perf(update: Update, context: CallbackContext):
+    rows = []
+    for (group, name, calls, errors, phases, queries,
+         db_seconds) in handler_snapshot():
+        count, total, p95 = phases["run"] if phases["run"][0] else phases[
+            "dispatch"]
+        check_total = phases["check"][1]
+        rows.append((total + check_total, str(group), name, calls, errors,
+                     count, total, p95, queries))
+    rows.sort(reverse=True)
+
+    text = "İşçi növbəsi: {}\n\n".format(worker_queue_depth())
+    text += "Ən çox vaxt aparan handlerlər:\n"
+    for (busy, group, name, calls, errors, count, total, p95,
+         queries) in rows[:15]:
+        text += "• [{}] {}: {} çağırış, {} xəta, orta {:.1f}ms, p95 <{:g}ms, cəmi {:.1f}s".format(
+            group, name, calls, errors, total / count * 1000 if count else 0,
+            p95 * 1000, busy)
+        if SQL_ACCOUNTING:
+            text += ", {} sorğu".format(queries)
+        text += "\n"
+
+    text += "\nKeşlər:\n"
+    for name, entries, maxsize, hits, misses in cache_info():
+        text += "• {}: {}/{}, isabət {:.0%}\n".format(
+            name, entries, maxsize, hits / (hits + misses) if hits + misses else 0)
+    admins = admin_cache_stats()
+    text += "• adminlər: {}/{}, isabət {:.0%}, {} çıxarılma, {} yükləmə xətası\n".format(
+        admins["size"], admins["maxsize"],
+        admins["hits"] / (admins["hits"] + admins["misses"])
+        if admins["hits"] + admins["misses"] else 0, admins["evictions"],
+        admins["load_errors"])
+    update.effective_message.reply_text(text)
+
+
 LEAVE_HANDLER = CommandHandler("leave", leave)
 GITPULL_HANDLER = CommandHandler("gitpull", gitpull)
 RESTART_HANDLER = CommandHandler("reboot", restart)
+SEND_QUEUE_HANDLER = CommandHandler("sendqueue", send_queue)
+PERF_HANDLER = CommandHandler("perf", perf)
 
 dispatcher.add_handler(LEAVE_HANDLER)
 dispatcher.add_handler(GITPULL_HANDLER)
 dispatcher.add_handler(RESTART_HANDLER)
+dispatcher.add_handler(SEND_QUEUE_HANDLER)
+dispatcher.add_handler(PERF_HANDLER)
 
 __mod_name__ = "Dev"
-__handlers__ = [LEAVE_HANDLER, GITPULL_HANDLER, RESTART_HANDLER]
+__handlers__ = [
+    LEAVE_HANDLER, GITPULL_HANDLER, RESTART_HANDLER, SEND_QUEUE_HANDLER,
+    PERF_HANDLER
+]
@@ -574,7 +574,8 @@ Aşağıdakı əmrləri yalnız bot adminləri istifadə edə bilər. Qrup sahib
 
  ╔ *Debugging və Shell:* 
  ╠ `/debug <on/off>`*:* Logs commands to updates.txt
- ╠ `/logs`*:* support qrupunda yazanda şəxsidən log atır
+ ╠ `/capture <on/off> [anon]`*:* gələn update-ləri təkrar oxutmaq üçün yazır
+ ╠ `/logs [sətir sayı/all]`*:* support qrupunda yazanda şəxsidən logun sonunu, `all` ilə bütün logları zip olaraq atır
  ╠ `/eval`*:* Self explanatory
  ╠ `/sh`*:* shell
  ╚ `/py`*:* python
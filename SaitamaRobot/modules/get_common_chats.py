@@ -1,8 +1,9 @@
 import os
-from time import sleep
 
-from SaitamaRobot import OWNER_ID, dispatcher
+from SaitamaRobot import LOGGER, OWNER_ID, dispatcher
 from SaitamaRobot.modules.helper_funcs.extraction import extract_user
+from SaitamaRobot.modules.helper_funcs.send_queue import (PRIORITY_BULK,
+                                                          queue_submit)
 from SaitamaRobot.modules.sql.users_sql import get_user_com_chats
 from telegram import Update
 from telegram.error import BadRequest, RetryAfter, Unauthorized
@@ -24,17 +25,23 @@ def get_user_common_chats(update: Update, context: CallbackContext):
         return
     name = bot.get_chat(user).first_name
     text = f"<b>{name} ilə ortaq qruplarım</b>\n"
-    for chat in common_list:
+    # the send queue paces these and retries on flood wait
+    lookups = [
+        queue_submit(None, bot.get_chat, chat, priority=PRIORITY_BULK)
+        for chat in common_list
+    ]
+    for chat, lookup in zip(common_list, lookups):
         try:
-            chat_name = bot.get_chat(chat).title
-            sleep(0.3)
+            chat_name = lookup.result().title
             text += f"• <code>{chat_name}</code>\n"
         except BadRequest:
             pass
         except Unauthorized:
             pass
-        except RetryAfter as e:
-            sleep(e.retry_after)
+        except RetryAfter as excp:
+            # the send queue already retried it
+            LOGGER.warning("Skipping common chat %s, flood wait of %ss",
+                           chat, excp.retry_after)
 
     if len(text) < 4096:
         msg.reply_text(text, parse_mode="HTML")
@@ -6,13 +6,18 @@ from SaitamaRobot.modules.sql.users_sql import get_user_com_chats
 import SaitamaRobot.modules.sql.global_bans_sql as sql
 from SaitamaRobot import (DEV_USERS, EVENT_LOGS, OWNER_ID, STRICT_GBAN, DRAGONS,
                           SUPPORT_CHAT, SPAMWATCH_SUPPORT_CHAT, DEMONS, TIGERS,
-                          WOLVES, sw, dispatcher)
-from SaitamaRobot.modules.helper_funcs.chat_status import (is_user_admin,
+                          WOLVES, dispatcher)
+from SaitamaRobot.modules.helper_funcs.aio import get_actions
+from SaitamaRobot.modules.helper_funcs.chat_status import (get_bot_member,
+                                                           is_user_admin,
                                                            support_plus,
                                                            user_admin)
 from SaitamaRobot.modules.helper_funcs.extraction import (extract_user,
                                                           extract_user_and_text)
 from SaitamaRobot.modules.helper_funcs.misc import send_to_list
+from SaitamaRobot.modules.helper_funcs.send_queue import (PRIORITY_BULK,
+                                                          queue_call)
+from SaitamaRobot.modules.helper_funcs.spamwatch_cache import get_sw_ban
 from telegram import ParseMode, Update
 from telegram.error import BadRequest, TelegramError
 from telegram.ext import (CallbackContext, CommandHandler, Filters,
@@ -189,7 +194,12 @@ def gban(update: Update, context: CallbackContext):
             continue
 
         try:
-            bot.kick_chat_member(chat_id, user_id)
+            queue_call(
+                None,
+                bot.kick_chat_member,
+                chat_id,
+                user_id,
+                priority=PRIORITY_BULK)
             gbanned_chats += 1
 
         except BadRequest as excp:
@@ -310,9 +320,19 @@ def ungban(update: Update, context: CallbackContext):
             continue
 
         try:
-            member = bot.get_chat_member(chat_id, user_id)
+            member = queue_call(
+                None,
+                bot.get_chat_member,
+                chat_id,
+                user_id,
+                priority=PRIORITY_BULK)
             if member.status == 'kicked':
-                bot.unban_chat_member(chat_id, user_id)
+                queue_call(
+                    None,
+                    bot.unban_chat_member,
+                    chat_id,
+                    user_id,
+                    priority=PRIORITY_BULK)
                 ungbanned_chats += 1
 
         except BadRequest as excp:
@@ -380,15 +400,14 @@ def gbanlist(update: Update, context: CallbackContext):
 def check_and_ban(update, user_id, should_message=True):
 
     chat = update.effective_chat  # type: Optional[Chat]
-    try:
-        sw_ban = sw.get_ban(int(user_id))
-    except AttributeError:
-        sw_ban = None
+    actions = get_actions(chat.bot, __name__)
+    sw_ban = get_sw_ban(user_id)
 
     if sw_ban:
-        update.effective_chat.kick_member(user_id)
+        actions.kick_chat_member(chat.id, user_id)
         if should_message:
-            update.effective_message.reply_text(
+            actions.reply_text(
+                update.effective_message,
                 f"<b>Diqqət</b>: Bu istifadəçi qlobal olaraq banlandı.\n"
                 f"<code>*onu buradan banlayıram*</code>.\n"
                 f"<b>Appeal chat</b>: {SPAMWATCH_SUPPORT_CHAT}\n"
@@ -398,7 +417,7 @@ def check_and_ban(update, user_id, should_message=True):
         return
 
     if sql.is_user_gbanned(user_id):
-        update.effective_chat.kick_member(user_id)
+        actions.kick_chat_member(chat.id, user_id)
         if should_message:
             text = f"<b>Diqqət</b>: Bu istifadəçi qlobal olaraq banlandı.\n" \
                    f"<code>*onu buradan banlayıram*</code>.\n" \
@@ -407,16 +426,16 @@ def check_and_ban(update, user_id, should_message=True):
             user = sql.get_gbanned_user(user_id)
             if user.reason:
                 text += f"\n<b>Səbəb:</b> <code>{html.escape(user.reason)}</code>"
-            update.effective_message.reply_text(text, parse_mode=ParseMode.HTML)
+            actions.reply_text(
+                update.effective_message, text, parse_mode=ParseMode.HTML)
 
 
 @run_async
 def enforce_gban(update: Update, context: CallbackContext):
     # Not using @restrict handler to avoid spamming - just ignore if cant gban.
     bot = context.bot
-    if sql.does_chat_gban(
-            update.effective_chat.id) and update.effective_chat.get_member(
-                bot.id).can_restrict_members:
+    if sql.does_chat_gban(update.effective_chat.id) and get_bot_member(
+            update.effective_chat, bot.id).can_restrict_members:
         user = update.effective_user
         chat = update.effective_chat
         msg = update.effective_message
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+
+import aiohttp
+from SaitamaRobot import ASYNC_CONCURRENCY, ASYNC_MODULES, LOGGER
+from SaitamaRobot.modules.helper_funcs.alternate import send_message
+from SaitamaRobot.modules.helper_funcs.chat_status import (
+    invalidate_bot_member, is_rights_error)
+from telegram import TelegramObject
+from telegram.error import (BadRequest, ChatMigrated, NetworkError,
+                            RetryAfter, TelegramError, Unauthorized)
+from telegram.utils.helpers import to_timestamp
+
+# the sync handlers swallowed these anyway
+IGNORED_ERRORS = ("message to delete not found", "message can't be deleted")
+MAX_RETRIES = 3
+
+LOOP = None
+LOOP_LOCK = threading.Lock()
+HTTP_SESSION = None
+API_LIMIT = None
+
+
+def is_async(module):
+    return module.rsplit(".", 1)[-1] in ASYNC_MODULES
+
+
+def get_loop():
+    global LOOP
+    with LOOP_LOCK:
+        if LOOP is None:
+            LOOP = asyncio.new_event_loop()
+            threading.Thread(
+                target=LOOP.run_forever, name="aio_dispatch",
+                daemon=True).start()
+    return LOOP
+
+
+def submit(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def _jsonify(value):
+    if isinstance(value, TelegramObject):
+        return value.to_dict()
+    if hasattr(value, "timestamp"):  # datetime
+        return to_timestamp(value)
+    return value
+
+
+def _api_error(status, result):
+    description = result.get("description", "Unknown HTTPError")
+    parameters = result.get("parameters") or {}
+    if "retry_after" in parameters:
+        return RetryAfter(parameters["retry_after"])
+    if "migrate_to_chat_id" in parameters:
+        return ChatMigrated(parameters["migrate_to_chat_id"])
+    if status in (401, 403):
+        return Unauthorized(description)
+    if status == 400:
+        return BadRequest(description)
+    if status >= 500:
+        return NetworkError(description)
+    return TelegramError(description)
+
+
+async def api_call(bot, method, params):
+    """Bot API request on the asyncio loop, at most ASYNC_CONCURRENCY at once."""
+    global HTTP_SESSION, API_LIMIT
+    if HTTP_SESSION is None:
+        HTTP_SESSION = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=30))
+        API_LIMIT = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    data = {
+        key: _jsonify(value)
+        for key, value in params.items()
+        if value is not None
+    }
+    for attempt in range(MAX_RETRIES):
+        try:
+            async with API_LIMIT:
+                async with HTTP_SESSION.post(
+                        "{}/{}".format(bot.base_url, method),
+                        json=data) as resp:
+                    status = resp.status
+                    result = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError,
+                ValueError) as excp:
+            raise NetworkError(str(excp) or "Timed out")
+
+        if result.get("ok"):
+            return result["result"]
+        error = _api_error(status, result)
+        if isinstance(error, RetryAfter) and attempt < MAX_RETRIES - 1:
+            await asyncio.sleep(error.retry_after)
+            continue
+        raise error
+
+
+class BotActions:
+    """
+    The Bot API calls a handler makes to act on an update.
+
+    Plain bot calls by default. For modules in ASYNC_MODULES they go through
+    the asyncio client and return a Future right away, so the worker thread
+    isn't held up by Telegram. Calls made through one BotActions still run
+    in order, e.g. the kick is done before the unban.
+    """
+
+    def __init__(self, bot, asynchronous=False):
+        self.bot = bot
+        self.asynchronous = asynchronous
+        self._last = None
+
+    def _call(self, name, method, **params):
+        if not self.asynchronous:
+            return getattr(self.bot, name)(**params)
+        self._last = submit(self._run(self._last, method, params))
+        return self._last
+
+    async def _run(self, prev, method, params):
+        if prev is not None:
+            try:
+                await asyncio.wrap_future(prev)
+            except Exception:
+                pass
+        try:
+            return await api_call(self.bot, method, params)
+        except TelegramError as excp:
+            chat_id = params.get("chat_id")
+            if isinstance(excp, BadRequest):
+                if is_rights_error(excp):
+                    invalidate_bot_member(chat_id)
+                if excp.message.lower() in IGNORED_ERRORS:
+                    return None
+            LOGGER.warning("%s in %s failed: %s", method, chat_id,
+                           excp.message)
+            return None
+
+    def on_success(self, result, callback):
+        """
+        Calls `callback(result)` if the call that returned `result` worked,
+        once the Future is done for asynchronous calls.
+        """
+        if not self.asynchronous:
+            if result:
+                callback(result)
+            return
+
+        def done(future):
+            if not future.cancelled() and future.exception() is None:
+                if future.result():
+                    callback(future.result())
+
+        result.add_done_callback(done)
+
+    def delete_message(self, chat_id, message_id):
+        return self._call(
+            "delete_message",
+            "deleteMessage",
+            chat_id=chat_id,
+            message_id=message_id)
+
+    def kick_chat_member(self, chat_id, user_id, until_date=None):
+        return self._call(
+            "kick_chat_member",
+            "kickChatMember",
+            chat_id=chat_id,
+            user_id=user_id,
+            until_date=until_date)
+
+    def unban_chat_member(self, chat_id, user_id):
+        return self._call(
+            "unban_chat_member",
+            "unbanChatMember",
+            chat_id=chat_id,
+            user_id=user_id)
+
+    def restrict_chat_member(self,
+                             chat_id,
+                             user_id,
+                             permissions,
+                             until_date=None):
+        return self._call(
+            "restrict_chat_member",
+            "restrictChatMember",
+            chat_id=chat_id,
+            user_id=user_id,
+            permissions=permissions,
+            until_date=until_date)
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._call(
+            "send_message",
+            "sendMessage",
+            chat_id=chat_id,
+            text=text,
+            **kwargs)
+
+    def reply_text(self, message, text, **kwargs):
+        if not self.asynchronous:
+            return send_message(message, text, **kwargs)
+        return self.send_message(
+            message.chat_id,
+            text,
+            reply_to_message_id=message.message_id,
+            allow_sending_without_reply=True,
+            **kwargs)
+
+
+def get_actions(bot, module):
+    return BotActions(bot, is_async(module))
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import SaitamaRobot.modules.sql.broadcast_sql as broadcast_sql
+import SaitamaRobot.modules.sql.users_sql as users_sql
+from SaitamaRobot import LOGGER
+from SaitamaRobot.modules.helper_funcs.send_queue import (PRIORITY_BULK,
+                                                          queue_submit)
+from telegram.error import BadRequest, TelegramError, Unauthorized
+
+PAGE_SIZE = 200
+REPORT_EVERY = 5  # seconds between progress edits
+
+# errors after which a group is gone for good
+DEAD_CHAT_ERRORS = ("chat not found", "group chat was deactivated",
+                    "bot was kicked from the supergroup chat",
+                    "bot was kicked from the group chat",
+                    "bot is not a member of the supergroup chat",
+                    "bot is not a member of the group chat")
+
+RUNNING = {}  # job_id -> Broadcaster
+RUNNING_LOCK = threading.Lock()
+
+
+def _is_dead_chat(excp):
+    if isinstance(excp, Unauthorized):
+        return True
+    return (isinstance(excp, BadRequest) and
+            excp.message.lower() in DEAD_CHAT_ERRORS)
+
+
+class Broadcaster(threading.Thread):
+    """
+    Sends one broadcast job page by page through the send queue.
+
+    After every page the job is checkpointed, so a restart picks it up from
+    the last recipient handled instead of from the start.
+    """
+
+    def __init__(self, bot, job):
+        super().__init__(name="broadcast_{}".format(job.id), daemon=True)
+        self.bot = bot
+        self.job = job
+        self.stage = job.stage
+        self.cursor = job.cursor
+        self.sent = job.sent
+        self.failed = job.failed
+        self.removed = job.removed
+        self.report_message = job.report_message
+        self.handled = 0  # sends done by this run, for the rate
+        self.started = time.monotonic()
+        self.last_report = 0
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.handled / elapsed if elapsed else 0
+
+    def status(self):
+        return "#{}: {}, {} göndərildi, {} uğursuz, {} qrup silindi, {:.1f} msj/s".format(
+            self.job.id, self.stage, self.sent, self.failed, self.removed,
+            self.rate())
+
+    def _report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < REPORT_EVERY:
+            return
+        self.last_report = now
+        text = "Yayım " + self.status()
+        try:
+            if self.report_message:
+                self.bot.edit_message_text(
+                    text,
+                    chat_id=self.job.report_chat,
+                    message_id=self.report_message)
+            else:
+                self.report_message = self.bot.send_message(
+                    self.job.report_chat, text).message_id
+        except BadRequest as excp:
+            if excp.message != "Message is not modified":
+                LOGGER.warning("Broadcast report failed: %s", excp.message)
+        except TelegramError as excp:
+            LOGGER.warning("Broadcast report failed: %s", excp.message)
+
+    def _next_page(self):
+        if self.stage == "groups":
+            return users_sql.get_chats_page(self.cursor, PAGE_SIZE)
+        return users_sql.get_users_page(self.cursor, PAGE_SIZE)
+
+    def _send_page(self, page):
+        sends = [(recipient,
+                  queue_submit(
+                      int(recipient),
+                      self.bot.send_message,
+                      int(recipient),
+                      self.job.text,
+                      parse_mode="MARKDOWN",
+                      disable_web_page_preview=True,
+                      priority=PRIORITY_BULK)) for recipient in page]
+        dead = []
+        for recipient, send in sends:
+            try:
+                send.result()
+                self.sent += 1
+            except TelegramError as excp:
+                self.failed += 1
+                if self.stage == "groups" and _is_dead_chat(excp):
+                    dead.append(recipient)
+            self.handled += 1
+        if dead:
+            users_sql.rem_chats(dead)
+            self.removed += len(dead)
+
+    def _step(self):
+        page = self._next_page()
+        if page:
+            self._send_page(page)
+            self.cursor = page[-1]
+        elif self.stage == "groups" and self.job.to_users:
+            self.stage, self.cursor = "users", None
+        else:
+            self.stage, self.cursor = "done", None
+        return broadcast_sql.checkpoint(self.job.id, self.stage, self.cursor,
+                                        self.sent, self.failed, self.removed,
+                                        self.report_message)
+
+    def run(self):
+        try:
+            self._report(force=True)
+            while self.stage in ("groups", "users"):
+                if not self._step():
+                    self.stage = "cancelled"
+                    break
+                self._report()
+            self._report(force=True)
+        except Exception:
+            LOGGER.exception("Broadcast %s stopped, resuming on restart",
+                             self.job.id)
+        finally:
+            with RUNNING_LOCK:
+                RUNNING.pop(self.job.id, None)
+
+
+def _start(bot, job):
+    with RUNNING_LOCK:
+        if job.id in RUNNING:
+            return RUNNING[job.id]
+        runner = RUNNING[job.id] = Broadcaster(bot, job)
+    runner.start()
+    return runner
+
+
+def start_broadcast(bot, text, to_groups, to_users, report_chat):
+    job_id = broadcast_sql.new_job(text, to_groups, to_users, report_chat)
+    _start(bot, broadcast_sql.get_job(job_id))
+    return job_id
+
+
+def resume_broadcasts(bot):
+    for job in broadcast_sql.get_unfinished_jobs():
+        LOGGER.info("Resuming broadcast %s from %s %s", job.id, job.stage,
+                    job.cursor)
+        _start(bot, job)
+
+
+def cancel_broadcast(job_id):
+    # the runner notices at its next checkpoint
+    return broadcast_sql.cancel_job(job_id)
+
+
+def running_broadcasts():
+    with RUNNING_LOCK:
+        return list(RUNNING.values())
@@ -0,0 +1,178 @@
+"""
+Snapshots of the in-memory sql caches, so a restarted bot answers from
+warm caches right away instead of rebuilding them from the database.
+
+Caches register themselves as sources. With CACHE_SNAPSHOT set, __main__
+calls restore_snapshot() once every module is imported: sources found in
+the snapshot are filled from it and then checked against the database in
+a background thread, the others are loaded as usual. The snapshot is
+written again every CACHE_SNAPSHOT_INTERVAL seconds and on exit.
+"""
+import atexit
+import mmap
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from SaitamaRobot import CACHE_SNAPSHOT, CACHE_SNAPSHOT_INTERVAL, LOGGER
+from SaitamaRobot.modules.helper_funcs.startup import defer
+
+# bump when the layout of a cache's data changes without a schema change
+SNAPSHOT_VERSION = 1
+
+# name -> (dump, restore, reconcile, load)
+SOURCES = OrderedDict()
+WRITE_LOCK = threading.Lock()
+RESTORED = False  # sources registering after restore_snapshot() just load
+SCHEMA = None  # fingerprint of the tables known at restore_snapshot()
+
+
+def register(name, dump, restore, reconcile, load=None):
+    """
+    `dump()` returns the source's data pickled, `restore(data)` puts it
+    back, `reconcile(data)` brings restored data up to date with the
+    database. `load()`, if given, is the usual full load: it's deferred
+    right away without snapshots, or later when the snapshot lacks the
+    source.
+    """
+    SOURCES[name] = (dump, restore, reconcile, load)
+    if load is not None and (not CACHE_SNAPSHOT or RESTORED):
+        defer("load " + name, load)
+
+
+def register_globals(name, module_name, attrs, load, lock):
+    """A source made of module globals that `load()` rebinds."""
+    module = sys.modules[module_name]
+
+    def dump():
+        with lock:
+            return pickle.dumps({attr: getattr(module, attr) for attr in attrs},
+                                pickle.HIGHEST_PROTOCOL)
+
+    def restore(data):
+        for attr, value in data.items():
+            setattr(module, attr, value)
+
+    def reconcile(_):
+        with lock:
+            load()
+
+    register(name, dump, restore, reconcile, load)
+
+
+def schema_fingerprint():
+    from SaitamaRobot.modules.helper_funcs.chat_profile import SECTIONS
+    from SaitamaRobot.modules.sql.schema import fingerprint
+
+    parts = [str(SNAPSHOT_VERSION), fingerprint()]
+    for name, (model, columns) in SECTIONS.items():
+        parts.append("{}={}{}".format(name, model.__tablename__, columns))
+    return sha256("\n".join(parts).encode()).hexdigest()
+
+
+def write_snapshot(path=CACHE_SNAPSHOT):
+    start = time.perf_counter()
+    sources = {}
+    for name, (dump, *_) in list(SOURCES.items()):
+        try:
+            sources[name] = dump()
+        except Exception:
+            LOGGER.exception("Couldn't snapshot cache %s", name)
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "schema": SCHEMA or schema_fingerprint(),
+        "written": time.time(),
+        "sources": sources,
+    }
+    with WRITE_LOCK:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            pickle.dump(snapshot, out, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    LOGGER.info("Cache snapshot written in %.2fs, %d bytes",
+                time.perf_counter() - start, os.path.getsize(path))
+
+
+def read_snapshot(path=CACHE_SNAPSHOT, schema=None):
+    """The snapshot's sources if it's usable with this code, else None."""
+    try:
+        with open(path, "rb") as snapshot_file:
+            with mmap.mmap(
+                    snapshot_file.fileno(), 0,
+                    access=mmap.ACCESS_READ) as mapped:
+                snapshot = pickle.loads(mapped)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        LOGGER.exception("Couldn't read the cache snapshot %s", path)
+        return None
+    if (snapshot.get("version") != SNAPSHOT_VERSION or
+            snapshot.get("schema") != (schema or schema_fingerprint())):
+        LOGGER.info("Cache snapshot %s is from another version, ignored", path)
+        return None
+    LOGGER.info("Cache snapshot from %s",
+                time.strftime("%Y-%m-%d %H:%M:%S",
+                              time.localtime(snapshot["written"])))
+    return snapshot["sources"]
+
+
+def _reconcile(restored):
+    start = time.perf_counter()
+    for name, reconcile, data in restored:
+        try:
+            reconcile(data)
+        except Exception:
+            LOGGER.exception("Couldn't reconcile cache %s", name)
+    LOGGER.info("Cache snapshot reconciled with the database in %.1fs",
+                time.perf_counter() - start)
+
+
+def _write_periodically():
+    while True:
+        time.sleep(CACHE_SNAPSHOT_INTERVAL)
+        try:
+            write_snapshot()
+        except Exception:
+            LOGGER.exception("Couldn't write the cache snapshot")
+
+
+def restore_snapshot():
+    global RESTORED, SCHEMA
+    if not CACHE_SNAPSHOT or RESTORED:
+        return
+    RESTORED = True
+
+    start = time.perf_counter()
+    SCHEMA = schema_fingerprint()
+    sources = read_snapshot(schema=SCHEMA) or {}
+    restored = []
+    for name, (_, restore, reconcile, load) in SOURCES.items():
+        data = sources.get(name)
+        if data is not None:
+            try:
+                data = pickle.loads(data)
+                restore(data)
+                restored.append((name, reconcile, data))
+                continue
+            except Exception:
+                LOGGER.exception("Couldn't restore cache %s", name)
+        if load is not None:
+            defer("load " + name, load)
+    LOGGER.info("Restored %d of %d caches from the snapshot in %.2fs",
+                len(restored), len(SOURCES), time.perf_counter() - start)
+
+    if restored:
+        threading.Thread(
+            target=_reconcile,
+            args=(restored,),
+            name="cache_reconcile",
+            daemon=True).start()
+    if CACHE_SNAPSHOT_INTERVAL:
+        threading.Thread(
+            target=_write_periodically, name="cache_snapshot",
+            daemon=True).start()
+    atexit.register(write_snapshot)
@@ -0,0 +1,145 @@
+import gzip
+import hmac
+import json
+import os
+import queue
+import re
+import threading
+import time
+from hashlib import sha256
+
+from SaitamaRobot import LOGGER
+
+# Telegram's own accounts, kept as they are when anonymizing
+SERVICE_IDS = {777000, 1087968824, 136817688}
+
+ID_KEYS = ("id", "user_id", "migrate_to_chat_id", "migrate_from_chat_id")
+TEXT_KEYS = ("text", "caption", "first_name", "last_name", "title",
+             "username", "query", "question", "phone_number", "vcard",
+             "address", "bio", "description")
+
+# Message flags to_dict() writes out even when unset
+MESSAGE_FLAGS = ("delete_chat_photo", "group_chat_created",
+                 "supergroup_chat_created", "channel_chat_created")
+
+QUEUE_SIZE = 100000
+WORD = re.compile(r"\w+")
+
+
+def compact(data):
+    """Drop the empty lists and unset flags PTB fills in on parsing."""
+    if isinstance(data, list):
+        return [compact(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: compact(value)
+        for key, value in data.items()
+        if value != [] and not (key in MESSAGE_FLAGS and value is False)
+    }
+
+
+class UpdateCapture:
+    """
+    Writes updates as gzip compressed JSON lines, {"t": arrival, "update":
+    ...}, from a thread of its own. Updates arriving while the queue is
+    full are dropped and counted rather than slowing the dispatcher down.
+
+    With anonymize, user and chat ids and words are replaced by stable
+    pseudonyms of the same length: the same user or word maps to the same
+    value within one capture, so floods and repeated triggers still look
+    the same, and message entities keep their offsets.
+    """
+
+    def __init__(self, path, anonymize=False, keep_ids=()):
+        self.path = path
+        self.anonymize = anonymize
+        self.keep_ids = SERVICE_IDS | set(keep_ids)
+        self.salt = os.urandom(16)
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(
+            target=self._run, name="update_capture", daemon=True)
+        self.thread.start()
+
+    def add(self, update):
+        try:
+            self.queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _hash(self, value):
+        return hmac.new(self.salt, str(value).encode(), sha256).hexdigest()
+
+    def _fake_id(self, value):
+        if value in self.keep_ids:
+            return value
+        digits = str(abs(value))
+        prefix = ""
+        if value < 0 and len(digits) == 13 and digits.startswith("100"):
+            prefix, digits = "100", digits[3:]  # supergroups and channels
+        fake = str(int(self._hash(value), 16))[:len(digits)]
+        fake = int(prefix + fake)
+        return -fake if value < 0 else fake
+
+    def _fake_word(self, match):
+        word = match.group(0)
+        if word.isdigit() and len(word) <= 3:
+            return word  # limits and counts, /setflood 8
+        letters = "".join(chr(97 + int(char, 16)) for char in self._hash(word))
+        return (letters * (len(word) // len(letters) + 1))[:len(word)]
+
+    def _fake_text(self, text):
+        command = ""
+        if text.startswith(("/", "!")):
+            # keep the command so the replay reaches the same handler
+            command, _, text = text.partition(" ")
+            command += " " if text else ""
+        return command + WORD.sub(self._fake_word, text)
+
+    def _anonymize(self, data):
+        if isinstance(data, list):
+            return [self._anonymize(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for key, value in data.items():
+            if key in ID_KEYS and isinstance(value, int):
+                value = self._fake_id(value)
+            elif key in TEXT_KEYS and isinstance(value, str):
+                value = self._fake_text(value)
+            else:
+                value = self._anonymize(value)
+            result[key] = value
+        return result
+
+    def _run(self):
+        last_flush = time.monotonic()
+        with gzip.open(self.path, "at", encoding="utf-8") as out:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                arrived, update = item
+                try:
+                    data = compact(update.to_dict())
+                    if self.anonymize:
+                        data = self._anonymize(data)
+                    line = json.dumps({"t": round(arrived, 3), "update": data},
+                                      ensure_ascii=False,
+                                      separators=(",", ":"))
+                    out.write(line + "\n")
+                    self.written += 1
+                except Exception:
+                    LOGGER.exception("Couldn't capture update %s",
+                                     getattr(update, "update_id", None))
+                # readable while it's still being written, without giving
+                # up compression by flushing every line
+                if self.queue.empty() and time.monotonic() - last_flush > 5:
+                    out.flush()
+                    last_flush = time.monotonic()
@@ -0,0 +1,148 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+from cachetools import LRUCache, TTLCache
+from SaitamaRobot import CHAT_CACHE_SIZE, CHAT_CACHE_TTL, LOGGER
+from SaitamaRobot.modules.helper_funcs import cache_snapshot
+
+# name -> ChatCache, for /perf and the metrics
+CACHES = OrderedDict()
+
+
+class ChatCache:
+    """Per-chat (or per-user) data of an sql module, loaded on first use.
+
+    `load(key)` reads one chat's data from the database. At most `maxsize`
+    chats are kept, least recently used go first, and with a `ttl` entries
+    are also reloaded that many seconds after they were loaded. Writers
+    `set` the new value after their commit, or `invalidate` the chat.
+
+    With `snapshot`, the cached chats are saved in the cache snapshot.
+    """
+
+    def __init__(self, name, load, maxsize=CHAT_CACHE_SIZE,
+                 ttl=CHAT_CACHE_TTL, snapshot=True):
+        self.name = name
+        self.load = load
+        self.maxsize = maxsize
+        self.cache = TTLCache(maxsize, ttl) if ttl else LRUCache(maxsize)
+        self.lock = threading.Lock()
+        self.loading = {}  # key -> False once written during the load
+        self.hits = 0
+        self.misses = 0
+        CACHES[name] = self
+        if snapshot:
+            cache_snapshot.register("cache:" + name, self.dump, self.restore,
+                                    self.reconcile)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def get(self, key):
+        key = str(key)
+        with self.lock:
+            try:
+                value = self.cache[key]
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                return value
+            self.misses += 1
+            # only the first concurrent load may fill the cache
+            owner = key not in self.loading
+            if owner:
+                self.loading[key] = True
+
+        try:
+            value = self.load(key)
+        except Exception:
+            if owner:
+                with self.lock:
+                    self.loading.pop(key, None)
+            raise
+        if owner:
+            with self.lock:
+                if self.loading.pop(key):
+                    self.cache[key] = value
+        return value
+
+    def refresh(self, key):
+        """Reload a cached chat, True if it had changed."""
+        key = str(key)
+        with self.lock:
+            if key not in self.cache or key in self.loading:
+                return False
+            self.loading[key] = True
+        try:
+            value = self.load(key)
+        except Exception:
+            with self.lock:
+                self.loading.pop(key, None)
+            raise
+        with self.lock:
+            if not self.loading.pop(key) or key not in self.cache:
+                return False
+            changed = self.cache[key] != value
+            if changed:
+                self.cache[key] = value
+        return changed
+
+    def peek(self, key, default=None):
+        with self.lock:
+            return self.cache.get(str(key), default)
+
+    def set(self, key, value):
+        key = str(key)
+        with self.lock:
+            self.cache[key] = value
+            if key in self.loading:
+                self.loading[key] = False
+
+    def update(self, key, func):
+        """Change the cached value in place with `func`, if it's cached."""
+        key = str(key)
+        with self.lock:
+            value = self.cache.get(key)
+            if value is not None:
+                func(value)
+            if key in self.loading:
+                self.loading[key] = False
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                key = str(key)
+                self.cache.pop(key, None)
+                if key in self.loading:
+                    self.loading[key] = False
+
+    def dump(self):
+        with self.lock:
+            return pickle.dumps(list(self.cache.items()),
+                                pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, items):
+        with self.lock:
+            for key, value in items:
+                self.cache[key] = value
+
+    def reconcile(self, items):
+        changed = sum(self.refresh(key) for key, _ in items)
+        if changed:
+            LOGGER.info(
+                "%d of %d chats in cache %s changed since the snapshot",
+                changed, len(items), self.name)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            for key in self.loading:
+                self.loading[key] = False
+
+
+def cache_info():
+    """[(name, entries, maxsize, hits, misses)]"""
+    return [(cache.name, len(cache), cache.maxsize, cache.hits, cache.misses)
+            for cache in list(CACHES.values())]
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+from SaitamaRobot import CHAT_PROFILE_CACHE_SIZE
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.sql import SESSION
+from sqlalchemy import String, literal, select
+
+# section name -> (model, column names). Every sql module with per-chat
+# settings registers its table here, a profile holds one row per section.
+SECTIONS = OrderedDict()
+
+
+class ChatProfile(dict):
+    """All per-chat settings of one chat, section name -> row tuple.
+
+    A section is None when the chat has no row in that table, getters fall
+    back to their usual defaults then.
+    """
+
+    def __init__(self, chat_id, sections):
+        super().__init__(sections)
+        self.chat_id = chat_id
+
+
+def register_section(name, model, columns):
+    SECTIONS[name] = (model, tuple(columns))
+    PROFILES.clear()
+
+
+def _row(name, obj):
+    if obj is None:
+        return None
+    _, columns = SECTIONS[name]
+    return tuple(getattr(obj, col) for col in columns)
+
+
+def _load_profile(chat_id):
+    sections = list(SECTIONS.items())
+    chat = select([literal(chat_id, String).label("chat_id")]).alias("chat")
+
+    entities = []
+    for _, (model, columns) in sections:
+        entities.append(model.chat_id)
+        entities.extend(getattr(model, col) for col in columns)
+
+    # one outer join per table, so a miss costs a single round trip
+    query = SESSION.query(*entities).select_from(chat)
+    for _, (model, _) in sections:
+        query = query.outerjoin(model, model.chat_id == chat.c.chat_id)
+
+    try:
+        row = query.first()
+    finally:
+        SESSION.close()
+
+    values = {}
+    pos = 0
+    for name, (_, columns) in sections:
+        present = row[pos] is not None
+        values[name] = tuple(row[pos + 1:pos + 1 + len(columns)]) \
+            if present else None
+        pos += 1 + len(columns)
+    return ChatProfile(chat_id, values)
+
+
+PROFILES = ChatCache(
+    "chat_profile", _load_profile, maxsize=CHAT_PROFILE_CACHE_SIZE)
+
+
+def get_chat_profile(chat_id):
+    profile = PROFILES.get(chat_id)
+    if len(profile) != len(SECTIONS):
+        # loaded before a module registered its section
+        PROFILES.invalidate(chat_id)
+        profile = PROFILES.get(chat_id)
+    return profile
+
+
+def get_profile_section(chat_id, name):
+    return get_chat_profile(chat_id).get(name)
+
+
+def update_profile_section(chat_id, name, obj):
+    """Write-through for setters, `obj` is the saved row or None if deleted."""
+    row = _row(name, obj)
+
+    def update(profile):
+        profile[name] = row
+
+    PROFILES.update(chat_id, update)
+
+
+def invalidate_chat_profile(*chat_ids):
+    PROFILES.invalidate(*chat_ids)
@@ -1,15 +1,47 @@
+import time
+from concurrent.futures import Future
 from functools import wraps
 from cachetools import TTLCache
-from threading import RLock
-from SaitamaRobot import (DEL_CMDS, DEV_USERS, DRAGONS, SUPPORT_CHAT, DEMONS,
-                          TIGERS, WOLVES, dispatcher)
+from threading import RLock, Thread
+from SaitamaRobot import (ADMIN_CACHE_REFRESH, ADMIN_CACHE_SIZE,
+                          ADMIN_CACHE_TTL, DEL_CMDS, DEV_USERS, DRAGONS,
+                          LOGGER, SUPPORT_CHAT, DEMONS, TIGERS, WOLVES,
+                          dispatcher)
+from SaitamaRobot.modules.helper_funcs.metrics import COLLECTORS
 
 from telegram import Chat, ChatMember, ParseMode, Update
 from telegram.ext import CallbackContext
 
-# stores admemes in memory for 10 min.
-ADMIN_CACHE = TTLCache(maxsize=512, ttl=60 * 10)
+
+class AdminCache(TTLCache):
+    """TTLCache that counts how often a full cache pushes a chat out."""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+# stores admemes in memory for ADMIN_CACHE_TTL seconds.
+ADMIN_CACHE = AdminCache(maxsize=ADMIN_CACHE_SIZE, ttl=ADMIN_CACHE_TTL)
+# only guards the dicts, never held while talking to telegram
 THREAD_LOCK = RLock()
+ADMIN_LOADS = {}  # chat_id -> Future of the getChatAdministrators in flight
+ADMIN_HOT = {}  # chat_id -> last use, for the background refresher
+ADMIN_STATS = {"hits": 0, "misses": 0, "loads": 0, "load_errors": 0}
+
+# the bot's own ChatMember per chat, for 5 min.
+BOT_MEMBER_CACHE = TTLCache(maxsize=4096, ttl=60 * 5)
+BOT_MEMBER_LOCK = RLock()
+
+# BadRequest messages meaning our rights in the chat changed under us
+RIGHTS_ERRORS = ("not enough rights", "chat_admin_required",
+                 "need administrator rights", "have no rights",
+                 "user_not_participant", "chat_write_forbidden")
 
 
 def is_whitelist_plus(chat: Chat,
@@ -37,21 +69,123 @@ def is_user_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
         return True
 
     if not member:
+        return user_id in get_chat_admins(chat.id)
+
+
+def _load_chat_admins(chat_id: int, load: Future):
+    try:
+        chat_admins = dispatcher.bot.getChatAdministrators(chat_id)
+        admin_list = [x.user.id for x in chat_admins]
+    except Exception as excp:
         with THREAD_LOCK:
-            # try to fetch from cache first.
+            ADMIN_STATS["load_errors"] += 1
+            ADMIN_LOADS.pop(chat_id, None)
+        load.set_exception(excp)
+        raise
+
+    with THREAD_LOCK:
+        ADMIN_STATS["loads"] += 1
+        ADMIN_CACHE[chat_id] = admin_list
+        ADMIN_LOADS.pop(chat_id, None)
+    load.set_result(admin_list)
+    return admin_list
+
+
+def get_chat_admins(chat_id: int, refresh: bool = False) -> list:
+    """Admin ids of a chat, from cache or a single shared api call.
+
+    Threads that miss on the same chat wait for the one fetch already in
+    flight instead of starting their own; other chats are never blocked.
+    """
+    with THREAD_LOCK:
+        if not refresh:
+            if ADMIN_CACHE_REFRESH > 0:
+                ADMIN_HOT[chat_id] = time.time()
+            admin_list = ADMIN_CACHE.get(chat_id)
+            if admin_list is not None:
+                ADMIN_STATS["hits"] += 1
+                return admin_list
+            ADMIN_STATS["misses"] += 1
+
+        load = ADMIN_LOADS.get(chat_id)
+        if load is None:
+            load = ADMIN_LOADS[chat_id] = Future()
+            leader = True
+        else:
+            leader = False
+
+    if leader:
+        return _load_chat_admins(chat_id, load)
+    return load.result()
+
+
+def invalidate_chat_admins(chat_id: int):
+    with THREAD_LOCK:
+        ADMIN_CACHE.pop(chat_id, None)
+
+
+def admin_cache_stats() -> dict:
+    with THREAD_LOCK:
+        stats = dict(ADMIN_STATS)
+        stats.update(
+            size=len(ADMIN_CACHE),
+            maxsize=ADMIN_CACHE.maxsize,
+            evictions=ADMIN_CACHE.evictions,
+            in_flight=len(ADMIN_LOADS))
+    return stats
+
+
+def _admin_cache_metrics():
+    stats = admin_cache_stats()
+    return [
+        "# TYPE saitama_admin_cache_entries gauge",
+        "saitama_admin_cache_entries {}".format(stats["size"]),
+        "# TYPE saitama_admin_cache_loads_in_flight gauge",
+        "saitama_admin_cache_loads_in_flight {}".format(stats["in_flight"]),
+        "# TYPE saitama_admin_cache_total counter",
+    ] + [
+        'saitama_admin_cache_total{{result="{}"}} {}'.format(result,
+                                                            stats[result])
+        for result in ("hits", "misses", "loads", "load_errors", "evictions")
+    ]
+
+
+COLLECTORS.append(_admin_cache_metrics)
+
+
+def __refresh_hot_admins():
+    global ADMIN_HOT
+    while True:
+        time.sleep(ADMIN_CACHE_REFRESH)
+        with THREAD_LOCK:
+            hot, ADMIN_HOT = ADMIN_HOT, {}
+        # reload chats used since the last round before their entry expires
+        for chat_id in hot:
             try:
-                return user_id in ADMIN_CACHE[chat.id]
-            except BaseException:
-                # keyerror happend means cache is deleted,
-                # so query bot api again and return user status
-                # while saving it in cache for future useage...
-                chat_admins = dispatcher.bot.getChatAdministrators(chat.id)
-                admin_list = [x.user.id for x in chat_admins]
-                ADMIN_CACHE[chat.id] = admin_list
+                get_chat_admins(chat_id, refresh=True)
+            except Exception:
+                LOGGER.debug("Could not refresh admins of %s", chat_id)
 
-                if user_id in admin_list:
-                    return True
-                return False
+
+def get_bot_member(chat: Chat, bot_id: int) -> ChatMember:
+    with BOT_MEMBER_LOCK:
+        bot_member = BOT_MEMBER_CACHE.get(chat.id)
+    if bot_member is None:
+        # fetched outside the lock so one slow chat doesn't block the others
+        bot_member = chat.get_member(bot_id)
+        with BOT_MEMBER_LOCK:
+            BOT_MEMBER_CACHE[chat.id] = bot_member
+    return bot_member
+
+
+def invalidate_bot_member(chat_id: int):
+    with BOT_MEMBER_LOCK:
+        BOT_MEMBER_CACHE.pop(chat_id, None)
+
+
+def is_rights_error(excp) -> bool:
+    message = str(getattr(excp, "message", excp)).lower()
+    return any(err in message for err in RIGHTS_ERRORS)
 
 
 def is_bot_admin(chat: Chat,
@@ -61,13 +195,13 @@ def is_bot_admin(chat: Chat,
         return True
 
     if not bot_member:
-        bot_member = chat.get_member(bot_id)
+        bot_member = get_bot_member(chat, bot_id)
 
     return bot_member.status in ('administrator', 'creator')
 
 
 def can_delete(chat: Chat, bot_id: int) -> bool:
-    return chat.get_member(bot_id).can_delete_messages
+    return get_bot_member(chat, bot_id).can_delete_messages
 
 
 def is_user_ban_protected(chat: Chat,
@@ -286,7 +420,7 @@ def can_pin(func):
         else:
             cant_pin = f"<b>{update_chat_title}</b> qrupunda mesaj sabitləyə bilmirəm!\nOrada admin olduğumdan və mesaj sabitləyə bildiyimdən əmin ol."
 
-        if chat.get_member(bot.id).can_pin_messages:
+        if get_bot_member(chat, bot.id).can_pin_messages:
             return func(update, context, *args, **kwargs)
         else:
             update.effective_message.reply_text(
@@ -312,7 +446,7 @@ def can_promote(func):
                 f"<b>{update_chat_title}</b> qrupunda istifadəçiləri admin edə bilmirəm!\n"
                 f"Orada admin olduğumdan və yeni adminlər təyin edə bildiyimdən əmin ol.")
 
-        if chat.get_member(bot.id).can_promote_members:
+        if get_bot_member(chat, bot.id).can_promote_members:
             return func(update, context, *args, **kwargs)
         else:
             update.effective_message.reply_text(
@@ -336,7 +470,7 @@ def can_restrict(func):
         else:
             cant_restrict = f"<b>{update_chat_title}</b> qrupunda istifadəçiləri məhdudlaşdıra bilmirəm!\nAdmin olduğumdan və istifadəçiləri məhdudlaşdıra bildiyimdən əmin ol."
 
-        if chat.get_member(bot.id).can_restrict_members:
+        if get_bot_member(chat, bot.id).can_restrict_members:
             return func(update, context, *args, **kwargs)
         else:
             update.effective_message.reply_text(
@@ -395,3 +529,9 @@ def connection_status(func):
 from SaitamaRobot.modules import connection
 
 connected = connection.connected
+
+
+if ADMIN_CACHE_REFRESH > 0:
+    Thread(
+        target=__refresh_hot_admins, name="admin_cache_refresher",
+        daemon=True).start()
@@ -3,7 +3,9 @@ from SaitamaRobot import ALLOW_EXCL
 from SaitamaRobot import (DEV_USERS, DRAGONS, DEMONS, TIGERS, WOLVES)
 
 from telegram import Update
-from telegram.ext import CommandHandler, MessageHandler, RegexHandler, Filters
+from telegram.ext import (CommandHandler, Filters, Handler, MessageHandler,
+                          RegexHandler)
+from telegram.ext.dispatcher import DEFAULT_GROUP
 from pyrate_limiter import (BucketFullException, Duration, RequestRate, Limiter,
                             MemoryListBucket)
 
@@ -49,6 +51,24 @@ SpamChecker = AntiSpam()
 MessageHandlerChecker = AntiSpam()
 
 
+def parse_command(message):
+    """
+    Split a command message once, for all command handlers.
+    Returns (command, args) or None if it isn't a command for this bot
+    """
+    if not message.text or len(message.text) <= 1:
+        return None
+    fst_word = message.text.split(None, 1)[0]
+    if len(fst_word) <= 1 or not fst_word.startswith(CMD_STARTERS):
+        return None
+
+    command = fst_word[1:].split("@")
+    command.append(message.bot.username)
+    if command[1].lower() != message.bot.username.lower():
+        return None
+    return command[0], message.text.split()[1:]
+
+
 class CustomCommandHandler(CommandHandler):
 
     def __init__(self,
@@ -66,37 +86,31 @@ class CustomCommandHandler(CommandHandler):
 
     def check_update(self, update):
         if isinstance(update, Update) and update.effective_message:
-            message = update.effective_message
-
-            try:
-                user_id = update.effective_user.id
-            except:
-                user_id = None
-
-            if user_id:
-                if sql.is_user_blacklisted(user_id):
-                    return False
-
-            if message.text and len(message.text) > 1:
-                fst_word = message.text.split(None, 1)[0]
-                if len(fst_word) > 1 and any(
-                        fst_word.startswith(start) for start in CMD_STARTERS):
-
-                    args = message.text.split()[1:]
-                    command = fst_word[1:].split("@")
-                    command.append(message.bot.username)
-                    if user_id == 1087968824:
-                        user_id = update.effective_chat.id
-                    if not (command[0].lower() in self.command and
-                            command[1].lower() == message.bot.username.lower()):
-                        return None
-                    if SpamChecker.check_user(user_id):
-                        return None
-                    filter_result = self.filters(update)
-                    if filter_result:
-                        return args, filter_result
-                    else:
-                        return False
+            parsed = parse_command(update.effective_message)
+            if parsed and parsed[0].lower() in self.command:
+                return self.check_command(update, parsed)
+
+    def check_command(self, update, parsed):
+        # parsed comes from parse_command and already names this handler
+        try:
+            user_id = update.effective_user.id
+        except:
+            user_id = None
+
+        if user_id:
+            if sql.is_user_blacklisted(user_id):
+                return False
+
+        args = parsed[1]
+        if user_id == 1087968824:
+            user_id = update.effective_chat.id
+        if SpamChecker.check_user(user_id):
+            return None
+        filter_result = self.filters(update)
+        if filter_result:
+            return args, filter_result
+        else:
+            return False
 
     def handle_update(self, update, dispatcher, check_result, context=None):
         if context:
@@ -118,6 +132,81 @@ class CustomCommandHandler(CommandHandler):
                 context.update(check_result[1])
 
 
+class CommandRouter(Handler):
+    """
+    Stands in a handler group for a run of consecutive command handlers and
+    picks the candidates by command name, so a message is only parsed once
+    """
+    filters = None
+
+    def __init__(self):
+        super().__init__(None)
+        self.commands = {}  # command -> handlers, in registration order
+        self.handlers = []
+
+    def add(self, handler):
+        self.handlers.append(handler)
+        for command in handler.command:
+            self.commands.setdefault(command.lower(), []).append(handler)
+
+    def remove(self, handler):
+        self.handlers.remove(handler)
+        for command in handler.command:
+            routed = self.commands.get(command.lower(), [])
+            if handler in routed:
+                routed.remove(handler)
+            if not routed:
+                self.commands.pop(command.lower(), None)
+
+    def check_update(self, update):
+        if not isinstance(update, Update) or not update.effective_message:
+            return None
+        parsed = parse_command(update.effective_message)
+        if not parsed:
+            return None
+        for handler in self.commands.get(parsed[0].lower(), ()):
+            check = handler.check_command(update, parsed)
+            if check is not None and check is not False:
+                return handler, check
+        return None
+
+    def handle_update(self, update, dispatcher, check_result, context=None):
+        handler, check = check_result
+        return handler.handle_update(update, dispatcher, check, context)
+
+
+def route_commands(dispatcher):
+    """
+    Make dispatcher group consecutive command handlers behind a CommandRouter,
+    keeps their order relative to the other handlers of the group
+    """
+    add_handler = dispatcher.add_handler
+    remove_handler = dispatcher.remove_handler
+
+    def add_command_handler(handler, group=DEFAULT_GROUP):
+        if not isinstance(handler, CustomCommandHandler):
+            return add_handler(handler, group)
+        handlers = dispatcher.handlers.get(group)
+        router = handlers[-1] if handlers else None
+        if not isinstance(router, CommandRouter):
+            router = CommandRouter()
+            add_handler(router, group)
+        router.add(handler)
+
+    def remove_command_handler(handler, group=DEFAULT_GROUP):
+        if not isinstance(handler, CustomCommandHandler):
+            return remove_handler(handler, group)
+        for router in list(dispatcher.handlers.get(group, [])):
+            if isinstance(router, CommandRouter) and handler in router.handlers:
+                router.remove(handler)
+                if not router.handlers:
+                    remove_handler(router, group)
+                return
+
+    dispatcher.add_handler = add_command_handler
+    dispatcher.remove_handler = remove_command_handler
+
+
 class CustomRegexHandler(RegexHandler):
 
     def __init__(self, pattern, callback, friendly="", **kwargs):
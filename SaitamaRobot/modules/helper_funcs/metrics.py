@@ -0,0 +1,395 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from SaitamaRobot import (LOGGER, METRICS_PORT, SQL_ACCOUNTING,
+                          SQL_QUERY_BUDGET, SQL_TIME_BUDGET)
+from SaitamaRobot.modules.helper_funcs.chat_cache import cache_info
+from SaitamaRobot.modules.helper_funcs.handlers import CommandRouter
+from SaitamaRobot.modules.sql import (QueryScope, get_query_scope,
+                                      set_query_handler, set_query_scope)
+from telegram.ext import DispatcherHandlerStop
+from telegram.ext.dispatcher import DEFAULT_GROUP
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# check: check_update, dispatch: handle_update in the dispatcher thread,
+# run: the callback in a worker for @run_async handlers
+PHASES = ("check", "dispatch", "run")
+
+_local = threading.local()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class HandlerStats:
+    __slots__ = ("phases", "calls", "errors", "queries", "db_seconds")
+
+    def __init__(self):
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.calls = 0
+        self.errors = 0
+        self.queries = 0  # only counted with SQL_ACCOUNTING
+        self.db_seconds = 0.0
+
+
+HANDLER_STATS = {}  # (group, handler name) -> HandlerStats
+QUEUE_WAIT = Histogram()  # time @run_async callbacks wait for a worker
+UPDATE_QUERIES = Histogram(QUERY_BUCKETS)  # queries per update
+UPDATE_DB_SECONDS = Histogram()  # DB time per update
+OVER_BUDGET = 0  # updates over SQL_QUERY_BUDGET or SQL_TIME_BUDGET
+METRICS_LOCK = threading.Lock()
+
+# callables returning extra lines of Prometheus text, for other modules
+COLLECTORS = []
+
+DISPATCHER = None
+
+
+def handler_name(handler):
+    command = getattr(handler, "command", None)
+    if command:
+        return "/" + command[0]
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return type(handler).__name__
+    while hasattr(callback, "__wrapped__"):
+        callback = callback.__wrapped__
+    return "{}.{}".format(callback.__module__.rsplit(".", 1)[-1],
+                          callback.__name__)
+
+
+def _handler_stats(key):
+    stats = HANDLER_STATS.get(key)
+    if stats is None:
+        stats = HANDLER_STATS[key] = HandlerStats()
+    return stats
+
+
+def observe(key, phase, seconds, error=False):
+    with METRICS_LOCK:
+        stats = _handler_stats(key)
+        stats.phases[phase].observe(seconds)
+        if phase == "dispatch":
+            stats.calls += 1
+        if error:
+            stats.errors += 1
+
+
+def _finish_scope(scope):
+    global OVER_BUDGET
+    over = (scope.queries > SQL_QUERY_BUDGET or
+            scope.seconds > SQL_TIME_BUDGET)
+    with METRICS_LOCK:
+        UPDATE_QUERIES.observe(scope.queries)
+        UPDATE_DB_SECONDS.observe(scope.seconds)
+        for key, (queries, seconds) in scope.handlers.items():
+            stats = _handler_stats(key or (None, "(no handler)"))
+            stats.queries += queries
+            stats.db_seconds += seconds
+        if over:
+            OVER_BUDGET += 1
+    if over:
+        LOGGER.warning(
+            "Update %s ran %d queries in %.1fms: %s", scope.label,
+            scope.queries, scope.seconds * 1000, ", ".join(
+                "{} {}q/{:.1f}ms".format(key[1] if key else "(no handler)",
+                                         queries, seconds * 1000)
+                for key, (queries, seconds) in scope.handlers.items()))
+
+
+def current_handler():
+    """(group, handler name) of the handler running in this thread, if any."""
+    return getattr(_local, "handler", None)
+
+
+def _instrument(handler, group):
+    check_update = handler.check_update
+    handle_update = handler.handle_update
+    name = handler_name(handler)
+    if isinstance(handler, CommandRouter):
+        name = "commands"
+
+    def timed_check_update(update):
+        set_query_handler((group, name))
+        start = time.perf_counter()
+        try:
+            return check_update(update)
+        finally:
+            observe((group, name), "check", time.perf_counter() - start)
+
+    def timed_handle_update(update, dispatcher, check_result, context=None):
+        if isinstance(handler, CommandRouter):
+            key = (group, handler_name(check_result[0]))
+        else:
+            key = (group, name)
+        _local.handler = key
+        set_query_handler(key)
+        error = False
+        start = time.perf_counter()
+        try:
+            return handle_update(update, dispatcher, check_result, context)
+        except DispatcherHandlerStop:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            _local.handler = None
+            observe(key, "dispatch", time.perf_counter() - start, error)
+
+    handler.check_update = timed_check_update
+    handler.handle_update = timed_handle_update
+
+
+def instrument_handlers(dispatcher):
+    """
+    Time every handler's check_update and handle_update, and the @run_async
+    callbacks they start on the worker pool.
+    """
+    global DISPATCHER
+    DISPATCHER = dispatcher
+    add_handler = dispatcher.add_handler
+    run_async = dispatcher.run_async
+    process_update = dispatcher.process_update
+
+    def add_timed_handler(handler, group=DEFAULT_GROUP):
+        _instrument(handler, group)
+        return add_handler(handler, group)
+
+    def timed_run_async(func, *args, **kwargs):
+        key = current_handler()
+        if key is None:
+            return run_async(func, *args, **kwargs)
+        queued = time.perf_counter()
+        scope = get_query_scope()
+        if scope is not None:
+            scope.hold()
+
+        def timed(*f_args, **f_kwargs):
+            start = time.perf_counter()
+            with METRICS_LOCK:
+                QUEUE_WAIT.observe(start - queued)
+            _local.handler = key
+            set_query_scope(scope, key)
+            error = False
+            try:
+                return func(*f_args, **f_kwargs)
+            except DispatcherHandlerStop:
+                raise
+            except Exception:
+                error = True
+                raise
+            finally:
+                _local.handler = None
+                observe(key, "run", time.perf_counter() - start, error)
+                set_query_scope(None)
+                if scope is not None and scope.release():
+                    _finish_scope(scope)
+
+        timed.__name__ = func.__name__
+        return run_async(timed, *args, **kwargs)
+
+    def accounted_process_update(update):
+        scope = QueryScope(getattr(update, "update_id", None))
+        set_query_scope(scope)
+        try:
+            return process_update(update)
+        finally:
+            set_query_scope(None)
+            if scope.release():
+                _finish_scope(scope)
+
+    dispatcher.add_handler = add_timed_handler
+    dispatcher.run_async = timed_run_async
+    if SQL_ACCOUNTING:
+        dispatcher.process_update = accounted_process_update
+
+
+def worker_queue_depth():
+    if DISPATCHER is None:
+        return 0
+    return DISPATCHER._Dispatcher__async_queue.qsize()
+
+
+def handler_snapshot():
+    """
+    [(group, name, calls, errors, {phase: (count, total, p95)}, queries,
+    db_seconds)]
+    """
+    with METRICS_LOCK:
+        return [(group, name, stats.calls, stats.errors, {
+            phase: (hist.count, hist.total, hist.quantile(0.95))
+            for phase, hist in stats.phases.items()
+        }, stats.queries, stats.db_seconds)
+                for (group, name), stats in HANDLER_STATS.items()]
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, str(value).replace('"', "'"))
+                          for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(metric, hist, **labels):
+    lines = []
+    seen = 0
+    for bound, count in zip(hist.buckets, hist.counts):
+        seen += count
+        lines.append("{}_bucket{} {}".format(metric,
+                                             _labels(**labels, le=bound),
+                                             seen))
+    lines.append("{}_bucket{} {}".format(metric, _labels(**labels, le="+Inf"),
+                                         hist.count))
+    lines.append("{}_sum{} {}".format(metric, _labels(**labels), hist.total))
+    lines.append("{}_count{} {}".format(metric, _labels(**labels),
+                                        hist.count))
+    return lines
+
+
+def _cache_lines():
+    info = cache_info()
+    lines = ["# TYPE saitama_cache_entries gauge"]
+    lines += [
+        "saitama_cache_entries{} {}".format(_labels(cache=name), entries)
+        for name, entries, *_ in info
+    ]
+    lines.append("# TYPE saitama_cache_hits_total counter")
+    lines += [
+        "saitama_cache_hits_total{} {}".format(_labels(cache=name), hits)
+        for name, _, _, hits, _ in info
+    ]
+    lines.append("# TYPE saitama_cache_misses_total counter")
+    lines += [
+        "saitama_cache_misses_total{} {}".format(_labels(cache=name), misses)
+        for name, _, _, _, misses in info
+    ]
+    return lines
+
+
+def render_metrics():
+    lines = [
+        "# HELP saitama_handler_seconds Time spent per handler and phase.",
+        "# TYPE saitama_handler_seconds histogram",
+    ]
+    counters = []
+    with METRICS_LOCK:
+        for (group, name), stats in sorted(
+                HANDLER_STATS.items(), key=lambda item: str(item[0])):
+            for phase, hist in stats.phases.items():
+                if hist.count:
+                    lines += _histogram_lines(
+                        "saitama_handler_seconds",
+                        hist,
+                        group=group,
+                        handler=name,
+                        phase=phase)
+            counters.append((group, name, stats.calls, stats.errors,
+                             stats.queries, stats.db_seconds))
+        wait = _histogram_lines("saitama_worker_wait_seconds", QUEUE_WAIT)
+        if SQL_ACCOUNTING:
+            sql_lines = ["# TYPE saitama_update_queries histogram"]
+            sql_lines += _histogram_lines("saitama_update_queries",
+                                          UPDATE_QUERIES)
+            sql_lines.append("# TYPE saitama_update_db_seconds histogram")
+            sql_lines += _histogram_lines("saitama_update_db_seconds",
+                                          UPDATE_DB_SECONDS)
+            sql_lines.append("# TYPE saitama_updates_over_budget_total counter")
+            sql_lines.append(
+                "saitama_updates_over_budget_total {}".format(OVER_BUDGET))
+            sql_lines.append("# TYPE saitama_handler_queries_total counter")
+            sql_lines += [
+                "saitama_handler_queries_total{} {}".format(
+                    _labels(group=group, handler=name), queries)
+                for group, name, _, _, queries, _ in counters
+            ]
+            sql_lines.append("# TYPE saitama_handler_db_seconds_total counter")
+            sql_lines += [
+                "saitama_handler_db_seconds_total{} {}".format(
+                    _labels(group=group, handler=name), db_seconds)
+                for group, name, _, _, _, db_seconds in counters
+            ]
+        else:
+            sql_lines = []
+
+    lines.append("# TYPE saitama_handler_calls_total counter")
+    lines += [
+        "saitama_handler_calls_total{} {}".format(
+            _labels(group=group, handler=name), calls)
+        for group, name, calls, *_ in counters
+    ]
+    lines.append("# TYPE saitama_handler_errors_total counter")
+    lines += [
+        "saitama_handler_errors_total{} {}".format(
+            _labels(group=group, handler=name), errors)
+        for group, name, _, errors, *_ in counters
+    ]
+    lines.append("# TYPE saitama_worker_wait_seconds histogram")
+    lines += wait
+    lines.append("# TYPE saitama_worker_queue_depth gauge")
+    lines.append("saitama_worker_queue_depth {}".format(worker_queue_depth()))
+    lines += sql_lines
+
+    lines += _cache_lines()
+
+    for collector in COLLECTORS:
+        try:
+            lines += collector()
+        except Exception:
+            LOGGER.exception("Metrics collector %s failed", collector)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server():
+    if not METRICS_PORT:
+        return
+    # local only, scrape it through a tunnel or a local Prometheus
+    server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT),
+                                 MetricsRequestHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True).start()
+    LOGGER.info("Serving metrics on 127.0.0.1:%s/metrics", METRICS_PORT)
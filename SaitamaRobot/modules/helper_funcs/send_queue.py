@@ -0,0 +1,286 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import wraps
+
+from cachetools import TTLCache
+from SaitamaRobot import (LOGGER, SEND_RATE_CHAT, SEND_RATE_GLOBAL,
+                          SEND_RATE_GROUP)
+from SaitamaRobot.modules.helper_funcs.metrics import COLLECTORS
+from telegram.error import RetryAfter
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+MAX_RETRIES = 3
+CHAT_BURST = 3
+SEND_WORKERS = 8
+
+# bot methods that go through the queue once queue_bot() ran
+QUEUED_METHODS = ("send_message", "forward_message", "send_photo",
+                  "send_audio", "send_document", "send_sticker", "send_video",
+                  "send_animation", "send_voice", "send_video_note",
+                  "send_media_group", "send_location", "send_venue",
+                  "send_contact", "send_poll", "send_dice")
+
+_local = threading.local()
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity, bulk_only=False):
+        self.rate = rate
+        self.capacity = capacity
+        self.bulk_only = bulk_only
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0
+
+    def paused(self, now):
+        """Seconds left of a RetryAfter pause, 0 if there's none."""
+        return max(self.paused_until - now, 0)
+
+    def delay(self, now):
+        """Seconds until a token is free, 0 if one is free now."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        # interactive jobs take from a bulk_only bucket without waiting,
+        # the debt holds bulk jobs back for at most one more burst
+        self.tokens = max(self.tokens - 1, -self.capacity)
+
+    def pause(self, now, seconds):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Job:
+    __slots__ = ("priority", "chat_id", "func", "args", "kwargs", "future",
+                 "tries")
+
+    def __init__(self, priority, chat_id, func, args, kwargs):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.tries = 0
+
+
+class SendQueue:
+    """
+    Paces Bot API calls under the global and per-chat limits.
+
+    Jobs run by priority, a chat that used up its bucket waits without
+    holding back the others. The group buckets only pace bulk jobs, replies
+    to users aren't held back behind a busy group. A RetryAfter pauses that
+    chat (or everything for calls without a chat) and the job is queued
+    again.
+    """
+
+    def __init__(self, global_rate, chat_rate, group_rate):
+        self.cond = threading.Condition()
+        self.ready = []  # (priority, seq, job)
+        self.waiting = []  # (ready_at, priority, seq, job)
+        self.seq = itertools.count()
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate / 60
+        self.chat_buckets = TTLCache(maxsize=100000, ttl=60 * 10)
+        self.in_flight = 0
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+        self.executor = ThreadPoolExecutor(
+            max_workers=SEND_WORKERS, thread_name_prefix="send_queue")
+        threading.Thread(
+            target=self._loop, name="send_queue", daemon=True).start()
+
+    def submit(self, chat_id, func, *args, priority=PRIORITY_INTERACTIVE,
+               **kwargs):
+        # bot methods carry __wrapped__ from their own decorators too, only
+        # unwrap queue_bot's wrapper
+        job = _Job(priority, chat_id, getattr(func, "queued_method", func),
+                   args, kwargs)
+        with self.cond:
+            heapq.heappush(self.ready, (priority, next(self.seq), job))
+            self.cond.notify()
+        return job.future
+
+    def call(self, chat_id, func, *args, priority=PRIORITY_INTERACTIVE,
+             **kwargs):
+        return self.submit(
+            chat_id, func, *args, priority=priority, **kwargs).result()
+
+    def depth(self):
+        with self.cond:
+            queued = [job for _, _, job in self.ready]
+            queued += [job for _, _, _, job in self.waiting]
+            return {
+                "interactive":
+                    sum(job.priority < PRIORITY_BULK for job in queued),
+                "bulk":
+                    sum(job.priority >= PRIORITY_BULK for job in queued),
+                "rate_limited":
+                    len(self.waiting),
+                "in_flight":
+                    self.in_flight,
+                **self.stats,
+            }
+
+    def _chat_bucket(self, chat_id):
+        if chat_id is None:
+            return None
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            try:
+                private = int(chat_id) > 0
+            except ValueError:  # @channelusername
+                private = False
+            if private:
+                bucket = TokenBucket(self.chat_rate, CHAT_BURST)
+            else:
+                bucket = TokenBucket(
+                    self.group_rate, CHAT_BURST, bulk_only=True)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _chat_wait(self, bucket, job, now):
+        if bucket is None:
+            return 0
+        if bucket.bulk_only and job.priority < PRIORITY_BULK:
+            # an interactive reply in a group only waits out a RetryAfter
+            return bucket.paused(now)
+        return bucket.delay(now)
+
+    def _next_job(self):
+        while True:
+            now = time.monotonic()
+            while self.waiting and self.waiting[0][0] <= now:
+                _, priority, seq, job = heapq.heappop(self.waiting)
+                heapq.heappush(self.ready, (priority, seq, job))
+
+            timeout = self.waiting[0][0] - now if self.waiting else None
+            if self.ready:
+                delay = self.global_bucket.delay(now)
+                if not delay:
+                    priority, seq, job = heapq.heappop(self.ready)
+                    bucket = self._chat_bucket(job.chat_id)
+                    wait = self._chat_wait(bucket, job, now)
+                    if not wait:
+                        self.global_bucket.take()
+                        if bucket:
+                            bucket.take()
+                        self.in_flight += 1
+                        return job
+                    heapq.heappush(self.waiting,
+                                   (now + wait, priority, seq, job))
+                    continue
+                timeout = delay if timeout is None else min(timeout, delay)
+            self.cond.wait(timeout)
+
+    def _loop(self):
+        while True:
+            try:
+                with self.cond:
+                    job = self._next_job()
+                self.executor.submit(self._run, job)
+            except Exception:
+                LOGGER.exception("Error in the send queue")
+
+    def _run(self, job):
+        _local.in_queue = True
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except RetryAfter as excp:
+            with self.cond:
+                self.in_flight -= 1
+                now = time.monotonic()
+                bucket = self._chat_bucket(job.chat_id) or self.global_bucket
+                bucket.pause(now, excp.retry_after)
+                if job.tries < MAX_RETRIES:
+                    job.tries += 1
+                    self.stats["retried"] += 1
+                    heapq.heappush(self.waiting,
+                                   (now + excp.retry_after, job.priority,
+                                    next(self.seq), job))
+                    self.cond.notify()
+                    return
+                self.stats["failed"] += 1
+            job.future.set_exception(excp)
+        except Exception as excp:
+            with self.cond:
+                self.in_flight -= 1
+                self.stats["failed"] += 1
+            job.future.set_exception(excp)
+        else:
+            with self.cond:
+                self.in_flight -= 1
+                self.stats["sent"] += 1
+            job.future.set_result(result)
+        finally:
+            _local.in_queue = False
+
+
+SEND_QUEUE = SendQueue(SEND_RATE_GLOBAL, SEND_RATE_CHAT, SEND_RATE_GROUP)
+
+
+def queue_call(chat_id, func, *args, **kwargs):
+    return SEND_QUEUE.call(chat_id, func, *args, **kwargs)
+
+
+def queue_submit(chat_id, func, *args, **kwargs):
+    return SEND_QUEUE.submit(chat_id, func, *args, **kwargs)
+
+
+def queue_depth():
+    return SEND_QUEUE.depth()
+
+
+def _queue_metrics():
+    depth = queue_depth()
+    lines = ["# TYPE saitama_send_queue_depth gauge"]
+    lines += [
+        'saitama_send_queue_depth{{kind="{}"}} {}'.format(kind, depth[kind])
+        for kind in ("interactive", "bulk", "rate_limited", "in_flight")
+    ]
+    lines.append("# TYPE saitama_send_queue_total counter")
+    lines += [
+        'saitama_send_queue_total{{result="{}"}} {}'.format(result,
+                                                           depth[result])
+        for result in ("sent", "retried", "failed")
+    ]
+    return lines
+
+
+COLLECTORS.append(_queue_metrics)
+
+
+def _queued(method):
+
+    @wraps(method)
+    def queued(*args, **kwargs):
+        if getattr(_local, "in_queue", False):
+            return method(*args, **kwargs)
+        chat_id = kwargs.get("chat_id", args[0] if args else None)
+        return SEND_QUEUE.call(chat_id, method, *args, **kwargs)
+
+    queued.queued_method = method
+    return queued
+
+
+def queue_bot(bot):
+    """Route the bot's sends through SEND_QUEUE as interactive jobs."""
+    for name in QUEUED_METHODS:
+        queued = _queued(getattr(bot, name))
+        camel = name.split("_")
+        camel = camel[0] + "".join(part.capitalize() for part in camel[1:])
+        setattr(bot, name, queued)
+        setattr(bot, camel, queued)
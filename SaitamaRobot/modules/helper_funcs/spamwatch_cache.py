@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from cachetools import TTLCache
+from SaitamaRobot import (LOGGER, SPAMWATCH_NEGATIVE_TTL,
+                          SPAMWATCH_SYNC_INTERVAL, SPAMWATCH_TIMEOUT,
+                          SPAMWATCH_TTL, sw)
+
+# how long to stop asking SpamWatch after a failed request
+OUTAGE_BACKOFF = 30
+
+BANNED = TTLCache(maxsize=50000, ttl=SPAMWATCH_TTL)
+NOT_BANNED = TTLCache(maxsize=500000, ttl=SPAMWATCH_NEGATIVE_TTL)
+IN_FLIGHT = {}  # user_id -> Future, so a user is only looked up once at a time
+CACHE_LOCK = threading.Lock()
+
+# ids from the last full ban list sync, None while sync is off or failing
+BAN_IDS = None
+BACKOFF_UNTIL = 0
+
+LOOKUPS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="spamwatch")
+
+
+def _lookup(user_id):
+    global BACKOFF_UNTIL
+    try:
+        ban = sw.get_ban(user_id)
+    except Exception:
+        LOGGER.warning("SpamWatch lookup for %s failed, backing off for %ss",
+                       user_id, OUTAGE_BACKOFF)
+        BACKOFF_UNTIL = time.time() + OUTAGE_BACKOFF
+        with CACHE_LOCK:
+            IN_FLIGHT.pop(user_id, None)
+        return None
+
+    with CACHE_LOCK:
+        if ban:
+            BANNED[user_id] = ban
+            NOT_BANNED.pop(user_id, None)
+        else:
+            NOT_BANNED[user_id] = True
+            BANNED.pop(user_id, None)
+        IN_FLIGHT.pop(user_id, None)
+    return ban or None
+
+
+def get_sw_ban(user_id):
+    """Cached replacement for `sw.get_ban`.
+
+    Returns the Ban or None. Waits at most SPAMWATCH_TIMEOUT seconds on a
+    cache miss; a lookup that takes longer still fills the cache for the next
+    message. While SpamWatch is failing every user counts as not banned.
+    """
+    if sw is None:
+        return None
+
+    user_id = int(user_id)
+    with CACHE_LOCK:
+        ban = BANNED.get(user_id)
+        if ban is not None:
+            return ban
+        if user_id in NOT_BANNED:
+            return None
+        if BAN_IDS is not None and user_id not in BAN_IDS:
+            return None
+        if time.time() < BACKOFF_UNTIL:
+            return None
+
+        future = IN_FLIGHT.get(user_id)
+        if future is None:
+            future = IN_FLIGHT[user_id] = LOOKUPS.submit(_lookup, user_id)
+
+    try:
+        return future.result(timeout=SPAMWATCH_TIMEOUT)
+    except FutureTimeout:
+        return None
+
+
+def sync_ban_list():
+    global BAN_IDS
+    try:
+        ban_ids = set(sw.get_bans_min())
+    except Exception:
+        LOGGER.warning("Could not sync the SpamWatch ban list, "
+                       "falling back to single lookups")
+        BAN_IDS = None
+        return
+
+    with CACHE_LOCK:
+        BAN_IDS = ban_ids
+        # anyone cached as banned but no longer listed got unbanned
+        for user_id in [x for x in BANNED if x not in ban_ids]:
+            BANNED.pop(user_id, None)
+        BANNED.expire()
+        NOT_BANNED.expire()
+    LOGGER.info("Synced %d SpamWatch bans", len(ban_ids))
+
+
+def __refresh_loop():
+    while True:
+        sync_ban_list()
+        time.sleep(SPAMWATCH_SYNC_INTERVAL)
+
+
+if sw is not None and SPAMWATCH_SYNC_INTERVAL > 0:
+    threading.Thread(
+        target=__refresh_loop, name="spamwatch_refresher", daemon=True).start()
@@ -0,0 +1,242 @@
+"""
+Startup of __main__. Modules are imported one after another in ALL_MODULES
+order, so their handlers keep their groups and order, while slow work that
+adds no handlers (loading caches, the bot's own rows, getMe) is deferred to
+a small pool running alongside the imports. Work deferred before begin()
+waits for it, that's once the database schema is up to date. finish()
+waits for all of it before polling starts and logs how long each import
+and task took.
+
+Modules in LAZY_MODULES that only add command and callback query handlers
+aren't imported at startup: placeholders take their commands and import
+the module the first time one is used.
+"""
+import ast
+import importlib
+import importlib.util
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from SaitamaRobot import LOGGER, STARTUP_WORKERS, StartTime, dispatcher
+from telegram.ext import Handler, run_async
+
+# module attributes __main__ registers, a module defining one is never lazy
+HOOKS = ("__migrate__", "__stats__", "__user_info__", "__import_data__",
+         "__export_data__", "__chat_settings__", "__user_settings__")
+COMMAND_HANDLERS = ("CommandHandler", "CustomCommandHandler",
+                    "DisableAbleCommandHandler")
+
+POOL = ThreadPoolExecutor(STARTUP_WORKERS, thread_name_prefix="startup")
+QUEUED = []  # (name, func, args) deferred before begin()
+PENDING = []  # (name, future)
+TIMINGS = []  # (kind, name, seconds)
+STARTED = False
+BOOTING = True
+LAZY = {}  # module name -> LazyModule
+
+
+class ModuleStub(SimpleNamespace):
+    """Stands in IMPORTED and HELPABLE for a module that isn't loaded yet."""
+
+
+def timed(kind, name, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        TIMINGS.append((kind, name, time.perf_counter() - start))
+
+
+def defer(name, func, *args):
+    """Run `func` on the startup pool while booting, right away after."""
+    if not BOOTING:
+        return func(*args)
+    if not STARTED:
+        QUEUED.append((name, func, args))
+        return
+    PENDING.append((name, POOL.submit(timed, "task", name, func, *args)))
+
+
+def begin():
+    global STARTED
+    STARTED = True
+    for name, func, args in QUEUED:
+        defer(name, func, *args)
+    QUEUED.clear()
+
+
+def import_module(module_name):
+    return timed("import", module_name, importlib.import_module,
+                  "SaitamaRobot.modules." + module_name)
+
+
+def finish():
+    global BOOTING
+    begin()
+    for name, future in PENDING:
+        try:
+            future.result()
+        except Exception:
+            LOGGER.exception("Startup task %s failed", name)
+    BOOTING = False
+    POOL.shutdown()
+
+    lines = [
+        "{:8.3f}s  {} {}".format(seconds, kind, name)
+        for kind, name, seconds in sorted(TIMINGS, key=lambda t: -t[2])
+    ]
+    LOGGER.info(
+        "Started in %.2fs, %d modules imported, %d left to load on first "
+        "use:\n%s", time.time() - StartTime,
+        sum(kind == "import" for kind, *_ in TIMINGS), len(LAZY),
+        "\n".join(lines))
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (TypeError, ValueError):
+        return None
+
+
+def _call_name(call):
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    if isinstance(call.func, ast.Attribute):
+        return call.func.attr
+    return None
+
+
+def read_module(module_name):
+    """
+    What a module registers, read from its source without importing it:
+    {"mod_name", "help", "commands": [(commands, handler, admin_ok)],
+    "callbacks": [pattern]}, or None if it does more than add command and
+    callback query handlers to the default group.
+    """
+    spec = importlib.util.find_spec("SaitamaRobot.modules." + module_name)
+    with open(spec.origin, encoding="utf-8") as source:
+        tree = ast.parse(source.read())
+
+    found = {"mod_name": None, "help": None, "commands": [], "callbacks": []}
+    for statement in tree.body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if statement.name in HOOKS:
+                return None
+            continue
+        if isinstance(statement, ast.ClassDef):
+            continue
+        if isinstance(statement, ast.Assign):
+            for target in statement.targets:
+                name = getattr(target, "id", None)
+                if name in HOOKS:
+                    return None
+                if name in ("__mod_name__", "__help__"):
+                    value = _literal(statement.value)
+                    if not isinstance(value, str):
+                        return None
+                    found[name.strip("_")] = value
+
+        for node in ast.walk(statement):
+            if not isinstance(node, ast.Call):
+                continue
+            name = _call_name(node)
+            if name == "add_handler" and (len(node.args) > 1 or node.keywords):
+                return None  # another group
+            if not name or not name.endswith("Handler"):
+                continue
+            keywords = {kw.arg: kw.value for kw in node.keywords}
+            if name in COMMAND_HANDLERS:
+                commands = _literal(node.args[0]) if node.args else None
+                if isinstance(commands, str):
+                    commands = [commands]
+                if not commands:
+                    return None
+                admin_ok = keywords.get("admin_ok")
+                found["commands"].append(
+                    (commands, name, bool(admin_ok and _literal(admin_ok))))
+            elif name == "CallbackQueryHandler":
+                pattern = keywords.get("pattern")
+                pattern = _literal(pattern) if pattern is not None else None
+                if not isinstance(pattern, str):
+                    return None
+                found["callbacks"].append(pattern)
+            else:
+                return None
+
+    if not found["mod_name"] or not found["commands"]:
+        return None
+    return found
+
+
+class LazyModule:
+
+    def __init__(self, module_name, found, on_load):
+        self.module_name = module_name
+        self.on_load = on_load
+        self.stub = ModuleStub(
+            __name__="SaitamaRobot.modules." + module_name,
+            __mod_name__=found["mod_name"],
+            __help__=found["help"])
+        self.module = None
+        self.lock = threading.Lock()
+        self.placeholders = []
+
+        from SaitamaRobot.modules.disable import DisableAbleCommandHandler
+        from telegram.ext import CallbackQueryHandler, CommandHandler
+
+        callback = run_async(self.dispatch)
+        for commands, handler, admin_ok in found["commands"]:
+            if handler == "DisableAbleCommandHandler":
+                placeholder = DisableAbleCommandHandler(
+                    commands, callback, admin_ok=admin_ok)
+            else:
+                placeholder = CommandHandler(commands, callback)
+            self.placeholders.append(placeholder)
+        for pattern in found["callbacks"]:
+            self.placeholders.append(
+                CallbackQueryHandler(callback, pattern=pattern))
+        for placeholder in self.placeholders:
+            dispatcher.add_handler(placeholder)
+
+    def load(self):
+        with self.lock:
+            if self.module is None:
+                start = time.perf_counter()
+                self.module = self.on_load(self.module_name)
+                for placeholder in self.placeholders:
+                    dispatcher.remove_handler(placeholder)
+                LAZY.pop(self.module_name, None)
+                LOGGER.info("Loaded %s on first use in %.2fs",
+                            self.module_name, time.perf_counter() - start)
+        return self.module
+
+    def dispatch(self, update, context):
+        module = self.load()
+        for handler in vars(module).values():
+            if not isinstance(handler, Handler):
+                continue
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                return handler.handle_update(update, dispatcher, check, context)
+
+
+def defer_module(module_name, on_load):
+    """
+    Put placeholders in for a LAZY_MODULES module, `on_load(module_name)`
+    imports and registers it when they're first used. Returns the stub to
+    register meanwhile, or None if the module has to be imported now.
+    """
+    try:
+        found = read_module(module_name)
+    except Exception:
+        LOGGER.exception("Couldn't read module %s", module_name)
+        found = None
+    if found is None:
+        LOGGER.info("%s can't be loaded on first use, importing it now",
+                    module_name)
+        return None
+    LAZY[module_name] = lazy = LazyModule(module_name, found, on_load)
+    return lazy.stub
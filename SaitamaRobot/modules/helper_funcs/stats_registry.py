@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+
+from SaitamaRobot import LOGGER, STATS_RECONCILE_INTERVAL
+
+# name -> callable returning the exact value, usually a COUNT(*) query
+RECONCILERS = OrderedDict()
+STATS = {}
+STATS_LOCK = threading.Lock()
+RECONCILED_AT = None
+
+
+def register_stat(name, reconcile):
+    RECONCILERS[name] = reconcile
+
+
+def incr_stat(name, amount=1):
+    """Called by the sql modules as rows come and go.
+
+    Writes racing a reconcile may be counted twice or not at all, the next
+    reconcile sets that right again.
+    """
+    with STATS_LOCK:
+        STATS[name] = STATS.get(name, 0) + amount
+
+
+def get_stat(name, default=0):
+    return STATS.get(name, default)
+
+
+def reconcile_stats():
+    global RECONCILED_AT
+    for name, reconcile in list(RECONCILERS.items()):
+        try:
+            value = reconcile()
+        except Exception:
+            LOGGER.exception("Could not reconcile the %s stat", name)
+            continue
+        with STATS_LOCK:
+            STATS[name] = value
+    RECONCILED_AT = time.time()
+
+
+def __reconcile_loop():
+    while True:
+        try:
+            reconcile_stats()
+        except Exception:
+            LOGGER.exception("Error in the stats reconciler")
+        time.sleep(STATS_RECONCILE_INTERVAL)
+
+
+def start_stats_reconciler():
+    """Counts everything once in the background, then every interval."""
+    threading.Thread(
+        target=__reconcile_loop, name="stats_reconciler", daemon=True).start()
@@ -0,0 +1,118 @@
+import re
+from typing import Callable, Iterable, Optional
+
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+
+# Same boundaries the trigger loops used: r"( |^|[^\w])" + trigger + r"( |$|[^\w])"
+BOUNDARY_START = r"(?:^|(?<=\W))"
+BOUNDARY_END = r"(?=\W|$)"
+
+
+def _trie_pattern(triggers) -> str:
+    trie = {}
+    for trigger in triggers:
+        node = trie
+        for char in trigger:
+            node = node.setdefault(char, {})
+        node[""] = True  # end of a trigger, chars are never ''
+    return _node_pattern(trie)
+
+
+def _node_pattern(node) -> str:
+    # collapse single child chains so we only recurse on real branches
+    prefix = ""
+    while len(node) == 1 and "" not in node:
+        char, node = next(iter(node.items()))
+        prefix += re.escape(char)
+
+    branches = [
+        re.escape(char) + _node_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return prefix
+
+    if len(branches) == 1:
+        body = "(?:{})".format(branches[0])
+    else:
+        body = "(?:{})".format("|".join(branches))
+
+    if "" in node:
+        body += "?"
+    return prefix + body
+
+
+class TriggerMatcher:
+    """All of a chat's triggers folded into one compiled pattern.
+
+    `match` returns the first trigger, in the order they were given, that
+    appears in the text as a whole word, ignoring case.
+    """
+
+    def __init__(self, triggers: Iterable[str]):
+        self.triggers = tuple(triggers)
+        self._patterns = {}
+        self._combined = None
+        if not self.triggers:
+            return
+
+        try:
+            body = _trie_pattern(self.triggers)
+            self._combined = re.compile(
+                BOUNDARY_START + body + BOUNDARY_END, flags=re.IGNORECASE)
+        except (RecursionError, re.error, OverflowError):
+            # deeply nested tries are too much for sre, a flat alternation isn't
+            body = "|".join(re.escape(trigger) for trigger in self.triggers)
+            self._combined = re.compile(
+                BOUNDARY_START + "(?:" + body + ")" + BOUNDARY_END,
+                flags=re.IGNORECASE)
+
+    def __len__(self):
+        return len(self.triggers)
+
+    def _pattern(self, trigger):
+        pattern = self._patterns.get(trigger)
+        if pattern is None:
+            pattern = re.compile(
+                BOUNDARY_START + re.escape(trigger) + BOUNDARY_END,
+                flags=re.IGNORECASE)
+            self._patterns[trigger] = pattern
+        return pattern
+
+    def match(self, text: str) -> Optional[str]:
+        if self._combined is None:
+            return None
+        if not self._combined.search(text):
+            return None
+
+        # Something matched, walk the triggers in order to report the same one
+        # the old per-trigger loops did.
+        for trigger in self.triggers:
+            if self._pattern(trigger).search(text):
+                return trigger
+        return None
+
+
+class TriggerMatcherCache:
+    """Per-chat TriggerMatchers, built on first use and dropped on change.
+
+    `source` returns the current triggers of a chat; sql modules call
+    `invalidate` after every change to that data.
+    """
+
+    def __init__(self, name: str, source: Callable[[str], Iterable[str]]):
+        # rebuilt from the triggers, not worth a place in the snapshot
+        self._matchers = ChatCache(
+            name,
+            lambda chat_id: TriggerMatcher(source(chat_id)),
+            snapshot=False)
+
+    def get(self, chat_id) -> TriggerMatcher:
+        return self._matchers.get(chat_id)
+
+    def invalidate(self, *chat_ids):
+        self._matchers.invalidate(*chat_ids)
+
+    def clear(self):
+        self._matchers.clear()
@@ -12,8 +12,11 @@ from alphabet_detector import AlphabetDetector
 import SaitamaRobot.modules.sql.locks_sql as sql
 from SaitamaRobot import dispatcher, DRAGONS, LOGGER
 from SaitamaRobot.modules.disable import DisableAbleCommandHandler
+from SaitamaRobot.modules.helper_funcs.aio import get_actions
 from SaitamaRobot.modules.helper_funcs.chat_status import (
     can_delete,
+    invalidate_bot_member,
+    is_rights_error,
     is_user_admin,
     user_not_admin,
     is_bot_admin,
@@ -414,85 +417,98 @@ def del_lockables(update, context):
     chat = update.effective_chat  # type: Optional[Chat]
     message = update.effective_message  # type: Optional[Message]
 
+    locked = sql.get_lock_mask(chat.id)
+    if not locked:
+        return
+
+    actions = get_actions(context.bot, __name__)
     for lockable, filter in LOCK_TYPES.items():
+        if not locked & sql.LOCK_BITS[lockable]:
+            continue
         if lockable == "rtl":
-            if sql.is_locked(chat.id, lockable) and can_delete(
-                    chat, context.bot.id):
+            if can_delete(chat, context.bot.id):
                 if message.caption:
                     check = ad.detect_alphabet(u"{}".format(message.caption))
                     if "ARABIC" in check:
                         try:
-                            message.delete()
+                            actions.delete_message(chat.id, message.message_id)
                         except BadRequest as excp:
                             if excp.message == "Message to delete not found":
                                 pass
                             else:
+                                if is_rights_error(excp):
+                                    invalidate_bot_member(chat.id)
                                 LOGGER.exception("ERROR in lockables")
                         break
                 if message.text:
                     check = ad.detect_alphabet(u"{}".format(message.text))
                     if "ARABIC" in check:
                         try:
-                            message.delete()
+                            actions.delete_message(chat.id, message.message_id)
                         except BadRequest as excp:
                             if excp.message == "Message to delete not found":
                                 pass
                             else:
+                                if is_rights_error(excp):
+                                    invalidate_bot_member(chat.id)
                                 LOGGER.exception("ERROR in lockables")
                         break
             continue
         if lockable == "button":
-            if sql.is_locked(chat.id, lockable) and can_delete(
-                    chat, context.bot.id):
+            if can_delete(chat, context.bot.id):
                 if message.reply_markup and message.reply_markup.inline_keyboard:
                     try:
-                        message.delete()
+                        actions.delete_message(chat.id, message.message_id)
                     except BadRequest as excp:
                         if excp.message == "Message to delete not found":
                             pass
                         else:
+                            if is_rights_error(excp):
+                                invalidate_bot_member(chat.id)
                             LOGGER.exception("ERROR in lockables")
                     break
             continue
         if lockable == "inline":
-            if sql.is_locked(chat.id, lockable) and can_delete(
-                    chat, context.bot.id):
+            if can_delete(chat, context.bot.id):
                 if message and message.via_bot:
                     try:
-                        message.delete()
+                        actions.delete_message(chat.id, message.message_id)
                     except BadRequest as excp:
                         if excp.message == "Message to delete not found":
                             pass
                         else:
+                            if is_rights_error(excp):
+                                invalidate_bot_member(chat.id)
                             LOGGER.exception("ERROR in lockables")
                     break
             continue
-        if (filter(update) and sql.is_locked(chat.id, lockable) and
-                can_delete(chat, context.bot.id)):
+        if filter(update) and can_delete(chat, context.bot.id):
             if lockable == "bots":
                 new_members = update.effective_message.new_chat_members
                 for new_mem in new_members:
                     if new_mem.is_bot:
                         if not is_bot_admin(chat, context.bot.id):
-                            send_message(
+                            actions.reply_text(
                                 update.effective_message,
                                 "Qrupa bot gəldiyini gördüm amma admin olmadığıma görə onu qrupdan ata bilmədim!",
                             )
                             return
 
-                        chat.kick_member(new_mem.id)
-                        send_message(
+                        actions.kick_chat_member(chat.id, new_mem.id)
+                        actions.reply_text(
                             update.effective_message,
                             "Yalnız adminlər bu qrupa bot əlavə edə bilər! Rədd ol.",
                         )
                         break
             else:
                 try:
-                    message.delete()
+                    actions.delete_message(chat.id, message.message_id)
                 except BadRequest as excp:
                     if excp.message == "Message to delete not found":
                         pass
                     else:
+                        if is_rights_error(excp):
+                            invalidate_bot_member(chat.id)
                         LOGGER.exception("ERROR in lockables")
 
                 break
@@ -1,13 +1,108 @@
-from SaitamaRobot import DB_URI
-from sqlalchemy import create_engine
+import threading
+import time
+
+from SaitamaRobot import DB_URI, SQL_ACCOUNTING
+from sqlalchemy import Table, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+_query_local = threading.local()
+
+
+class QueryScope:
+    """
+    Queries run for one update, in the dispatcher and in the workers its
+    handlers started. `pending` counts the threads still working on it.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.queries = 0
+        self.seconds = 0.0
+        self.handlers = {}  # handler -> [queries, seconds]
+        self.pending = 1
+        self.lock = threading.Lock()
+
+    def add(self, handler, seconds):
+        with self.lock:
+            self.queries += 1
+            self.seconds += seconds
+            entry = self.handlers.setdefault(handler, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def hold(self):
+        with self.lock:
+            self.pending += 1
+
+    def release(self):
+        """True once the last thread is done with it."""
+        with self.lock:
+            self.pending -= 1
+            return self.pending == 0
+
+
+def get_query_scope():
+    return getattr(_query_local, "scope", None)
+
+
+def set_query_scope(scope, handler=None):
+    _query_local.scope = scope
+    _query_local.handler = handler
+
+
+def set_query_handler(handler):
+    _query_local.handler = handler
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault("query_start", {})[cursor] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start = conn.info["query_start"].pop(cursor)
+    scope = getattr(_query_local, "scope", None)
+    if scope is not None:
+        scope.add(
+            getattr(_query_local, "handler", None),
+            time.perf_counter() - start)
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and exception_context.cursor is not None:
+        conn.info.get("query_start", {}).pop(exception_context.cursor, None)
+
+
+def _sqlite_composite_keys(table, connection, **kw):
+    # sqlite can't autoincrement part of a composite primary key, those are
+    # the button tables, which the benchmarks don't fill
+    if connection.dialect.name == "sqlite" and len(table.primary_key) > 1:
+        for column in table.primary_key.columns:
+            column.autoincrement = False
 
 
 def start() -> scoped_session:
-    engine = create_engine(DB_URI, client_encoding="utf8")
+    if DB_URI.startswith("sqlite"):
+        # only for benchmarks and local runs. An in-memory database lives in
+        # its connection, so all threads have to share one there
+        in_memory = DB_URI in ("sqlite://", "sqlite:///:memory:")
+        engine = create_engine(
+            DB_URI,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool if in_memory else None)
+        event.listen(Table, "before_create", _sqlite_composite_keys)
+    else:
+        engine = create_engine(DB_URI, client_encoding="utf8")
+    if SQL_ACCOUNTING:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
     BASE.metadata.bind = engine
-    BASE.metadata.create_all(engine)
     return scoped_session(sessionmaker(bind=engine, autoflush=False))
 
 
@@ -1,5 +1,6 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Boolean, Column, Integer, UnicodeText
 
@@ -20,14 +21,24 @@ class AFK(BASE):
         return "afk_status for {}".format(self.user_id)
 
 
-AFK.__table__.create(checkfirst=True)
 INSERTION_LOCK = threading.RLock()
 
-AFK_USERS = {}
+
+def __load_afk_user(user_id):
+    try:
+        return bool(
+            SESSION.query(AFK.user_id).filter(
+                AFK.user_id == int(user_id), AFK.is_afk.is_(True)).first())
+    finally:
+        SESSION.close()
+
+
+# user_id -> whether they're afk, most users never are
+AFK_USERS = ChatCache("afk", __load_afk_user)
 
 
 def is_afk(user_id):
-    return user_id in AFK_USERS
+    return AFK_USERS.get(user_id)
 
 
 def check_afk_status(user_id):
@@ -45,21 +56,18 @@ def set_afk(user_id, reason=""):
         else:
             curr.is_afk = True
 
-        AFK_USERS[user_id] = reason
-
         SESSION.add(curr)
         SESSION.commit()
+        AFK_USERS.set(user_id, True)
 
 
 def rm_afk(user_id):
     with INSERTION_LOCK:
         curr = SESSION.query(AFK).get(user_id)
         if curr:
-            if user_id in AFK_USERS:  # sanity check
-                del AFK_USERS[user_id]
-
             SESSION.delete(curr)
             SESSION.commit()
+            AFK_USERS.set(user_id, False)
             return True
 
         SESSION.close()
@@ -77,17 +85,4 @@ def toggle_afk(user_id, reason=""):
             curr.is_afk = True
         SESSION.add(curr)
         SESSION.commit()
-
-
-def __load_afk_users():
-    global AFK_USERS
-    try:
-        all_afk = SESSION.query(AFK).all()
-        AFK_USERS = {
-            user.user_id: user.reason for user in all_afk if user.is_afk
-        }
-    finally:
-        SESSION.close()
-
-
-__load_afk_users()
+        AFK_USERS.set(user_id, curr.is_afk)
@@ -1,7 +1,14 @@
 import threading
+import time
+from array import array
+from collections import OrderedDict
 
 from sqlalchemy import String, Column, Integer, UnicodeText
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
 from SaitamaRobot.modules.sql import SESSION, BASE
 DEF_COUNT = 1
 DEF_LIMIT = 0
@@ -38,13 +45,39 @@ class FloodSettings(BASE):
             self.chat_id, self.flood_type)
 
 
-FloodControl.__table__.create(checkfirst=True)
-FloodSettings.__table__.create(checkfirst=True)
+class FloodTimer(BASE):
+    __tablename__ = "antiflood_timer"
+    chat_id = Column(String(14), primary_key=True)
+    count = Column(Integer, default=0)
+    seconds = Column(Integer, default=0)
+
+    def __init__(self, chat_id, count=0, seconds=0):
+        self.chat_id = str(chat_id)
+        self.count = count
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "<{} allows {} messages in {}s.>".format(
+            self.chat_id, self.count, self.seconds)
+
 
 INSERTION_FLOOD_LOCK = threading.RLock()
 INSERTION_FLOOD_SETTINGS_LOCK = threading.RLock()
+INSERTION_FLOOD_TIMER_LOCK = threading.RLock()
+FLOOD_WINDOW_LOCK = threading.Lock()
 
-CHAT_FLOOD = {}
+register_section("flood", FloodControl, ("limit",))
+register_section("flood_settings", FloodSettings, ("flood_type", "value"))
+register_section("flood_timer", FloodTimer, ("count", "seconds"))
+
+# chat_id -> (user_id, count) of the current run of messages
+CHAT_FLOOD = ChatCache(
+    "flood_runs", lambda chat_id: DEF_OBJ[:2], snapshot=False)
+
+# (chat_id, user_id) -> [seconds, stamps, pos], least recently active first.
+# stamps is a ring buffer of the last `count` message times of that user.
+FLOOD_WINDOWS = OrderedDict()
+FLOOD_WINDOWS_MAX = 200000
 
 
 def set_flood(chat_id, amount):
@@ -56,35 +89,105 @@ def set_flood(chat_id, amount):
         flood.user_id = None
         flood.limit = amount
 
-        CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, amount)
-
         SESSION.add(flood)
         SESSION.commit()
+        update_profile_section(chat_id, "flood", flood)
+        CHAT_FLOOD.invalidate(chat_id)
 
 
 def update_flood(chat_id: str, user_id) -> bool:
-    if str(chat_id) in CHAT_FLOOD:
-        curr_user_id, count, limit = CHAT_FLOOD.get(str(chat_id), DEF_OBJ)
+    limit = get_flood_limit(chat_id)
+    if not limit:  # no antiflood
+        return False
 
-        if limit == 0:  # no antiflood
-            return False
+    curr_user_id, count = CHAT_FLOOD.get(chat_id)
+    if user_id != curr_user_id or user_id is None:  # other user
+        CHAT_FLOOD.set(chat_id, (user_id, DEF_COUNT))
+        return False
+
+    count += 1
+    if count > limit:  # too many msgs, kick
+        CHAT_FLOOD.set(chat_id, DEF_OBJ[:2])
+        return True
+
+    # default -> update
+    CHAT_FLOOD.set(chat_id, (user_id, count))
+    return False
+
+
+def get_flood_limit(chat_id):
+    setting = get_profile_section(chat_id, "flood")
+    if setting and setting[0]:
+        return setting[0]
+    return DEF_LIMIT
+
+
+def set_flood_timer(chat_id, count, seconds):
+    with INSERTION_FLOOD_TIMER_LOCK:
+        timer = SESSION.query(FloodTimer).get(str(chat_id))
+        if not timer:
+            timer = FloodTimer(str(chat_id))
+
+        timer.count = count
+        timer.seconds = seconds
+
+        SESSION.add(timer)
+        SESSION.commit()
+        update_profile_section(chat_id, "flood_timer", timer)
 
-        if user_id != curr_user_id or user_id is None:  # other user
-            CHAT_FLOOD[str(chat_id)] = (user_id, DEF_COUNT, limit)
-            return False
 
-        count += 1
-        if count > limit:  # too many msgs, kick
-            CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, limit)
-            return True
+def get_flood_timer(chat_id):
+    timer = get_profile_section(chat_id, "flood_timer")
+    if timer and timer[0] and timer[1]:
+        return timer
+    return 0, 0
 
-        # default -> update
-        CHAT_FLOOD[str(chat_id)] = (user_id, count, limit)
+
+def is_flood_enabled(chat_id):
+    return bool(get_flood_limit(chat_id) or get_flood_timer(chat_id)[0])
+
+
+def update_flood_timer(chat_id, user_id) -> bool:
+    count, seconds = get_flood_timer(chat_id)
+    if not count or user_id is None:
         return False
 
+    now = time.monotonic()
+    key = (str(chat_id), user_id)
+    with FLOOD_WINDOW_LOCK:
+        window = FLOOD_WINDOWS.get(key)
+        if window is None or window[0] != seconds or len(window[1]) != count:
+            # new user, or the chat changed its timer
+            window = [seconds, array("d", [float("-inf")] * count), 0]
+            FLOOD_WINDOWS[key] = window
+        else:
+            FLOOD_WINDOWS.move_to_end(key)
 
-def get_flood_limit(chat_id):
-    return CHAT_FLOOD.get(str(chat_id), DEF_OBJ)[2]
+        _, stamps, pos = window
+        oldest = stamps[pos]
+        stamps[pos] = now
+        window[2] = (pos + 1) % count
+
+        flooded = now - oldest <= seconds
+        if flooded:
+            # start over so the next message isn't counted as flood again
+            del FLOOD_WINDOWS[key]
+
+        __evict_flood_windows(now)
+
+    return flooded
+
+
+def __evict_flood_windows(now):
+    # drop users whose last message already left their window, and the
+    # least recently active ones once we track too many
+    while FLOOD_WINDOWS:
+        key, (seconds, stamps, pos) = next(iter(FLOOD_WINDOWS.items()))
+        newest = stamps[pos - 1]
+        if (now - newest <= seconds and
+                len(FLOOD_WINDOWS) <= FLOOD_WINDOWS_MAX):
+            break
+        del FLOOD_WINDOWS[key]
 
 
 def set_flood_strength(chat_id, flood_type, value):
@@ -105,41 +208,40 @@ def set_flood_strength(chat_id, flood_type, value):
 
         SESSION.add(curr_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "flood_settings", curr_setting)
 
 
 def get_flood_setting(chat_id):
-    try:
-        setting = SESSION.query(FloodSettings).get(str(chat_id))
-        if setting:
-            return setting.flood_type, setting.value
-        else:
-            return 1, "0"
-
-    finally:
-        SESSION.close()
+    setting = get_profile_section(chat_id, "flood_settings")
+    if setting:
+        return setting
+    return 1, "0"
 
 
 def migrate_chat(old_chat_id, new_chat_id):
     with INSERTION_FLOOD_LOCK:
         flood = SESSION.query(FloodControl).get(str(old_chat_id))
         if flood:
-            CHAT_FLOOD[str(new_chat_id)] = CHAT_FLOOD.get(
-                str(old_chat_id), DEF_OBJ)
             flood.chat_id = str(new_chat_id)
             SESSION.commit()
 
         SESSION.close()
 
+    with INSERTION_FLOOD_SETTINGS_LOCK:
+        setting = SESSION.query(FloodSettings).get(str(old_chat_id))
+        if setting:
+            setting.chat_id = str(new_chat_id)
+            SESSION.commit()
 
-def __load_flood_settings():
-    global CHAT_FLOOD
-    try:
-        all_chats = SESSION.query(FloodControl).all()
-        CHAT_FLOOD = {
-            chat.chat_id: (None, DEF_COUNT, chat.limit) for chat in all_chats
-        }
-    finally:
         SESSION.close()
 
+    with INSERTION_FLOOD_TIMER_LOCK:
+        timer = SESSION.query(FloodTimer).get(str(old_chat_id))
+        if timer:
+            timer.chat_id = str(new_chat_id)
+            SESSION.commit()
+
+        SESSION.close()
 
-__load_flood_settings()
+    CHAT_FLOOD.invalidate(old_chat_id, new_chat_id)
+    invalidate_chat_profile(old_chat_id, new_chat_id)
@@ -2,6 +2,14 @@ import threading
 
 from sqlalchemy import func, distinct, Column, String, UnicodeText, Integer
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
+from SaitamaRobot.modules.helper_funcs.trigger_matcher import TriggerMatcherCache
 from SaitamaRobot.modules.sql import SESSION, BASE
 
 
@@ -39,27 +47,38 @@ class BlacklistSettings(BASE):
             self.chat_id, self.blacklist_type)
 
 
-BlackListFilters.__table__.create(checkfirst=True)
-BlacklistSettings.__table__.create(checkfirst=True)
-
 BLACKLIST_FILTER_INSERTION_LOCK = threading.RLock()
 BLACKLIST_SETTINGS_INSERTION_LOCK = threading.RLock()
 
-CHAT_BLACKLISTS = {}
-CHAT_SETTINGS_BLACKLISTS = {}
+register_section("blacklist_settings", BlacklistSettings,
+                 ("blacklist_type", "value"))
+
+
+def __load_chat_blacklist(chat_id):
+    try:
+        return frozenset(
+            trigger for (trigger,) in SESSION.query(BlackListFilters.trigger)
+            .filter(BlackListFilters.chat_id == chat_id))
+    finally:
+        SESSION.close()
+
+
+CHAT_BLACKLISTS = ChatCache("blacklist", __load_chat_blacklist)
 
 
 def add_to_blacklist(chat_id, trigger):
     with BLACKLIST_FILTER_INSERTION_LOCK:
+        triggers = CHAT_BLACKLISTS.get(chat_id)
         blacklist_filt = BlackListFilters(str(chat_id), trigger)
 
         SESSION.merge(blacklist_filt)  # merge to avoid duplicate key issues
         SESSION.commit()
-        global CHAT_BLACKLISTS
-        if CHAT_BLACKLISTS.get(str(chat_id), set()) == set():
-            CHAT_BLACKLISTS[str(chat_id)] = {trigger}
-        else:
-            CHAT_BLACKLISTS.get(str(chat_id), set()).add(trigger)
+        if not triggers:
+            incr_stat("blacklist_chats")
+        if trigger not in triggers:
+            incr_stat("blacklist_filters")
+        CHAT_BLACKLISTS.set(chat_id, triggers | {trigger})
+        BLACKLIST_MATCHERS.invalidate(chat_id)
 
 
 def rm_from_blacklist(chat_id, trigger):
@@ -67,12 +86,14 @@ def rm_from_blacklist(chat_id, trigger):
         blacklist_filt = SESSION.query(BlackListFilters).get(
             (str(chat_id), trigger))
         if blacklist_filt:
-            if trigger in CHAT_BLACKLISTS.get(str(chat_id),
-                                              set()):  # sanity check
-                CHAT_BLACKLISTS.get(str(chat_id), set()).remove(trigger)
-
+            triggers = CHAT_BLACKLISTS.get(chat_id) - {trigger}
             SESSION.delete(blacklist_filt)
             SESSION.commit()
+            CHAT_BLACKLISTS.set(chat_id, triggers)
+            BLACKLIST_MATCHERS.invalidate(chat_id)
+            incr_stat("blacklist_filters", -1)
+            if not triggers:
+                incr_stat("blacklist_chats", -1)
             return True
 
         SESSION.close()
@@ -80,16 +101,28 @@ def rm_from_blacklist(chat_id, trigger):
 
 
 def get_chat_blacklist(chat_id):
-    return CHAT_BLACKLISTS.get(str(chat_id), set())
+    return CHAT_BLACKLISTS.get(chat_id)
 
 
-def num_blacklist_filters():
+BLACKLIST_MATCHERS = TriggerMatcherCache("blacklist_matchers",
+                                         get_chat_blacklist)
+
+
+def get_chat_blacklist_matcher(chat_id):
+    return BLACKLIST_MATCHERS.get(chat_id)
+
+
+def __count_blacklist_filters():
     try:
         return SESSION.query(BlackListFilters).count()
     finally:
         SESSION.close()
 
 
+def num_blacklist_filters():
+    return get_stat("blacklist_filters")
+
+
 def num_blacklist_chat_filters(chat_id):
     try:
         return (SESSION.query(BlackListFilters.chat_id).filter(
@@ -98,7 +131,7 @@ def num_blacklist_chat_filters(chat_id):
         SESSION.close()
 
 
-def num_blacklist_filter_chats():
+def __count_blacklist_filter_chats():
     try:
         return SESSION.query(func.count(distinct(
             BlackListFilters.chat_id))).scalar()
@@ -106,6 +139,14 @@ def num_blacklist_filter_chats():
         SESSION.close()
 
 
+def num_blacklist_filter_chats():
+    return get_stat("blacklist_chats")
+
+
+register_stat("blacklist_filters", __count_blacklist_filters)
+register_stat("blacklist_chats", __count_blacklist_filter_chats)
+
+
 def set_blacklist_strength(chat_id, blacklist_type, value):
     # for blacklist_type
     # 0 = nothing
@@ -117,7 +158,6 @@ def set_blacklist_strength(chat_id, blacklist_type, value):
     # 6 = tban
     # 7 = tmute
     with BLACKLIST_SETTINGS_INSERTION_LOCK:
-        global CHAT_SETTINGS_BLACKLISTS
         curr_setting = SESSION.query(BlacklistSettings).get(str(chat_id))
         if not curr_setting:
             curr_setting = BlacklistSettings(
@@ -125,56 +165,17 @@ def set_blacklist_strength(chat_id, blacklist_type, value):
 
         curr_setting.blacklist_type = int(blacklist_type)
         curr_setting.value = str(value)
-        CHAT_SETTINGS_BLACKLISTS[str(chat_id)] = {
-            "blacklist_type": int(blacklist_type),
-            "value": value,
-        }
 
         SESSION.add(curr_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "blacklist_settings", curr_setting)
 
 
 def get_blacklist_setting(chat_id):
-    try:
-        setting = CHAT_SETTINGS_BLACKLISTS.get(str(chat_id))
-        if setting:
-            return setting["blacklist_type"], setting["value"]
-        else:
-            return 1, "0"
-
-    finally:
-        SESSION.close()
-
-
-def __load_chat_blacklists():
-    global CHAT_BLACKLISTS
-    try:
-        chats = SESSION.query(BlackListFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            CHAT_BLACKLISTS[chat_id] = []
-
-        all_filters = SESSION.query(BlackListFilters).all()
-        for x in all_filters:
-            CHAT_BLACKLISTS[x.chat_id] += [x.trigger]
-
-        CHAT_BLACKLISTS = {x: set(y) for x, y in CHAT_BLACKLISTS.items()}
-
-    finally:
-        SESSION.close()
-
-
-def __load_chat_settings_blacklists():
-    global CHAT_SETTINGS_BLACKLISTS
-    try:
-        chats_settings = SESSION.query(BlacklistSettings).all()
-        for x in chats_settings:  # remove tuple by ( ,)
-            CHAT_SETTINGS_BLACKLISTS[x.chat_id] = {
-                "blacklist_type": x.blacklist_type,
-                "value": x.value,
-            }
-
-    finally:
-        SESSION.close()
+    setting = get_profile_section(chat_id, "blacklist_settings")
+    if setting:
+        return setting
+    return 1, "0"
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -185,7 +186,6 @@ def migrate_chat(old_chat_id, new_chat_id):
         for filt in chat_filters:
             filt.chat_id = str(new_chat_id)
         SESSION.commit()
-
-
-__load_chat_blacklists()
-__load_chat_settings_blacklists()
+        CHAT_BLACKLISTS.invalidate(old_chat_id, new_chat_id)
+        BLACKLIST_MATCHERS.invalidate(old_chat_id, new_chat_id)
+        invalidate_chat_profile(old_chat_id, new_chat_id)
@@ -1,5 +1,6 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.cache_snapshot import register_globals
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Column, String, UnicodeText
 
@@ -14,8 +15,6 @@ class BlacklistUsers(BASE):
         self.reason = reason
 
 
-BlacklistUsers.__table__.create(checkfirst=True)
-
 BLACKLIST_LOCK = threading.RLock()
 BLACKLIST_USERS = set()
 
@@ -67,4 +66,5 @@ def __load_blacklist_userid_list():
         SESSION.close()
 
 
-__load_blacklist_userid_list()
+register_globals("blacklist_users", __name__, ("BLACKLIST_USERS",),
+                 __load_blacklist_userid_list, BLACKLIST_LOCK)
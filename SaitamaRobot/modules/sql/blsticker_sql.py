@@ -1,5 +1,12 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Column, Integer, String, UnicodeText, distinct, func
 
@@ -38,27 +45,37 @@ class StickerSettings(BASE):
             self.chat_id, self.blacklist_type)
 
 
-StickersFilters.__table__.create(checkfirst=True)
-StickerSettings.__table__.create(checkfirst=True)
-
 STICKERS_FILTER_INSERTION_LOCK = threading.RLock()
 STICKSET_FILTER_INSERTION_LOCK = threading.RLock()
 
-CHAT_STICKERS = {}
-CHAT_BLSTICK_BLACKLISTS = {}
+register_section("blsticker_settings", StickerSettings,
+                 ("blacklist_type", "value"))
+
+
+def __load_chat_stickers(chat_id):
+    try:
+        return frozenset(
+            trigger for (trigger,) in SESSION.query(StickersFilters.trigger)
+            .filter(StickersFilters.chat_id == chat_id))
+    finally:
+        SESSION.close()
+
+
+CHAT_STICKERS = ChatCache("blsticker", __load_chat_stickers)
 
 
 def add_to_stickers(chat_id, trigger):
     with STICKERS_FILTER_INSERTION_LOCK:
+        triggers = CHAT_STICKERS.get(chat_id)
         stickers_filt = StickersFilters(str(chat_id), trigger)
 
         SESSION.merge(stickers_filt)  # merge to avoid duplicate key issues
         SESSION.commit()
-        global CHAT_STICKERS
-        if CHAT_STICKERS.get(str(chat_id), set()) == set():
-            CHAT_STICKERS[str(chat_id)] = {trigger}
-        else:
-            CHAT_STICKERS.get(str(chat_id), set()).add(trigger)
+        if not triggers:
+            incr_stat("blsticker_chats")
+        if trigger not in triggers:
+            incr_stat("blsticker_filters")
+        CHAT_STICKERS.set(chat_id, triggers | {trigger})
 
 
 def rm_from_stickers(chat_id, trigger):
@@ -66,12 +83,13 @@ def rm_from_stickers(chat_id, trigger):
         stickers_filt = SESSION.query(StickersFilters).get(
             (str(chat_id), trigger))
         if stickers_filt:
-            if trigger in CHAT_STICKERS.get(str(chat_id),
-                                            set()):  # sanity check
-                CHAT_STICKERS.get(str(chat_id), set()).remove(trigger)
-
+            triggers = CHAT_STICKERS.get(chat_id) - {trigger}
             SESSION.delete(stickers_filt)
             SESSION.commit()
+            CHAT_STICKERS.set(chat_id, triggers)
+            incr_stat("blsticker_filters", -1)
+            if not triggers:
+                incr_stat("blsticker_chats", -1)
             return True
 
         SESSION.close()
@@ -79,16 +97,20 @@ def rm_from_stickers(chat_id, trigger):
 
 
 def get_chat_stickers(chat_id):
-    return CHAT_STICKERS.get(str(chat_id), set())
+    return CHAT_STICKERS.get(chat_id)
 
 
-def num_stickers_filters():
+def __count_stickers_filters():
     try:
         return SESSION.query(StickersFilters).count()
     finally:
         SESSION.close()
 
 
+def num_stickers_filters():
+    return get_stat("blsticker_filters")
+
+
 def num_stickers_chat_filters(chat_id):
     try:
         return SESSION.query(StickersFilters.chat_id).filter(
@@ -97,7 +119,7 @@ def num_stickers_chat_filters(chat_id):
         SESSION.close()
 
 
-def num_stickers_filter_chats():
+def __count_stickers_filter_chats():
     try:
         return SESSION.query(func.count(distinct(
             StickersFilters.chat_id))).scalar()
@@ -105,6 +127,14 @@ def num_stickers_filter_chats():
         SESSION.close()
 
 
+def num_stickers_filter_chats():
+    return get_stat("blsticker_chats")
+
+
+register_stat("blsticker_filters", __count_stickers_filters)
+register_stat("blsticker_chats", __count_stickers_filter_chats)
+
+
 def set_blacklist_strength(chat_id, blacklist_type, value):
     # for blacklist_type
     # 0 = nothing
@@ -116,7 +146,6 @@ def set_blacklist_strength(chat_id, blacklist_type, value):
     # 6 = tban
     # 7 = tmute
     with STICKSET_FILTER_INSERTION_LOCK:
-        global CHAT_BLSTICK_BLACKLISTS
         curr_setting = SESSION.query(StickerSettings).get(str(chat_id))
         if not curr_setting:
             curr_setting = StickerSettings(
@@ -124,56 +153,17 @@ def set_blacklist_strength(chat_id, blacklist_type, value):
 
         curr_setting.blacklist_type = int(blacklist_type)
         curr_setting.value = str(value)
-        CHAT_BLSTICK_BLACKLISTS[str(chat_id)] = {
-            'blacklist_type': int(blacklist_type),
-            'value': value
-        }
 
         SESSION.add(curr_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "blsticker_settings", curr_setting)
 
 
 def get_blacklist_setting(chat_id):
-    try:
-        setting = CHAT_BLSTICK_BLACKLISTS.get(str(chat_id))
-        if setting:
-            return setting['blacklist_type'], setting['value']
-        else:
-            return 1, "0"
-
-    finally:
-        SESSION.close()
-
-
-def __load_CHAT_STICKERS():
-    global CHAT_STICKERS
-    try:
-        chats = SESSION.query(StickersFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            CHAT_STICKERS[chat_id] = []
-
-        all_filters = SESSION.query(StickersFilters).all()
-        for x in all_filters:
-            CHAT_STICKERS[x.chat_id] += [x.trigger]
-
-        CHAT_STICKERS = {x: set(y) for x, y in CHAT_STICKERS.items()}
-
-    finally:
-        SESSION.close()
-
-
-def __load_chat_stickerset_blacklists():
-    global CHAT_BLSTICK_BLACKLISTS
-    try:
-        chats_settings = SESSION.query(StickerSettings).all()
-        for x in chats_settings:  # remove tuple by ( ,)
-            CHAT_BLSTICK_BLACKLISTS[x.chat_id] = {
-                'blacklist_type': x.blacklist_type,
-                'value': x.value
-            }
-
-    finally:
-        SESSION.close()
+    setting = get_profile_section(chat_id, "blsticker_settings")
+    if setting:
+        return setting
+    return 1, "0"
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -183,7 +173,5 @@ def migrate_chat(old_chat_id, new_chat_id):
         for filt in chat_filters:
             filt.chat_id = str(new_chat_id)
         SESSION.commit()
-
-
-__load_CHAT_STICKERS()
-__load_chat_stickerset_blacklists()
+        CHAT_STICKERS.invalidate(old_chat_id, new_chat_id)
+        invalidate_chat_profile(old_chat_id, new_chat_id)
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from SaitamaRobot.modules.sql import BASE, SESSION
+from sqlalchemy import Boolean, Column, Integer, String, UnicodeText
+
+
+class BroadcastJob(BASE):
+    __tablename__ = "broadcast_jobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    text = Column(UnicodeText, nullable=False)
+    to_groups = Column(Boolean, default=True)
+    to_users = Column(Boolean, default=True)
+    # "groups" then "users", "done" or "cancelled" once finished
+    stage = Column(String(10), nullable=False)
+    cursor = Column(String(14), default=None)  # last recipient id handled
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    removed = Column(Integer, default=0)
+    report_chat = Column(String(14))
+    report_message = Column(Integer)
+    started = Column(Integer)
+
+    def __init__(self, text, to_groups, to_users, report_chat):
+        self.text = text
+        self.to_groups = to_groups
+        self.to_users = to_users
+        self.stage = "groups" if to_groups else "users"
+        self.cursor = None
+        self.sent = 0
+        self.failed = 0
+        self.removed = 0
+        self.report_chat = str(report_chat)
+        self.started = int(time.time())
+
+    def __repr__(self):
+        return "<Broadcast {} at {} ({} sent, {} failed)>".format(
+            self.id, self.stage, self.sent, self.failed)
+
+
+BROADCAST_LOCK = threading.RLock()
+
+
+def new_job(text, to_groups, to_users, report_chat):
+    with BROADCAST_LOCK:
+        job = BroadcastJob(text, to_groups, to_users, report_chat)
+        SESSION.add(job)
+        SESSION.commit()
+        job_id = job.id
+        SESSION.close()
+        return job_id
+
+
+def get_job(job_id):
+    try:
+        job = SESSION.query(BroadcastJob).get(int(job_id))
+        if job:
+            SESSION.expunge(job)
+        return job
+    finally:
+        SESSION.close()
+
+
+def get_unfinished_jobs():
+    try:
+        jobs = SESSION.query(BroadcastJob).filter(
+            BroadcastJob.stage.in_(("groups", "users"))).order_by(
+                BroadcastJob.id).all()
+        for job in jobs:
+            SESSION.expunge(job)
+        return jobs
+    finally:
+        SESSION.close()
+
+
+def checkpoint(job_id, stage, cursor, sent, failed, removed,
+               report_message=None):
+    """Saves how far a job got, returns False if it was cancelled meanwhile."""
+    with BROADCAST_LOCK:
+        try:
+            job = SESSION.query(BroadcastJob).get(int(job_id))
+            if not job or job.stage == "cancelled":
+                return False
+            job.stage = stage
+            job.cursor = None if cursor is None else str(cursor)
+            job.sent = sent
+            job.failed = failed
+            job.removed = removed
+            if report_message:
+                job.report_message = report_message
+            SESSION.commit()
+            return True
+        finally:
+            SESSION.close()
+
+
+def cancel_job(job_id):
+    with BROADCAST_LOCK:
+        try:
+            job = SESSION.query(BroadcastJob).get(int(job_id))
+            if not job or job.stage not in ("groups", "users"):
+                return False
+            job.stage = "cancelled"
+            SESSION.commit()
+            return True
+        finally:
+            SESSION.close()
@@ -1,5 +1,7 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, register_section, update_profile_section)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Column, String
 
@@ -16,20 +18,17 @@ class ChatbotChats(BASE):
         self.expires = expires
 
 
-ChatbotChats.__table__.create(checkfirst=True)
-
 INSERTION_LOCK = threading.RLock()
 
+register_section("chatbot", ChatbotChats, ("ses_id", "expires"))
+
 
 def is_chat(chat_id):
-    try:
-        chat = SESSION.query(ChatbotChats).get(str(chat_id))
-        if chat:
-            return True
-        else:
-            return False
-    finally:
-        SESSION.close()
+    chat = get_profile_section(chat_id, "chatbot")
+    if chat:
+        return True
+    else:
+        return False
 
 
 def set_ses(chat_id, ses_id, expires):
@@ -43,17 +42,17 @@ def set_ses(chat_id, ses_id, expires):
 
         SESSION.add(autochat)
         SESSION.commit()
+        update_profile_section(chat_id, "chatbot", autochat)
 
 
 def get_ses(chat_id):
-    autochat = SESSION.query(ChatbotChats).get(str(chat_id))
+    autochat = get_profile_section(chat_id, "chatbot")
     sesh = ""
     exp = ""
     if autochat:
-        sesh = str(autochat.ses_id)
-        exp = str(autochat.expires)
+        sesh = str(autochat[0])
+        exp = str(autochat[1])
 
-    SESSION.close()
     return sesh, exp
 
 
@@ -64,6 +63,7 @@ def rem_chat(chat_id):
             SESSION.delete(autochat)
 
         SESSION.commit()
+        update_profile_section(chat_id, "chatbot", None)
 
 
 def get_all_chats():
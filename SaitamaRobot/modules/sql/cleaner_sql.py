@@ -1,5 +1,9 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.cache_snapshot import register_globals
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, register_section, update_profile_section)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Boolean, Column, UnicodeText
 
@@ -35,17 +39,26 @@ class CleanerBlueTextGlobal(BASE):
         self.command = command
 
 
-CleanerBlueTextChatSettings.__table__.create(checkfirst=True)
-CleanerBlueTextChat.__table__.create(checkfirst=True)
-CleanerBlueTextGlobal.__table__.create(checkfirst=True)
-
 CLEANER_CHAT_SETTINGS = threading.RLock()
 CLEANER_CHAT_LOCK = threading.RLock()
 CLEANER_GLOBAL_LOCK = threading.RLock()
 
-CLEANER_CHATS = {}
 GLOBAL_IGNORE_COMMANDS = set()
 
+register_section("cleaner", CleanerBlueTextChatSettings, ("is_enable",))
+
+
+def __load_chat_ignored(chat_id):
+    try:
+        return frozenset(
+            command for (command,) in SESSION.query(CleanerBlueTextChat.command)
+            .filter(CleanerBlueTextChat.chat_id == chat_id))
+    finally:
+        SESSION.close()
+
+
+CLEANER_CHATS = ChatCache("cleaner_ignored", __load_chat_ignored)
+
 
 def set_cleanbt(chat_id, is_enable):
     with CLEANER_CHAT_SETTINGS:
@@ -54,40 +67,24 @@ def set_cleanbt(chat_id, is_enable):
         if not curr:
             curr = CleanerBlueTextChatSettings(str(chat_id), is_enable)
         else:
-            curr.is_enabled = is_enable
-
-        if str(chat_id) not in CLEANER_CHATS:
-            CLEANER_CHATS.setdefault(
-                str(chat_id), {
-                    "setting": False,
-                    "commands": set()
-                })
-
-        CLEANER_CHATS[str(chat_id)]["setting"] = is_enable
+            curr.is_enable = is_enable
 
         SESSION.add(curr)
         SESSION.commit()
+        update_profile_section(chat_id, "cleaner", curr)
 
 
 def chat_ignore_command(chat_id, ignore):
     ignore = ignore.lower()
     with CLEANER_CHAT_LOCK:
+        commands = CLEANER_CHATS.get(chat_id)
         ignored = SESSION.query(CleanerBlueTextChat).get((str(chat_id), ignore))
 
         if not ignored:
-
-            if str(chat_id) not in CLEANER_CHATS:
-                CLEANER_CHATS.setdefault(
-                    str(chat_id), {
-                        "setting": False,
-                        "commands": set()
-                    })
-
-            CLEANER_CHATS[str(chat_id)]["commands"].add(ignore)
-
             ignored = CleanerBlueTextChat(str(chat_id), ignore)
             SESSION.add(ignored)
             SESSION.commit()
+            CLEANER_CHATS.set(chat_id, commands | {ignore})
             return True
         SESSION.close()
         return False
@@ -100,18 +97,10 @@ def chat_unignore_command(chat_id, unignore):
             (str(chat_id), unignore))
 
         if unignored:
-
-            if str(chat_id) not in CLEANER_CHATS:
-                CLEANER_CHATS.setdefault(
-                    str(chat_id), {
-                        "setting": False,
-                        "commands": set()
-                    })
-            if unignore in CLEANER_CHATS.get(str(chat_id)).get("commands"):
-                CLEANER_CHATS[str(chat_id)]["commands"].remove(unignore)
-
+            commands = CLEANER_CHATS.get(chat_id) - {unignore}
             SESSION.delete(unignored)
             SESSION.commit()
+            CLEANER_CHATS.set(chat_id, commands)
             return True
 
         SESSION.close()
@@ -156,33 +145,23 @@ def is_command_ignored(chat_id, command):
     if command.lower() in GLOBAL_IGNORE_COMMANDS:
         return True
 
-    if str(chat_id) in CLEANER_CHATS:
-        if command.lower() in CLEANER_CHATS.get(str(chat_id)).get('commands'):
-            return True
-
-    return False
+    return command.lower() in CLEANER_CHATS.get(chat_id)
 
 
 def is_enabled(chat_id):
-    if str(chat_id) in CLEANER_CHATS:
-        settings = CLEANER_CHATS.get(str(chat_id)).get('setting')
-        return settings
+    setting = get_profile_section(chat_id, "cleaner")
+    if setting:
+        return setting[0]
 
     return False
 
 
 def get_all_ignored(chat_id):
-    if str(chat_id) in CLEANER_CHATS:
-        LOCAL_IGNORE_COMMANDS = CLEANER_CHATS.get(str(chat_id)).get("commands")
-    else:
-        LOCAL_IGNORE_COMMANDS = set()
-
-    return GLOBAL_IGNORE_COMMANDS, LOCAL_IGNORE_COMMANDS
+    return GLOBAL_IGNORE_COMMANDS, CLEANER_CHATS.get(chat_id)
 
 
 def __load_cleaner_list():
     global GLOBAL_IGNORE_COMMANDS
-    global CLEANER_CHATS
 
     try:
         GLOBAL_IGNORE_COMMANDS = {
@@ -191,25 +170,6 @@ def __load_cleaner_list():
     finally:
         SESSION.close()
 
-    try:
-        for x in SESSION.query(CleanerBlueTextChatSettings).all():
-            CLEANER_CHATS.setdefault(x.chat_id, {
-                "setting": False,
-                "commands": set()
-            })
-            CLEANER_CHATS[x.chat_id]["setting"] = x.is_enable
-    finally:
-        SESSION.close()
-
-    try:
-        for x in SESSION.query(CleanerBlueTextChat).all():
-            CLEANER_CHATS.setdefault(x.chat_id, {
-                "setting": False,
-                "commands": set()
-            })
-            CLEANER_CHATS[x.chat_id]["commands"].add(x.command)
-    finally:
-        SESSION.close()
-
 
-__load_cleaner_list()
+register_globals("cleaner_global", __name__, ("GLOBAL_IGNORE_COMMANDS",),
+                 __load_cleaner_list, CLEANER_GLOBAL_LOCK)
@@ -4,6 +4,9 @@ from typing import Union
 
 from sqlalchemy import Column, String, Boolean, UnicodeText, Integer
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, register_section, update_profile_section)
 from SaitamaRobot.modules.sql import SESSION, BASE
 
 
@@ -49,26 +52,19 @@ class ConnectionHistory(BASE):
                                                         self.chat_id)
 
 
-ChatAccessConnectionSettings.__table__.create(checkfirst=True)
-Connection.__table__.create(checkfirst=True)
-ConnectionHistory.__table__.create(checkfirst=True)
-
 CHAT_ACCESS_LOCK = threading.RLock()
 CONNECTION_INSERTION_LOCK = threading.RLock()
 CONNECTION_HISTORY_LOCK = threading.RLock()
 
-HISTORY_CONNECT = {}
+register_section("connection", ChatAccessConnectionSettings,
+                 ("allow_connect_to_chat",))
 
 
 def allow_connect_to_chat(chat_id: Union[str, int]) -> bool:
-    try:
-        chat_setting = SESSION.query(ChatAccessConnectionSettings).get(
-            str(chat_id))
-        if chat_setting:
-            return chat_setting.allow_connect_to_chat
-        return False
-    finally:
-        SESSION.close()
+    chat_setting = get_profile_section(chat_id, "connection")
+    if chat_setting:
+        return chat_setting[0]
+    return False
 
 
 def set_allow_connect_to_chat(chat_id: Union[int, str], setting: bool):
@@ -81,6 +77,7 @@ def set_allow_connect_to_chat(chat_id: Union[int, str], setting: bool):
         chat_setting.allow_connect_to_chat = setting
         SESSION.add(chat_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "connection", chat_setting)
 
 
 def connect(user_id, chat_id):
@@ -120,37 +117,54 @@ def disconnect(user_id):
             return False
 
 
+def __load_user_history(user_id):
+    try:
+        return {
+            x.conn_time: {
+                "chat_name": x.chat_name,
+                "chat_id": x.chat_id,
+            } for x in SESSION.query(ConnectionHistory).filter(
+                ConnectionHistory.user_id == int(user_id)).order_by(
+                    ConnectionHistory.conn_time)
+        }
+    finally:
+        SESSION.close()
+
+
+# user_id -> {conn_time: chat}, changed in place under CONNECTION_HISTORY_LOCK
+HISTORY_CONNECT = ChatCache(
+    "connection_history", __load_user_history, snapshot=False)
+
+
 def add_history_conn(user_id, chat_id, chat_name):
-    global HISTORY_CONNECT
     with CONNECTION_HISTORY_LOCK:
         conn_time = int(time.time())
-        if HISTORY_CONNECT.get(int(user_id)):
+        user_history = HISTORY_CONNECT.get(user_id)
+        if user_history:
             counting = (
                 SESSION.query(ConnectionHistory.user_id).filter(
                     ConnectionHistory.user_id == str(user_id)).count())
             getchat_id = {}
-            for x in HISTORY_CONNECT[int(user_id)]:
-                getchat_id[HISTORY_CONNECT[int(user_id)][x]["chat_id"]] = x
+            for x in user_history:
+                getchat_id[user_history[x]["chat_id"]] = x
             if chat_id in getchat_id:
                 todeltime = getchat_id[str(chat_id)]
                 delold = SESSION.query(ConnectionHistory).get(
                     (int(user_id), str(chat_id)))
                 if delold:
                     SESSION.delete(delold)
-                    HISTORY_CONNECT[int(user_id)].pop(todeltime)
+                    user_history.pop(todeltime)
             elif counting >= 5:
-                todel = list(HISTORY_CONNECT[int(user_id)])
+                todel = list(user_history)
                 todel.reverse()
                 todel = todel[4:]
                 for x in todel:
-                    chat_old = HISTORY_CONNECT[int(user_id)][x]["chat_id"]
+                    chat_old = user_history[x]["chat_id"]
                     delold = SESSION.query(ConnectionHistory).get(
                         (int(user_id), str(chat_old)))
                     if delold:
                         SESSION.delete(delold)
-                        HISTORY_CONNECT[int(user_id)].pop(x)
-        else:
-            HISTORY_CONNECT[int(user_id)] = {}
+                        user_history.pop(x)
         delold = SESSION.query(ConnectionHistory).get(
             (int(user_id), str(chat_id)))
         if delold:
@@ -159,47 +173,28 @@ def add_history_conn(user_id, chat_id, chat_name):
             int(user_id), str(chat_id), chat_name, conn_time)
         SESSION.add(history)
         SESSION.commit()
-        HISTORY_CONNECT[int(user_id)][conn_time] = {
+        user_history[conn_time] = {
             "chat_name": chat_name,
             "chat_id": str(chat_id),
         }
+        HISTORY_CONNECT.set(user_id, user_history)
 
 
 def get_history_conn(user_id):
-    if not HISTORY_CONNECT.get(int(user_id)):
-        HISTORY_CONNECT[int(user_id)] = {}
-    return HISTORY_CONNECT[int(user_id)]
+    return HISTORY_CONNECT.get(user_id)
 
 
 def clear_history_conn(user_id):
-    global HISTORY_CONNECT
-    todel = list(HISTORY_CONNECT[int(user_id)])
-    for x in todel:
-        chat_old = HISTORY_CONNECT[int(user_id)][x]["chat_id"]
-        delold = SESSION.query(ConnectionHistory).get(
-            (int(user_id), str(chat_old)))
-        if delold:
-            SESSION.delete(delold)
-            HISTORY_CONNECT[int(user_id)].pop(x)
-    SESSION.commit()
+    with CONNECTION_HISTORY_LOCK:
+        user_history = HISTORY_CONNECT.get(user_id)
+        todel = list(user_history)
+        for x in todel:
+            chat_old = user_history[x]["chat_id"]
+            delold = SESSION.query(ConnectionHistory).get(
+                (int(user_id), str(chat_old)))
+            if delold:
+                SESSION.delete(delold)
+                user_history.pop(x)
+        SESSION.commit()
+        HISTORY_CONNECT.set(user_id, user_history)
     return True
-
-
-def __load_user_history():
-    global HISTORY_CONNECT
-    try:
-        qall = SESSION.query(ConnectionHistory).all()
-        HISTORY_CONNECT = {}
-        for x in qall:
-            check = HISTORY_CONNECT.get(x.user_id)
-            if check is None:
-                HISTORY_CONNECT[x.user_id] = {}
-            HISTORY_CONNECT[x.user_id][x.conn_time] = {
-                "chat_name": x.chat_name,
-                "chat_id": x.chat_id,
-            }
-    finally:
-        SESSION.close()
-
-
-__load_user_history()
@@ -1,8 +1,13 @@
 import threading
 
-from sqlalchemy import Column, String, UnicodeText, Boolean, Integer, distinct, func
+from sqlalchemy import Column, String, UnicodeText, Boolean, Index, Integer, distinct, func
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
 from SaitamaRobot.modules.helper_funcs.msg_types import Types
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
+from SaitamaRobot.modules.helper_funcs.trigger_matcher import TriggerMatcherCache
 from SaitamaRobot.modules.sql import BASE, SESSION
 
 
@@ -22,10 +27,7 @@ class CustomFilters(BASE):
     # NOTE: Here for legacy purposes, to ensure older filters don't mess up.
     has_markdown = Column(Boolean, nullable=False, default=False)
 
-    # NEW FILTER
-    # alter table cust_filters add column reply_text text;
-    # alter table cust_filters add column file_type integer default 1;
-    # alter table cust_filters add column file_id text;
+    # NEW FILTER, added to older tables by the schema update
     reply_text = Column(UnicodeText)
     file_type = Column(Integer, nullable=False, default=1)
     file_id = Column(UnicodeText, default=None)
@@ -103,6 +105,9 @@ class Buttons(BASE):
     name = Column(UnicodeText, nullable=False)
     url = Column(UnicodeText, nullable=False)
     same_line = Column(Boolean, default=False)
+    # the primary key starts with id, buttons are looked up by filter
+    __table_args__ = (Index("ix_cust_filter_urls_chat_id_keyword", "chat_id",
+                            "keyword"),)
 
     def __init__(self, chat_id, keyword, name, url, same_line=False):
         self.chat_id = str(chat_id)
@@ -112,12 +117,24 @@ class Buttons(BASE):
         self.same_line = same_line
 
 
-CustomFilters.__table__.create(checkfirst=True)
-Buttons.__table__.create(checkfirst=True)
-
 CUST_FILT_LOCK = threading.RLock()
 BUTTON_LOCK = threading.RLock()
-CHAT_FILTERS = {}
+
+
+def __sort_triggers(keywords):
+    return tuple(sorted(set(keywords), key=lambda x: (-len(x), x)))
+
+
+def __load_chat_filters(chat_id):
+    try:
+        return __sort_triggers(
+            keyword for (keyword,) in SESSION.query(CustomFilters.keyword)
+            .filter(CustomFilters.chat_id == chat_id))
+    finally:
+        SESSION.close()
+
+
+CHAT_FILTERS = ChatCache("filters", __load_chat_filters)
 
 
 def get_all_filters():
@@ -139,12 +156,11 @@ def add_filter(
     is_video=False,
     buttons=None,
 ):
-    global CHAT_FILTERS
-
     if buttons is None:
         buttons = []
 
     with CUST_FILT_LOCK:
+        triggers = CHAT_FILTERS.get(chat_id)
         prev = SESSION.query(CustomFilters).get((str(chat_id), keyword))
         if prev:
             with BUTTON_LOCK:
@@ -169,26 +185,27 @@ def add_filter(
             bool(buttons),
         )
 
-        if keyword not in CHAT_FILTERS.get(str(chat_id), []):
-            CHAT_FILTERS[str(chat_id)] = sorted(
-                CHAT_FILTERS.get(str(chat_id), []) + [keyword],
-                key=lambda x: (-len(x), x),
-            )
-
         SESSION.add(filt)
         SESSION.commit()
+        if not prev:
+            if not triggers:
+                incr_stat("filter_chats")
+            incr_stat("filters")
+
+        if keyword not in triggers:
+            CHAT_FILTERS.set(chat_id, __sort_triggers(triggers + (keyword,)))
+            FILTER_MATCHERS.invalidate(chat_id)
 
     for b_name, url, same_line in buttons:
         add_note_button_to_db(chat_id, keyword, b_name, url, same_line)
 
 
 def new_add_filter(chat_id, keyword, reply_text, file_type, file_id, buttons):
-    global CHAT_FILTERS
-
     if buttons is None:
         buttons = []
 
     with CUST_FILT_LOCK:
+        triggers = CHAT_FILTERS.get(chat_id)
         prev = SESSION.query(CustomFilters).get((str(chat_id), keyword))
         if prev:
             with BUTTON_LOCK:
@@ -216,27 +233,28 @@ def new_add_filter(chat_id, keyword, reply_text, file_type, file_id, buttons):
             file_id=file_id,
         )
 
-        if keyword not in CHAT_FILTERS.get(str(chat_id), []):
-            CHAT_FILTERS[str(chat_id)] = sorted(
-                CHAT_FILTERS.get(str(chat_id), []) + [keyword],
-                key=lambda x: (-len(x), x),
-            )
-
         SESSION.add(filt)
         SESSION.commit()
+        if not prev:
+            if not triggers:
+                incr_stat("filter_chats")
+            incr_stat("filters")
+
+        if keyword not in triggers:
+            CHAT_FILTERS.set(chat_id, __sort_triggers(triggers + (keyword,)))
+            FILTER_MATCHERS.invalidate(chat_id)
 
     for b_name, url, same_line in buttons:
         add_note_button_to_db(chat_id, keyword, b_name, url, same_line)
 
 
 def remove_filter(chat_id, keyword):
-    global CHAT_FILTERS
     with CUST_FILT_LOCK:
         filt = SESSION.query(CustomFilters).get((str(chat_id), keyword))
         if filt:
-            if keyword in CHAT_FILTERS.get(str(chat_id), []):  # Sanity check
-                CHAT_FILTERS.get(str(chat_id), []).remove(keyword)
-
+            triggers = tuple(
+                trigger for trigger in CHAT_FILTERS.get(chat_id)
+                if trigger != keyword)
             with BUTTON_LOCK:
                 prev_buttons = (
                     SESSION.query(Buttons).filter(
@@ -247,6 +265,11 @@ def remove_filter(chat_id, keyword):
 
             SESSION.delete(filt)
             SESSION.commit()
+            CHAT_FILTERS.set(chat_id, triggers)
+            FILTER_MATCHERS.invalidate(chat_id)
+            incr_stat("filters", -1)
+            if not triggers:
+                incr_stat("filter_chats", -1)
             return True
 
         SESSION.close()
@@ -254,7 +277,14 @@ def remove_filter(chat_id, keyword):
 
 
 def get_chat_triggers(chat_id):
-    return CHAT_FILTERS.get(str(chat_id), set())
+    return CHAT_FILTERS.get(chat_id)
+
+
+FILTER_MATCHERS = TriggerMatcherCache("filter_matchers", get_chat_triggers)
+
+
+def get_chat_filter_matcher(chat_id):
+    return FILTER_MATCHERS.get(chat_id)
 
 
 def get_chat_filters(chat_id):
@@ -290,14 +320,14 @@ def get_buttons(chat_id, keyword):
         SESSION.close()
 
 
-def num_filters():
+def __count_filters():
     try:
         return SESSION.query(CustomFilters).count()
     finally:
         SESSION.close()
 
 
-def num_chats():
+def __count_chats():
     try:
         return SESSION.query(func.count(distinct(
             CustomFilters.chat_id))).scalar()
@@ -305,24 +335,16 @@ def num_chats():
         SESSION.close()
 
 
-def __load_chat_filters():
-    global CHAT_FILTERS
-    try:
-        chats = SESSION.query(CustomFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            CHAT_FILTERS[chat_id] = []
+def num_filters():
+    return get_stat("filters")
 
-        all_filters = SESSION.query(CustomFilters).all()
-        for x in all_filters:
-            CHAT_FILTERS[x.chat_id] += [x.keyword]
 
-        CHAT_FILTERS = {
-            x: sorted(set(y), key=lambda i: (-len(i), i))
-            for x, y in CHAT_FILTERS.items()
-        }
+def num_chats():
+    return get_stat("filter_chats")
 
-    finally:
-        SESSION.close()
+
+register_stat("filters", __count_filters)
+register_stat("filter_chats", __count_chats)
 
 
 # ONLY USE FOR MIGRATE OLD FILTERS TO NEW FILTERS
@@ -368,10 +390,8 @@ def migrate_chat(old_chat_id, new_chat_id):
         for filt in chat_filters:
             filt.chat_id = str(new_chat_id)
         SESSION.commit()
-        old_filt = CHAT_FILTERS.get(str(old_chat_id))
-        if old_filt:
-           CHAT_FILTERS[str(new_chat_id)] = old_filt
-           del CHAT_FILTERS[str(old_chat_id)]
+        CHAT_FILTERS.invalidate(old_chat_id, new_chat_id)
+        FILTER_MATCHERS.invalidate(old_chat_id, new_chat_id)
 
         with BUTTON_LOCK:
             chat_buttons = (
@@ -380,6 +400,3 @@ def migrate_chat(old_chat_id, new_chat_id):
             for btn in chat_buttons:
                 btn.chat_id = str(new_chat_id)
             SESSION.commit()
-
-
-__load_chat_filters()
@@ -1,5 +1,9 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Column, String, UnicodeText, distinct, func
 
@@ -17,22 +21,34 @@ class Disable(BASE):
         return "Disabled cmd {} in {}".format(self.command, self.chat_id)
 
 
-Disable.__table__.create(checkfirst=True)
 DISABLE_INSERTION_LOCK = threading.RLock()
 
-DISABLED = {}
+
+def __load_disabled_commands(chat_id):
+    try:
+        return frozenset(
+            command for (command,) in SESSION.query(Disable.command)
+            .filter(Disable.chat_id == chat_id))
+    finally:
+        SESSION.close()
+
+
+DISABLED = ChatCache("disabled", __load_disabled_commands)
 
 
 def disable_command(chat_id, disable):
     with DISABLE_INSERTION_LOCK:
+        commands = DISABLED.get(chat_id)
         disabled = SESSION.query(Disable).get((str(chat_id), disable))
 
         if not disabled:
-            DISABLED.setdefault(str(chat_id), set()).add(disable)
-
             disabled = Disable(str(chat_id), disable)
             SESSION.add(disabled)
             SESSION.commit()
+            DISABLED.set(chat_id, commands | {disable})
+            if not commands:
+                incr_stat("disabled_chats")
+            incr_stat("disabled")
             return True
 
         SESSION.close()
@@ -44,11 +60,13 @@ def enable_command(chat_id, enable):
         disabled = SESSION.query(Disable).get((str(chat_id), enable))
 
         if disabled:
-            if enable in DISABLED.get(str(chat_id)):  # sanity check
-                DISABLED.setdefault(str(chat_id), set()).remove(enable)
-
+            commands = DISABLED.get(chat_id) - {enable}
             SESSION.delete(disabled)
             SESSION.commit()
+            DISABLED.set(chat_id, commands)
+            incr_stat("disabled", -1)
+            if not commands:
+                incr_stat("disabled_chats", -1)
             return True
 
         SESSION.close()
@@ -56,27 +74,39 @@ def enable_command(chat_id, enable):
 
 
 def is_command_disabled(chat_id, cmd):
-    return str(cmd).lower() in DISABLED.get(str(chat_id), set())
+    return str(cmd).lower() in DISABLED.get(chat_id)
 
 
 def get_all_disabled(chat_id):
-    return DISABLED.get(str(chat_id), set())
+    return DISABLED.get(chat_id)
 
 
-def num_chats():
+def __count_chats():
     try:
         return SESSION.query(func.count(distinct(Disable.chat_id))).scalar()
     finally:
         SESSION.close()
 
 
-def num_disabled():
+def __count_disabled():
     try:
         return SESSION.query(Disable).count()
     finally:
         SESSION.close()
 
 
+def num_chats():
+    return get_stat("disabled_chats")
+
+
+def num_disabled():
+    return get_stat("disabled")
+
+
+register_stat("disabled_chats", __count_chats)
+register_stat("disabled", __count_disabled)
+
+
 def migrate_chat(old_chat_id, new_chat_id):
     with DISABLE_INSERTION_LOCK:
         chats = SESSION.query(Disable).filter(
@@ -85,21 +115,5 @@ def migrate_chat(old_chat_id, new_chat_id):
             chat.chat_id = str(new_chat_id)
             SESSION.add(chat)
 
-        if str(old_chat_id) in DISABLED:
-            DISABLED[str(new_chat_id)] = DISABLED.get(str(old_chat_id), set())
-
         SESSION.commit()
-
-
-def __load_disabled_commands():
-    global DISABLED
-    try:
-        all_chats = SESSION.query(Disable).all()
-        for chat in all_chats:
-            DISABLED.setdefault(chat.chat_id, set()).add(chat.command)
-
-    finally:
-        SESSION.close()
-
-
-__load_disabled_commands()
+        DISABLED.invalidate(old_chat_id, new_chat_id)
@@ -1,6 +1,7 @@
 import threading
 
 from SaitamaRobot import dispatcher
+from SaitamaRobot.modules.helper_funcs.cache_snapshot import register_globals
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Boolean, Column, Integer, String, UnicodeText
 from telegram.error import BadRequest, Unauthorized
@@ -89,11 +90,6 @@ class FedSubs(BASE):
 # BansF.__table__.drop()
 # FedSubs.__table__.drop()
 
-Federations.__table__.create(checkfirst=True)
-ChatF.__table__.create(checkfirst=True)
-BansF.__table__.create(checkfirst=True)
-FedsUserSettings.__table__.create(checkfirst=True)
-FedSubs.__table__.create(checkfirst=True)
 
 FEDS_LOCK = threading.RLock()
 CHAT_FEDS_LOCK = threading.RLock()
@@ -776,13 +772,12 @@ def get_subscriber(fed_id):
 def __load_all_feds():
     global FEDERATION_BYOWNER, FEDERATION_BYFEDID, FEDERATION_BYNAME
     try:
+        # built aside and swapped in, a reload never shows half the feds
+        by_owner, by_fed_id, by_name = {}, {}, {}
         feds = SESSION.query(Federations).all()
         for x in feds:  # remove tuple by ( ,)
             # Fed by Owner
-            check = FEDERATION_BYOWNER.get(x.owner_id)
-            if check is None:
-                FEDERATION_BYOWNER[x.owner_id] = []
-            FEDERATION_BYOWNER[str(x.owner_id)] = {
+            by_owner[str(x.owner_id)] = {
                 'fid': str(x.fed_id),
                 'fname': x.fed_name,
                 'frules': x.fed_rules,
@@ -790,10 +785,7 @@ def __load_all_feds():
                 'fusers': str(x.fed_users)
             }
             # Fed By FedId
-            check = FEDERATION_BYFEDID.get(x.fed_id)
-            if check is None:
-                FEDERATION_BYFEDID[x.fed_id] = []
-            FEDERATION_BYFEDID[str(x.fed_id)] = {
+            by_fed_id[str(x.fed_id)] = {
                 'owner': str(x.owner_id),
                 'fname': x.fed_name,
                 'frules': x.fed_rules,
@@ -801,16 +793,16 @@ def __load_all_feds():
                 'fusers': str(x.fed_users)
             }
             # Fed By Name
-            check = FEDERATION_BYNAME.get(x.fed_name)
-            if check is None:
-                FEDERATION_BYNAME[x.fed_name] = []
-            FEDERATION_BYNAME[x.fed_name] = {
+            by_name[x.fed_name] = {
                 'fid': str(x.fed_id),
                 'owner': str(x.owner_id),
                 'frules': x.fed_rules,
                 'flog': x.fed_log,
                 'fusers': str(x.fed_users)
             }
+        FEDERATION_BYOWNER = by_owner
+        FEDERATION_BYFEDID = by_fed_id
+        FEDERATION_BYNAME = by_name
     finally:
         SESSION.close()
 
@@ -819,22 +811,21 @@ def __load_all_feds_chats():
     global FEDERATION_CHATS, FEDERATION_CHATS_BYID
     try:
         qall = SESSION.query(ChatF).all()
-        FEDERATION_CHATS = {}
-        FEDERATION_CHATS_BYID = {}
+        fed_chats = {}
+        fed_chats_by_id = {}
         for x in qall:
             # Federation Chats
-            check = FEDERATION_CHATS.get(x.chat_id)
-            if check is None:
-                FEDERATION_CHATS[x.chat_id] = {}
-            FEDERATION_CHATS[x.chat_id] = {
+            fed_chats[x.chat_id] = {
                 'chat_name': x.chat_name,
                 'fid': x.fed_id
             }
             # Federation Chats By ID
-            check = FEDERATION_CHATS_BYID.get(x.fed_id)
+            check = fed_chats_by_id.get(x.fed_id)
             if check is None:
-                FEDERATION_CHATS_BYID[x.fed_id] = []
-            FEDERATION_CHATS_BYID[x.fed_id].append(x.chat_id)
+                fed_chats_by_id[x.fed_id] = []
+            fed_chats_by_id[x.fed_id].append(x.chat_id)
+        FEDERATION_CHATS = fed_chats
+        FEDERATION_CHATS_BYID = fed_chats_by_id
     finally:
         SESSION.close()
 
@@ -842,25 +833,27 @@ def __load_all_feds_chats():
 def __load_all_feds_banned():
     global FEDERATION_BANNED_USERID, FEDERATION_BANNED_FULL
     try:
-        FEDERATION_BANNED_USERID = {}
-        FEDERATION_BANNED_FULL = {}
+        banned_user_id = {}
+        banned_full = {}
         qall = SESSION.query(BansF).all()
         for x in qall:
-            check = FEDERATION_BANNED_USERID.get(x.fed_id)
+            check = banned_user_id.get(x.fed_id)
             if check is None:
-                FEDERATION_BANNED_USERID[x.fed_id] = []
-            if int(x.user_id) not in FEDERATION_BANNED_USERID[x.fed_id]:
-                FEDERATION_BANNED_USERID[x.fed_id].append(int(x.user_id))
-            check = FEDERATION_BANNED_FULL.get(x.fed_id)
+                banned_user_id[x.fed_id] = []
+            if int(x.user_id) not in banned_user_id[x.fed_id]:
+                banned_user_id[x.fed_id].append(int(x.user_id))
+            check = banned_full.get(x.fed_id)
             if check is None:
-                FEDERATION_BANNED_FULL[x.fed_id] = {}
-            FEDERATION_BANNED_FULL[x.fed_id][x.user_id] = {
+                banned_full[x.fed_id] = {}
+            banned_full[x.fed_id][x.user_id] = {
                 'first_name': x.first_name,
                 'last_name': x.last_name,
                 'user_name': x.user_name,
                 'reason': x.reason,
                 'time': x.time
             }
+        FEDERATION_BANNED_USERID = banned_user_id
+        FEDERATION_BANNED_FULL = banned_full
     finally:
         SESSION.close()
 
@@ -869,8 +862,9 @@ def __load_all_feds_settings():
     global FEDERATION_NOTIFICATION
     try:
         getuser = SESSION.query(FedsUserSettings).all()
-        for x in getuser:
-            FEDERATION_NOTIFICATION[str(x.user_id)] = x.should_report
+        FEDERATION_NOTIFICATION = {
+            str(x.user_id): x.should_report for x in getuser
+        }
     finally:
         SESSION.close()
 
@@ -879,31 +873,44 @@ def __load_feds_subscriber():
     global FEDS_SUBSCRIBER
     global MYFEDS_SUBSCRIBER
     try:
+        feds_subscriber = {}
+        myfeds_subscriber = {}
         feds = SESSION.query(FedSubs.fed_id).distinct().all()
         for (fed_id,) in feds:  # remove tuple by ( ,)
-            FEDS_SUBSCRIBER[fed_id] = []
-            MYFEDS_SUBSCRIBER[fed_id] = []
+            feds_subscriber[fed_id] = []
+            myfeds_subscriber[fed_id] = []
 
         all_fedsubs = SESSION.query(FedSubs).all()
         for x in all_fedsubs:
-            FEDS_SUBSCRIBER[x.fed_id] += [x.fed_subs]
+            feds_subscriber[x.fed_id] += [x.fed_subs]
             try:
-                MYFEDS_SUBSCRIBER[x.fed_subs] += [x.fed_id]
+                myfeds_subscriber[x.fed_subs] += [x.fed_id]
             except KeyError:
                 getsubs = SESSION.query(FedSubs).get((x.fed_id, x.fed_subs))
                 if getsubs:
                     SESSION.delete(getsubs)
                     SESSION.commit()
 
-        FEDS_SUBSCRIBER = {x: set(y) for x, y in FEDS_SUBSCRIBER.items()}
-        MYFEDS_SUBSCRIBER = {x: set(y) for x, y in MYFEDS_SUBSCRIBER.items()}
+        FEDS_SUBSCRIBER = {x: set(y) for x, y in feds_subscriber.items()}
+        MYFEDS_SUBSCRIBER = {x: set(y) for x, y in myfeds_subscriber.items()}
 
     finally:
         SESSION.close()
 
 
-__load_all_feds()
-__load_all_feds_chats()
-__load_all_feds_banned()
-__load_all_feds_settings()
-__load_feds_subscriber()
+def __load_feds():
+    __load_all_feds()
+    __load_all_feds_chats()
+    __load_all_feds_banned()
+
+
+register_globals("feds", __name__,
+                 ("FEDERATION_BYNAME", "FEDERATION_BYOWNER",
+                  "FEDERATION_BYFEDID", "FEDERATION_CHATS",
+                  "FEDERATION_CHATS_BYID", "FEDERATION_BANNED_FULL",
+                  "FEDERATION_BANNED_USERID"), __load_feds, FEDS_LOCK)
+register_globals("fed_settings", __name__, ("FEDERATION_NOTIFICATION",),
+                 __load_all_feds_settings, FEDS_SETTINGS_LOCK)
+register_globals("fed_subscribers", __name__,
+                 ("FEDS_SUBSCRIBER", "MYFEDS_SUBSCRIBER"),
+                 __load_feds_subscriber, FEDS_SUBSCRIBER_LOCK)
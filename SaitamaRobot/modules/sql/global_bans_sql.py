@@ -1,5 +1,6 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.cache_snapshot import register_globals
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Boolean, Column, Integer, String, UnicodeText
 
@@ -39,9 +40,6 @@ class GbanSettings(BASE):
         return "<Gban setting {} ({})>".format(self.chat_id, self.setting)
 
 
-GloballyBannedUsers.__table__.create(checkfirst=True)
-GbanSettings.__table__.create(checkfirst=True)
-
 GBANNED_USERS_LOCK = threading.RLock()
 GBAN_SETTING_LOCK = threading.RLock()
 GBANNED_LIST = set()
@@ -86,6 +84,25 @@ def ungban_user(user_id):
         __load_gbanned_userid_list()
 
 
+def ungban_users(user_ids):
+    user_ids = [int(user_id) for user_id in user_ids]
+    if not user_ids:
+        return
+    with GBANNED_USERS_LOCK:
+        try:
+            SESSION.query(GloballyBannedUsers).filter(
+                GloballyBannedUsers.user_id.in_(user_ids)).delete(
+                    synchronize_session=False)
+            SESSION.commit()
+        finally:
+            SESSION.close()
+        GBANNED_LIST.difference_update(user_ids)
+
+
+def get_gbanned_ids():
+    return sorted(GBANNED_LIST)
+
+
 def is_user_gbanned(user_id):
     return user_id in GBANNED_LIST
 
@@ -170,5 +187,7 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 
 # Create in memory userid to avoid disk access
-__load_gbanned_userid_list()
-__load_gban_stat_list()
+register_globals("gbans", __name__, ("GBANNED_LIST",),
+                 __load_gbanned_userid_list, GBANNED_USERS_LOCK)
+register_globals("gban_settings", __name__, ("GBANSTAT_LIST",),
+                 __load_gban_stat_list, GBAN_SETTING_LOCK)
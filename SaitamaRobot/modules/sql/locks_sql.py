@@ -3,6 +3,7 @@ import threading
 
 from sqlalchemy import Column, String, Boolean
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
 from SaitamaRobot.modules.sql import SESSION, BASE
 
 
@@ -75,13 +76,81 @@ class Restrictions(BASE):
 # For those who faced database error, Just uncomment the
 # line below and run bot for 1 time & remove that line!
 
-Permissions.__table__.create(checkfirst=True)
 # Permissions.__table__.drop()
-Restrictions.__table__.create(checkfirst=True)
 
 PERM_LOCK = threading.RLock()
 RESTR_LOCK = threading.RLock()
 
+# Each chat's locks are cached as a bitmask, one bit per lock type.
+LOCK_BITS = {
+    lock_type: 1 << bit for bit, lock_type in enumerate((
+        "audio",
+        "voice",
+        "contact",
+        "video",
+        "document",
+        "photo",
+        "sticker",
+        "gif",
+        "url",
+        "bots",
+        "forward",
+        "game",
+        "location",
+        "rtl",
+        "button",
+        "egame",
+        "inline",
+    ))
+}
+# restriction name -> Restrictions column
+RESTR_COLUMNS = {
+    "messages": "messages",
+    "media": "media",
+    "other": "other",
+    "previews": "preview",
+}
+RESTR_BITS = {
+    restr_type: 1 << bit for bit, restr_type in enumerate(RESTR_COLUMNS)
+}
+RESTR_BITS["all"] = sum(RESTR_BITS.values())
+
+
+def _perm_mask(perm):
+    mask = 0
+    for lock_type, bit in LOCK_BITS.items():
+        if getattr(perm, lock_type):
+            mask |= bit
+    return mask
+
+
+def _restr_mask(restr):
+    mask = 0
+    for restr_type, column in RESTR_COLUMNS.items():
+        if getattr(restr, column):
+            mask |= RESTR_BITS[restr_type]
+    return mask
+
+
+def __load_chat_locks(chat_id):
+    try:
+        perm = SESSION.query(Permissions).get(chat_id)
+        return _perm_mask(perm) if perm else 0
+    finally:
+        SESSION.close()
+
+
+def __load_chat_restrictions(chat_id):
+    try:
+        restr = SESSION.query(Restrictions).get(chat_id)
+        return _restr_mask(restr) if restr else 0
+    finally:
+        SESSION.close()
+
+
+CHAT_LOCKS = ChatCache("locks", __load_chat_locks)
+CHAT_RESTRICTIONS = ChatCache("restrictions", __load_chat_restrictions)
+
 
 def init_permissions(chat_id, reset=False):
     curr_perm = SESSION.query(Permissions).get(str(chat_id))
@@ -91,6 +160,7 @@ def init_permissions(chat_id, reset=False):
     perm = Permissions(str(chat_id))
     SESSION.add(perm)
     SESSION.commit()
+    CHAT_LOCKS.set(chat_id, 0)
     return perm
 
 
@@ -102,6 +172,7 @@ def init_restrictions(chat_id, reset=False):
     restr = Restrictions(str(chat_id))
     SESSION.add(restr)
     SESSION.commit()
+    CHAT_RESTRICTIONS.set(chat_id, 0)
     return restr
 
 
@@ -148,6 +219,7 @@ def update_lock(chat_id, lock_type, locked):
 
         SESSION.add(curr_perm)
         SESSION.commit()
+        CHAT_LOCKS.set(chat_id, _perm_mask(curr_perm))
 
 
 def update_restriction(chat_id, restr_type, locked):
@@ -171,69 +243,29 @@ def update_restriction(chat_id, restr_type, locked):
             curr_restr.preview = locked
         SESSION.add(curr_restr)
         SESSION.commit()
+        CHAT_RESTRICTIONS.set(chat_id, _restr_mask(curr_restr))
 
 
-def is_locked(chat_id, lock_type):
-    curr_perm = SESSION.query(Permissions).get(str(chat_id))
-    SESSION.close()
+def get_lock_mask(chat_id):
+    return CHAT_LOCKS.get(chat_id)
 
-    if not curr_perm:
-        return False
 
-    elif lock_type == "sticker":
-        return curr_perm.sticker
-    elif lock_type == "photo":
-        return curr_perm.photo
-    elif lock_type == "audio":
-        return curr_perm.audio
-    elif lock_type == "voice":
-        return curr_perm.voice
-    elif lock_type == "contact":
-        return curr_perm.contact
-    elif lock_type == "video":
-        return curr_perm.video
-    elif lock_type == "document":
-        return curr_perm.document
-    elif lock_type == "gif":
-        return curr_perm.gif
-    elif lock_type == "url":
-        return curr_perm.url
-    elif lock_type == "bots":
-        return curr_perm.bots
-    elif lock_type == "forward":
-        return curr_perm.forward
-    elif lock_type == "game":
-        return curr_perm.game
-    elif lock_type == "location":
-        return curr_perm.location
-    elif lock_type == "rtl":
-        return curr_perm.rtl
-    elif lock_type == "button":
-        return curr_perm.button
-    elif lock_type == "egame":
-        return curr_perm.egame
-    elif lock_type == "inline":
-        return curr_perm.inline
+def get_restr_mask(chat_id):
+    return CHAT_RESTRICTIONS.get(chat_id)
 
 
-def is_restr_locked(chat_id, lock_type):
-    curr_restr = SESSION.query(Restrictions).get(str(chat_id))
-    SESSION.close()
-
-    if not curr_restr:
+def is_locked(chat_id, lock_type):
+    bit = LOCK_BITS.get(lock_type)
+    if not bit:
         return False
+    return bool(get_lock_mask(chat_id) & bit)
+
 
-    if lock_type == "messages":
-        return curr_restr.messages
-    elif lock_type == "media":
-        return curr_restr.media
-    elif lock_type == "other":
-        return curr_restr.other
-    elif lock_type == "previews":
-        return curr_restr.preview
-    elif lock_type == "all":
-        return (curr_restr.messages and curr_restr.media and
-                curr_restr.other and curr_restr.preview)
+def is_restr_locked(chat_id, lock_type):
+    bits = RESTR_BITS.get(lock_type)
+    if not bits:
+        return False
+    return get_restr_mask(chat_id) & bits == bits
 
 
 def get_locks(chat_id):
@@ -256,9 +288,11 @@ def migrate_chat(old_chat_id, new_chat_id):
         if perms:
             perms.chat_id = str(new_chat_id)
         SESSION.commit()
+        CHAT_LOCKS.invalidate(old_chat_id, new_chat_id)
 
     with RESTR_LOCK:
         rest = SESSION.query(Restrictions).get(str(old_chat_id))
         if rest:
             rest.chat_id = str(new_chat_id)
         SESSION.commit()
+        CHAT_RESTRICTIONS.invalidate(old_chat_id, new_chat_id)
@@ -1,5 +1,11 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Column, String, distinct, func
 
@@ -14,69 +20,66 @@ class GroupLogs(BASE):
         self.log_channel = str(log_channel)
 
 
-GroupLogs.__table__.create(checkfirst=True)
-
 LOGS_INSERTION_LOCK = threading.RLock()
 
-CHANNELS = {}
+register_section("log_channel", GroupLogs, ("log_channel",))
 
 
 def set_chat_log_channel(chat_id, log_channel):
     with LOGS_INSERTION_LOCK:
         res = SESSION.query(GroupLogs).get(str(chat_id))
+        new = not res
         if res:
             res.log_channel = log_channel
         else:
             res = GroupLogs(chat_id, log_channel)
             SESSION.add(res)
 
-        CHANNELS[str(chat_id)] = log_channel
         SESSION.commit()
+        if new:
+            incr_stat("log_channels")
+        update_profile_section(chat_id, "log_channel", res)
 
 
 def get_chat_log_channel(chat_id):
-    return CHANNELS.get(str(chat_id))
+    setting = get_profile_section(chat_id, "log_channel")
+    if setting:
+        return setting[0]
+    return None
 
 
 def stop_chat_logging(chat_id):
     with LOGS_INSERTION_LOCK:
         res = SESSION.query(GroupLogs).get(str(chat_id))
         if res:
-            if str(chat_id) in CHANNELS:
-                del CHANNELS[str(chat_id)]
-
             log_channel = res.log_channel
             SESSION.delete(res)
             SESSION.commit()
+            update_profile_section(chat_id, "log_channel", None)
+            incr_stat("log_channels", -1)
             return log_channel
 
 
-def num_logchannels():
+def __count_logchannels():
     try:
         return SESSION.query(func.count(distinct(GroupLogs.chat_id))).scalar()
     finally:
         SESSION.close()
 
 
+def num_logchannels():
+    return get_stat("log_channels")
+
+
+register_stat("log_channels", __count_logchannels)
+
+
 def migrate_chat(old_chat_id, new_chat_id):
     with LOGS_INSERTION_LOCK:
         chat = SESSION.query(GroupLogs).get(str(old_chat_id))
         if chat:
             chat.chat_id = str(new_chat_id)
             SESSION.add(chat)
-            if str(old_chat_id) in CHANNELS:
-                CHANNELS[str(new_chat_id)] = CHANNELS.get(str(old_chat_id))
 
         SESSION.commit()
-
-
-def __load_log_channels():
-    global CHANNELS
-    try:
-        all_chats = SESSION.query(GroupLogs).all()
-        CHANNELS = {chat.chat_id: chat.log_channel for chat in all_chats}
-    finally:
-        SESSION.close()
-
-
-__load_log_channels()
+        invalidate_chat_profile(old_chat_id, new_chat_id)
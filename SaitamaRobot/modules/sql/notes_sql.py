@@ -2,9 +2,12 @@
 import threading
 
 from SaitamaRobot.modules.helper_funcs.msg_types import Types
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
 from SaitamaRobot.modules.sql import BASE, SESSION
-from sqlalchemy import (Boolean, Column, Integer, String, UnicodeText, distinct,
-                        func)
+from sqlalchemy import (Boolean, Column, Index, Integer, String, UnicodeText,
+                        distinct, func)
 
 
 class Notes(BASE):
@@ -36,6 +39,9 @@ class Buttons(BASE):
     name = Column(UnicodeText, nullable=False)
     url = Column(UnicodeText, nullable=False)
     same_line = Column(Boolean, default=False)
+    # the primary key starts with id, buttons are looked up by note
+    __table_args__ = (Index("ix_note_urls_chat_id_note_name", "chat_id",
+                            "note_name"),)
 
     def __init__(self, chat_id, note_name, name, url, same_line=False):
         self.chat_id = str(chat_id)
@@ -45,13 +51,15 @@ class Buttons(BASE):
         self.same_line = same_line
 
 
-Notes.__table__.create(checkfirst=True)
-Buttons.__table__.create(checkfirst=True)
-
 NOTES_INSERTION_LOCK = threading.RLock()
 BUTTONS_INSERTION_LOCK = threading.RLock()
 
 
+def __chat_has_notes(chat_id):
+    return SESSION.query(Notes.chat_id).filter(
+        Notes.chat_id == str(chat_id)).first() is not None
+
+
 def add_note_to_db(chat_id,
                    note_name,
                    note_data,
@@ -63,6 +71,7 @@ def add_note_to_db(chat_id,
 
     with NOTES_INSERTION_LOCK:
         prev = SESSION.query(Notes).get((str(chat_id), note_name))
+        new_chat = False
         if prev:
             with BUTTONS_INSERTION_LOCK:
                 prev_buttons = SESSION.query(Buttons).filter(
@@ -71,6 +80,8 @@ def add_note_to_db(chat_id,
                 for btn in prev_buttons:
                     SESSION.delete(btn)
             SESSION.delete(prev)
+        else:
+            new_chat = not __chat_has_notes(chat_id)
         note = Notes(
             str(chat_id),
             note_name,
@@ -79,6 +90,10 @@ def add_note_to_db(chat_id,
             file=file)
         SESSION.add(note)
         SESSION.commit()
+        if not prev:
+            if new_chat:
+                incr_stat("notes_chats")
+            incr_stat("notes")
 
     for b_name, url, same_line in buttons:
         add_note_button_to_db(chat_id, note_name, b_name, url, same_line)
@@ -108,6 +123,10 @@ def rm_note(chat_id, note_name):
 
             SESSION.delete(note)
             SESSION.commit()
+            incr_stat("notes", -1)
+            if not __chat_has_notes(chat_id):
+                incr_stat("notes_chats", -1)
+            SESSION.close()
             return True
 
         else:
@@ -139,20 +158,32 @@ def get_buttons(chat_id, note_name):
         SESSION.close()
 
 
-def num_notes():
+def __count_notes():
     try:
         return SESSION.query(Notes).count()
     finally:
         SESSION.close()
 
 
-def num_chats():
+def __count_chats():
     try:
         return SESSION.query(func.count(distinct(Notes.chat_id))).scalar()
     finally:
         SESSION.close()
 
 
+def num_notes():
+    return get_stat("notes")
+
+
+def num_chats():
+    return get_stat("notes_chats")
+
+
+register_stat("notes", __count_notes)
+register_stat("notes_chats", __count_chats)
+
+
 def migrate_chat(old_chat_id, new_chat_id):
     with NOTES_INSERTION_LOCK:
         chat_notes = SESSION.query(Notes).filter(
@@ -1,6 +1,9 @@
 import threading
 from typing import Union
 
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Boolean, Column, Integer, String
 
@@ -29,21 +32,17 @@ class ReportingChatSettings(BASE):
         return "<Chat report settings ({})>".format(self.chat_id)
 
 
-ReportingUserSettings.__table__.create(checkfirst=True)
-ReportingChatSettings.__table__.create(checkfirst=True)
-
 CHAT_LOCK = threading.RLock()
 USER_LOCK = threading.RLock()
 
+register_section("report", ReportingChatSettings, ("should_report",))
+
 
 def chat_should_report(chat_id: Union[str, int]) -> bool:
-    try:
-        chat_setting = SESSION.query(ReportingChatSettings).get(str(chat_id))
-        if chat_setting:
-            return chat_setting.should_report
-        return False
-    finally:
-        SESSION.close()
+    chat_setting = get_profile_section(chat_id, "report")
+    if chat_setting:
+        return chat_setting[0]
+    return False
 
 
 def user_should_report(user_id: int) -> bool:
@@ -65,6 +64,7 @@ def set_chat_setting(chat_id: Union[int, str], setting: bool):
         chat_setting.should_report = setting
         SESSION.add(chat_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "report", chat_setting)
 
 
 def set_user_setting(user_id: int, setting: bool):
@@ -85,3 +85,4 @@ def migrate_chat(old_chat_id, new_chat_id):
         for note in chat_notes:
             note.chat_id = str(new_chat_id)
         SESSION.commit()
+        invalidate_chat_profile(old_chat_id, new_chat_id)
@@ -21,7 +21,6 @@ class RSS(BASE):
             self.chat_id, self.feed_link, self.old_entry_link)
 
 
-RSS.__table__.create(checkfirst=True)
 INSERTION_LOCK = threading.RLock()
 
 
@@ -1,5 +1,8 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import Column, String, UnicodeText, distinct, func
 
@@ -16,20 +19,21 @@ class Rules(BASE):
         return "<Chat {} rules: {}>".format(self.chat_id, self.rules)
 
 
-Rules.__table__.create(checkfirst=True)
-
 INSERTION_LOCK = threading.RLock()
 
 
 def set_rules(chat_id, rules_text):
     with INSERTION_LOCK:
         rules = SESSION.query(Rules).get(str(chat_id))
-        if not rules:
+        new = not rules
+        if new:
             rules = Rules(str(chat_id))
         rules.rules = rules_text
 
         SESSION.add(rules)
         SESSION.commit()
+        if new:
+            incr_stat("rules_chats")
 
 
 def get_rules(chat_id):
@@ -42,13 +46,20 @@ def get_rules(chat_id):
     return ret
 
 
-def num_chats():
+def __count_chats():
     try:
         return SESSION.query(func.count(distinct(Rules.chat_id))).scalar()
     finally:
         SESSION.close()
 
 
+def num_chats():
+    return get_stat("rules_chats")
+
+
+register_stat("rules_chats", __count_chats)
+
+
 def migrate_chat(old_chat_id, new_chat_id):
     with INSERTION_LOCK:
         chat = SESSION.query(Rules).get(str(old_chat_id))
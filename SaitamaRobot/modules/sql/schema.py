@@ -0,0 +1,133 @@
+"""
+The database schema, brought up to date once instead of every sql module
+probing the catalog for its tables at import.
+
+ensure_schema() imports all the sql modules, so BASE knows every table,
+and compares SCHEMA_VERSION and a fingerprint of the tables, columns and
+indexes with what the schema_version table recorded last time. Only when
+they differ does it, in one transaction, create the missing tables, add
+the columns and indexes existing tables lack, run the MIGRATIONS past the
+recorded version and record the new one. A normal start is one query.
+"""
+import importlib
+import pkgutil
+import time
+from hashlib import sha256
+
+from SaitamaRobot import LOGGER
+from SaitamaRobot.modules import sql
+from SaitamaRobot.modules.sql import BASE
+from sqlalchemy import Column, Integer, String, inspect, literal, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
+
+# bump with each entry added to MIGRATIONS
+SCHEMA_VERSION = 1
+
+# version -> statements upgrading a database past it, for the changes
+# creating tables, columns and indexes from the models doesn't cover
+MIGRATIONS = {}
+
+
+class SchemaVersion(BASE):
+    __tablename__ = "schema_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+
+
+def import_models():
+    for module in pkgutil.iter_modules(sql.__path__):
+        if module.name.endswith("_sql"):
+            importlib.import_module(sql.__name__ + "." + module.name)
+
+
+def fingerprint():
+    parts = [str(SCHEMA_VERSION)]
+    for table in BASE.metadata.sorted_tables:
+        parts.append(table.name)
+        parts += [
+            "{}:{!r}".format(col.name, col.type) for col in table.columns
+        ]
+        parts += sorted(index.name for index in table.indexes)
+    return sha256("\n".join(parts).encode()).hexdigest()
+
+
+def recorded_schema(engine):
+    """(version, fingerprint) of the last update, None on a new database."""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                SchemaVersion.__table__.select().where(
+                    SchemaVersion.id == 1)).first()
+    except SQLAlchemyError:
+        return None  # no schema_version table yet
+    return (row.version, row.fingerprint) if row else None
+
+
+def _add_missing_columns(conn, table, existing):
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = "ALTER TABLE {} ADD COLUMN {} {}".format(
+            table.name, column.name, column.type.compile(conn.dialect))
+        if column.default is not None and column.default.is_scalar:
+            # rows already there get the default the model would have given
+            ddl += " DEFAULT {}".format(
+                literal(column.default.arg, column.type).compile(
+                    dialect=conn.dialect,
+                    compile_kwargs={"literal_binds": True}))
+        LOGGER.info("Adding column %s.%s", table.name, column.name)
+        conn.execute(text(ddl))
+
+
+def _create_missing_indexes(conn, table):
+    # reflection skips expression indexes like lower(username), so the
+    # database checks which ones exist
+    for index in table.indexes:
+        ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+        conn.execute(ddl.replace(" INDEX ", " INDEX IF NOT EXISTS ", 1))
+
+
+def update_schema(engine, recorded):
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        for table in BASE.metadata.sorted_tables:
+            if table.name not in tables:
+                LOGGER.info("Creating table %s", table.name)
+                table.create(conn)  # with its indexes
+                continue
+            _add_missing_columns(
+                conn, table,
+                {column["name"] for column in inspector.get_columns(table.name)})
+            _create_missing_indexes(conn, table)
+
+        # a new database is created up to date, one from before the
+        # schema_version table goes through every migration
+        from_version = recorded[0] if recorded else 0 if tables else None
+        for version in sorted(MIGRATIONS):
+            if from_version is not None and version > from_version:
+                LOGGER.info("Migrating the database to version %d", version)
+                for statement in MIGRATIONS[version]:
+                    conn.execute(text(statement))
+
+        values = {"version": SCHEMA_VERSION, "fingerprint": fingerprint()}
+        if recorded:
+            conn.execute(SchemaVersion.__table__.update().where(
+                SchemaVersion.id == 1).values(**values))
+        else:
+            conn.execute(SchemaVersion.__table__.insert().values(
+                id=1, **values))
+
+
+def ensure_schema():
+    start = time.perf_counter()
+    import_models()
+    engine = BASE.metadata.bind
+    recorded = recorded_schema(engine)
+    if recorded == (SCHEMA_VERSION, fingerprint()):
+        return
+    update_schema(engine, recorded)
+    LOGGER.info("Database schema updated to version %d in %.2fs",
+                SCHEMA_VERSION, time.perf_counter() - start)
@@ -30,9 +30,6 @@ class UserBio(BASE):
         return "<User info %d>" % self.user_id
 
 
-UserInfo.__table__.create(checkfirst=True)
-UserBio.__table__.create(checkfirst=True)
-
 INSERTION_LOCK = threading.RLock()
 
 
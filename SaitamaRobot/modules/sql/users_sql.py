@@ -1,9 +1,19 @@
+import atexit
 import threading
 
-from SaitamaRobot import dispatcher
+from cachetools import LRUCache
+from SaitamaRobot import (LOGGER, USER_FLUSH_BATCH, USER_FLUSH_INTERVAL,
+                          dispatcher)
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.startup import defer
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
 from SaitamaRobot.modules.sql import BASE, SESSION
-from sqlalchemy import (Column, ForeignKey, Integer, String, UnicodeText,
-                        UniqueConstraint, func)
+from sqlalchemy import (Column, ForeignKey, Index, Integer, String,
+                        UnicodeText, UniqueConstraint, func, literal_column)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
 
 
 class Users(BASE):
@@ -19,6 +29,10 @@ class Users(BASE):
         return "<User {} ({})>".format(self.username, self.user_id)
 
 
+# @username lookups are case insensitive
+Index("ix_users_username_lower", func.lower(Users.username))
+
+
 class Chats(BASE):
     __tablename__ = "chats"
     chat_id = Column(String(14), primary_key=True)
@@ -43,7 +57,8 @@ class ChatMembers(BASE):
     user = Column(
         Integer,
         ForeignKey("users.user_id", onupdate="CASCADE", ondelete="CASCADE"),
-        nullable=False)
+        nullable=False,
+        index=True)
     __table_args__ = (UniqueConstraint('chat', 'user',
                                        name='_chat_members_uc'),)
 
@@ -57,11 +72,60 @@ class ChatMembers(BASE):
             self.chat.chat_id)
 
 
-Users.__table__.create(checkfirst=True)
-Chats.__table__.create(checkfirst=True)
-ChatMembers.__table__.create(checkfirst=True)
-
 INSERTION_LOCK = threading.RLock()
+BUFFER_LOCK = threading.Lock()
+FLUSH_EVENT = threading.Event()
+
+# update_user only buffers changes, the flusher thread writes them in bulk
+# every USER_FLUSH_INTERVAL seconds, or sooner once USER_FLUSH_BATCH rows
+# are waiting. The KNOWN_* caches hold what we already wrote or queued, so
+# repeated sightings of an unchanged user/chat/member cost no db work.
+KNOWN_USERS = LRUCache(maxsize=100000)
+KNOWN_CHATS = LRUCache(maxsize=20000)
+KNOWN_MEMBERS = LRUCache(maxsize=20000)  # chat_id -> set of user_ids
+
+PENDING_USERS = {}
+PENDING_CHATS = {}
+PENDING_MEMBERS = set()
+
+_MISSING = object()
+
+
+def __load_username(username):
+    try:
+        rows = SESSION.query(Users.user_id).filter(
+            func.lower(Users.username) == username).all()
+    finally:
+        SESSION.close()
+    with BUFFER_LOCK:
+        # seen but not flushed yet
+        pending = {
+            user_id for user_id, name in PENDING_USERS.items()
+            if name and name.lower() == username
+        }
+    return frozenset(user_id for user_id, in rows) | pending
+
+
+# lower(username) -> user_ids, kept current by update_user
+USERNAMES = ChatCache(
+    "usernames", __load_username, maxsize=100000, snapshot=False)
+
+
+def _rename_user(user_id, old, new):
+    # under BUFFER_LOCK. A name that isn't cached is invalidated anyway, in
+    # case it's being loaded right now
+    if old and old is not _MISSING:
+        ids = USERNAMES.peek(old.lower())
+        if ids is None:
+            USERNAMES.invalidate(old.lower())
+        elif user_id in ids:
+            USERNAMES.set(old.lower(), ids - {user_id})
+    if new:
+        ids = USERNAMES.peek(new.lower())
+        if ids is None:
+            USERNAMES.invalidate(new.lower())
+        elif user_id not in ids:
+            USERNAMES.set(new.lower(), ids | {user_id})
 
 
 def ensure_bot_in_db():
@@ -72,44 +136,142 @@ def ensure_bot_in_db():
 
 
 def update_user(user_id, username, chat_id=None, chat_name=None):
-    with INSERTION_LOCK:
-        user = SESSION.query(Users).get(user_id)
-        if not user:
-            user = Users(user_id, username)
-            SESSION.add(user)
-            SESSION.flush()
+    with BUFFER_LOCK:
+        known = KNOWN_USERS.get(user_id, _MISSING)
+        if known != username:
+            KNOWN_USERS[user_id] = username
+            PENDING_USERS[user_id] = username
+            _rename_user(user_id, known, username)
+
+        if chat_id and chat_name:
+            chat_id = str(chat_id)
+            if KNOWN_CHATS.get(chat_id) != chat_name:
+                KNOWN_CHATS[chat_id] = chat_name
+                PENDING_CHATS[chat_id] = chat_name
+
+            members = KNOWN_MEMBERS.get(chat_id)
+            if members is None:
+                members = KNOWN_MEMBERS[chat_id] = set()
+            if user_id not in members:
+                members.add(user_id)
+                PENDING_MEMBERS.add((chat_id, user_id))
+
+        pending = len(PENDING_USERS) + len(PENDING_CHATS) + len(
+            PENDING_MEMBERS)
+
+    if pending >= USER_FLUSH_BATCH:
+        FLUSH_EVENT.set()
+
+
+def _chunks(rows):
+    rows = list(rows)
+    for i in range(0, len(rows), USER_FLUSH_BATCH):
+        yield rows[i:i + USER_FLUSH_BATCH]
+
+
+def _upsert(model, rows, keys, update_cols):
+    """Returns how many of the rows were new."""
+    inserted = 0
+    if BASE.metadata.bind.dialect.name == "postgresql":
+        for batch in _chunks(rows):
+            stmt = postgresql.insert(model.__table__).values(batch)
+            if update_cols:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=keys,
+                    set_={col: stmt.excluded[col] for col in update_cols})
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+            # xmax is only 0 for freshly inserted rows
+            result = SESSION.execute(
+                stmt.returning(literal_column("xmax = 0")))
+            inserted += sum(1 for (new,) in result if new)
+        return inserted
+
+    # no upsert on other backends, fall back to one lookup per row
+    for row in rows:
+        curr = SESSION.query(model).filter_by(
+            **{key: row[key] for key in keys}).first()
+        if not curr:
+            SESSION.add(model(**row))
+            inserted += 1
         else:
-            user.username = username
+            for col in update_cols:
+                setattr(curr, col, row[col])
+    SESSION.flush()
+    return inserted
 
-        if not chat_id or not chat_name:
-            SESSION.commit()
-            return
 
-        chat = SESSION.query(Chats).get(str(chat_id))
-        if not chat:
-            chat = Chats(str(chat_id), chat_name)
-            SESSION.add(chat)
-            SESSION.flush()
+def flush_users():
+    with BUFFER_LOCK:
+        users = dict(PENDING_USERS)
+        chats = dict(PENDING_CHATS)
+        members = set(PENDING_MEMBERS)
+        PENDING_USERS.clear()
+        PENDING_CHATS.clear()
+        PENDING_MEMBERS.clear()
 
-        else:
-            chat.chat_name = chat_name
+    if not users and not chats and not members:
+        return
 
-        member = SESSION.query(ChatMembers).filter(
-            ChatMembers.chat == chat.chat_id,
-            ChatMembers.user == user.user_id).first()
-        if not member:
-            chat_member = ChatMembers(chat.chat_id, user.user_id)
-            SESSION.add(chat_member)
+    with INSERTION_LOCK:
+        try:
+            # users and chats first, chat_members references both
+            new_users = _upsert(Users, [{
+                "user_id": user_id,
+                "username": username
+            } for user_id, username in users.items()], ["user_id"],
+                    ["username"])
+            new_chats = _upsert(Chats, [{
+                "chat_id": chat_id,
+                "chat_name": chat_name
+            } for chat_id, chat_name in chats.items()], ["chat_id"],
+                    ["chat_name"])
+            _upsert(ChatMembers, [{
+                "chat": chat_id,
+                "user": user_id
+            } for chat_id, user_id in members], ["chat", "user"], [])
+            SESSION.commit()
+            incr_stat("users", new_users)
+            incr_stat("chats", new_chats)
+        except SQLAlchemyError:
+            SESSION.rollback()
+            LOGGER.exception(
+                "Failed to write %d users, %d chats and %d chat members",
+                len(users), len(chats), len(members))
+            # forget them so the next sighting queues them again
+            with BUFFER_LOCK:
+                for user_id in users:
+                    KNOWN_USERS.pop(user_id, None)
+                for chat_id in chats:
+                    KNOWN_CHATS.pop(chat_id, None)
+                for chat_id, user_id in members:
+                    KNOWN_MEMBERS.get(chat_id, set()).discard(user_id)
+        finally:
+            SESSION.close()
 
-        SESSION.commit()
+
+def __flush_loop():
+    while True:
+        FLUSH_EVENT.wait(USER_FLUSH_INTERVAL)
+        FLUSH_EVENT.clear()
+        try:
+            flush_users()
+        except Exception:
+            LOGGER.exception("Error in the users flusher")
 
 
 def get_userid_by_name(username):
-    try:
-        return SESSION.query(Users).filter(
-            func.lower(Users.username) == username.lower()).all()
-    finally:
-        SESSION.close()
+    """Ids of the users last seen with this username, any case."""
+    username = username.lower()
+    user_ids = USERNAMES.get(username)
+    with BUFFER_LOCK:
+        known = [(user_id, KNOWN_USERS.get(user_id, _MISSING))
+                 for user_id in user_ids]
+    # drop users renamed while we didn't know their old name
+    return [
+        user_id for user_id, name in known
+        if name is _MISSING or (name or "").lower() == username
+    ]
 
 
 def get_name_by_userid(user_id):
@@ -141,6 +303,32 @@ def get_all_users():
         SESSION.close()
 
 
+def get_chats_page(after=None, limit=500):
+    try:
+        query = SESSION.query(Chats.chat_id)
+        if after is not None:
+            query = query.filter(Chats.chat_id > str(after))
+        return [
+            chat_id
+            for (chat_id,) in query.order_by(Chats.chat_id).limit(limit).all()
+        ]
+    finally:
+        SESSION.close()
+
+
+def get_users_page(after=None, limit=500):
+    try:
+        query = SESSION.query(Users.user_id)
+        if after is not None:
+            query = query.filter(Users.user_id > int(after))
+        return [
+            user_id
+            for (user_id,) in query.order_by(Users.user_id).limit(limit).all()
+        ]
+    finally:
+        SESSION.close()
+
+
 def get_user_num_chats(user_id):
     try:
         return SESSION.query(ChatMembers).filter(
@@ -158,21 +346,37 @@ def get_user_com_chats(user_id):
         SESSION.close()
 
 
-def num_chats():
+def __count_chats():
     try:
         return SESSION.query(Chats).count()
     finally:
         SESSION.close()
 
 
-def num_users():
+def __count_users():
     try:
         return SESSION.query(Users).count()
     finally:
         SESSION.close()
 
 
+def num_chats():
+    return get_stat("chats")
+
+
+def num_users():
+    return get_stat("users")
+
+
+register_stat("chats", __count_chats)
+register_stat("users", __count_users)
+
+
 def migrate_chat(old_chat_id, new_chat_id):
+    flush_users()
+    with BUFFER_LOCK:
+        KNOWN_CHATS.pop(str(old_chat_id), None)
+        KNOWN_MEMBERS.pop(str(old_chat_id), None)
     with INSERTION_LOCK:
         chat = SESSION.query(Chats).get(str(old_chat_id))
         if chat:
@@ -186,15 +390,22 @@ def migrate_chat(old_chat_id, new_chat_id):
         SESSION.commit()
 
 
-ensure_bot_in_db()
+defer("ensure_bot_in_db", ensure_bot_in_db)
 
 
 def del_user(user_id):
+    flush_users()
+    with BUFFER_LOCK:
+        KNOWN_USERS.pop(user_id, None)
+        for members in KNOWN_MEMBERS.values():
+            members.discard(user_id)
+    USERNAMES.clear()
     with INSERTION_LOCK:
         curr = SESSION.query(Users).get(user_id)
         if curr:
             SESSION.delete(curr)
             SESSION.commit()
+            incr_stat("users", -1)
             return True
 
         ChatMembers.query.filter(ChatMembers.user == user_id).delete()
@@ -204,10 +415,40 @@ def del_user(user_id):
 
 
 def rem_chat(chat_id):
+    flush_users()
+    with BUFFER_LOCK:
+        KNOWN_CHATS.pop(str(chat_id), None)
+        KNOWN_MEMBERS.pop(str(chat_id), None)
     with INSERTION_LOCK:
         chat = SESSION.query(Chats).get(str(chat_id))
         if chat:
             SESSION.delete(chat)
             SESSION.commit()
+            incr_stat("chats", -1)
         else:
             SESSION.close()
+
+
+def rem_chats(chat_ids):
+    chat_ids = [str(chat_id) for chat_id in chat_ids]
+    if not chat_ids:
+        return
+    flush_users()
+    with BUFFER_LOCK:
+        for chat_id in chat_ids:
+            KNOWN_CHATS.pop(chat_id, None)
+            KNOWN_MEMBERS.pop(chat_id, None)
+    with INSERTION_LOCK:
+        try:
+            # chat_members go with them through the foreign key cascade
+            removed = SESSION.query(Chats).filter(
+                Chats.chat_id.in_(chat_ids)).delete(synchronize_session=False)
+            SESSION.commit()
+            incr_stat("chats", -removed)
+        finally:
+            SESSION.close()
+
+
+threading.Thread(
+    target=__flush_loop, name="users_sql_flusher", daemon=True).start()
+atexit.register(flush_users)
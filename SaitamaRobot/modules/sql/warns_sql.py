@@ -1,8 +1,16 @@
 import threading
 
+from SaitamaRobot.modules.helper_funcs.chat_cache import ChatCache
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              incr_stat,
+                                                              register_stat)
+from SaitamaRobot.modules.helper_funcs.trigger_matcher import TriggerMatcherCache
 from SaitamaRobot.modules.sql import BASE, SESSION
-from sqlalchemy import (Boolean, Column, Integer, String, UnicodeText, distinct,
-                        func)
+from sqlalchemy import (JSON, Boolean, Column, Integer, String, UnicodeText,
+                        distinct, func)
 from sqlalchemy.dialects import postgresql
 
 
@@ -10,9 +18,10 @@ class Warns(BASE):
     __tablename__ = "warns"
 
     user_id = Column(Integer, primary_key=True)
-    chat_id = Column(String(14), primary_key=True)
+    chat_id = Column(String(14), primary_key=True, index=True)
     num_warns = Column(Integer, default=0)
-    reasons = Column(postgresql.ARRAY(UnicodeText))
+    reasons = Column(
+        postgresql.ARRAY(UnicodeText).with_variant(JSON, "sqlite"))
 
     def __init__(self, user_id, chat_id):
         self.user_id = user_id
@@ -61,21 +70,20 @@ class WarnSettings(BASE):
                                                     self.warn_limit)
 
 
-Warns.__table__.create(checkfirst=True)
-WarnFilters.__table__.create(checkfirst=True)
-WarnSettings.__table__.create(checkfirst=True)
-
 WARN_INSERTION_LOCK = threading.RLock()
 WARN_FILTER_INSERTION_LOCK = threading.RLock()
 WARN_SETTINGS_LOCK = threading.RLock()
 
-WARN_FILTERS = {}
+register_section("warn_settings", WarnSettings, ("warn_limit", "soft_warn"))
 
 
 def warn_user(user_id, chat_id, reason=None):
     with WARN_INSERTION_LOCK:
         warned_user = SESSION.query(Warns).get((user_id, str(chat_id)))
+        new_chat = False
         if not warned_user:
+            new_chat = not SESSION.query(Warns.chat_id).filter(
+                Warns.chat_id == str(chat_id)).first()
             warned_user = Warns(user_id, str(chat_id))
 
         warned_user.num_warns += 1
@@ -89,6 +97,9 @@ def warn_user(user_id, chat_id, reason=None):
 
         SESSION.add(warned_user)
         SESSION.commit()
+        if new_chat:
+            incr_stat("warn_chats")
+        incr_stat("warns")
 
         return num, reasons
 
@@ -103,6 +114,7 @@ def remove_warn(user_id, chat_id):
             warned_user.reasons = warned_user.reasons[:-1]
             SESSION.add(warned_user)
             SESSION.commit()
+            incr_stat("warns", -1)
             removed = True
 
         SESSION.close()
@@ -113,11 +125,13 @@ def reset_warns(user_id, chat_id):
     with WARN_INSERTION_LOCK:
         warned_user = SESSION.query(Warns).get((user_id, str(chat_id)))
         if warned_user:
+            removed = warned_user.num_warns
             warned_user.num_warns = 0
             warned_user.reasons = []
 
             SESSION.add(warned_user)
             SESSION.commit()
+            incr_stat("warns", -removed)
         SESSION.close()
 
 
@@ -133,35 +147,67 @@ def get_warns(user_id, chat_id):
         SESSION.close()
 
 
+def __sort_triggers(keywords):
+    return tuple(sorted(set(keywords), key=lambda x: (-len(x), x)))
+
+
+def __load_chat_warn_filters(chat_id):
+    try:
+        return __sort_triggers(
+            keyword for (keyword,) in SESSION.query(WarnFilters.keyword)
+            .filter(WarnFilters.chat_id == chat_id))
+    finally:
+        SESSION.close()
+
+
+WARN_FILTERS = ChatCache("warn_filters", __load_chat_warn_filters)
+
+
 def add_warn_filter(chat_id, keyword, reply):
     with WARN_FILTER_INSERTION_LOCK:
+        triggers = WARN_FILTERS.get(chat_id)
         warn_filt = WarnFilters(str(chat_id), keyword, reply)
 
-        if keyword not in WARN_FILTERS.get(str(chat_id), []):
-            WARN_FILTERS[str(chat_id)] = sorted(
-                WARN_FILTERS.get(str(chat_id), []) + [keyword],
-                key=lambda x: (-len(x), x))
-
         SESSION.merge(warn_filt)  # merge to avoid duplicate key issues
         SESSION.commit()
 
+        if keyword not in triggers:
+            if not triggers:
+                incr_stat("warn_filter_chats")
+            incr_stat("warn_filters")
+            WARN_FILTERS.set(chat_id, __sort_triggers(triggers + (keyword,)))
+            WARN_FILTER_MATCHERS.invalidate(chat_id)
+
 
 def remove_warn_filter(chat_id, keyword):
     with WARN_FILTER_INSERTION_LOCK:
         warn_filt = SESSION.query(WarnFilters).get((str(chat_id), keyword))
         if warn_filt:
-            if keyword in WARN_FILTERS.get(str(chat_id), []):  # sanity check
-                WARN_FILTERS.get(str(chat_id), []).remove(keyword)
-
+            triggers = tuple(
+                trigger for trigger in WARN_FILTERS.get(chat_id)
+                if trigger != keyword)
             SESSION.delete(warn_filt)
             SESSION.commit()
+            WARN_FILTERS.set(chat_id, triggers)
+            WARN_FILTER_MATCHERS.invalidate(chat_id)
+            incr_stat("warn_filters", -1)
+            if not triggers:
+                incr_stat("warn_filter_chats", -1)
             return True
         SESSION.close()
         return False
 
 
 def get_chat_warn_triggers(chat_id):
-    return WARN_FILTERS.get(str(chat_id), set())
+    return WARN_FILTERS.get(chat_id)
+
+
+WARN_FILTER_MATCHERS = TriggerMatcherCache("warn_filter_matchers",
+                                           get_chat_warn_triggers)
+
+
+def get_chat_warn_matcher(chat_id):
+    return WARN_FILTER_MATCHERS.get(chat_id)
 
 
 def get_chat_warn_filters(chat_id):
@@ -189,6 +235,7 @@ def set_warn_limit(chat_id, warn_limit):
 
         SESSION.add(curr_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "warn_settings", curr_setting)
 
 
 def set_warn_strength(chat_id, soft_warn):
@@ -201,76 +248,75 @@ def set_warn_strength(chat_id, soft_warn):
 
         SESSION.add(curr_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "warn_settings", curr_setting)
 
 
 def get_warn_setting(chat_id):
-    try:
-        setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if setting:
-            return setting.warn_limit, setting.soft_warn
-        else:
-            return 3, False
-
-    finally:
-        SESSION.close()
+    setting = get_profile_section(chat_id, "warn_settings")
+    if setting:
+        return setting
+    else:
+        return 3, False
 
 
-def num_warns():
+def __count_warns():
     try:
         return SESSION.query(func.sum(Warns.num_warns)).scalar() or 0
     finally:
         SESSION.close()
 
 
-def num_warn_chats():
+def __count_warn_chats():
     try:
         return SESSION.query(func.count(distinct(Warns.chat_id))).scalar()
     finally:
         SESSION.close()
 
 
-def num_warn_filters():
+def __count_warn_filters():
     try:
         return SESSION.query(WarnFilters).count()
     finally:
         SESSION.close()
 
 
-def num_warn_chat_filters(chat_id):
+def __count_warn_filter_chats():
     try:
-        return SESSION.query(WarnFilters.chat_id).filter(
-            WarnFilters.chat_id == str(chat_id)).count()
+        return SESSION.query(func.count(distinct(WarnFilters.chat_id))).scalar()
     finally:
         SESSION.close()
 
 
-def num_warn_filter_chats():
-    try:
-        return SESSION.query(func.count(distinct(WarnFilters.chat_id))).scalar()
-    finally:
-        SESSION.close()
+def num_warns():
+    return get_stat("warns")
 
 
-def __load_chat_warn_filters():
-    global WARN_FILTERS
-    try:
-        chats = SESSION.query(WarnFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            WARN_FILTERS[chat_id] = []
+def num_warn_chats():
+    return get_stat("warn_chats")
 
-        all_filters = SESSION.query(WarnFilters).all()
-        for x in all_filters:
-            WARN_FILTERS[x.chat_id] += [x.keyword]
 
-        WARN_FILTERS = {
-            x: sorted(set(y), key=lambda i: (-len(i), i))
-            for x, y in WARN_FILTERS.items()
-        }
+def num_warn_filters():
+    return get_stat("warn_filters")
 
+
+def num_warn_chat_filters(chat_id):
+    try:
+        return SESSION.query(WarnFilters.chat_id).filter(
+            WarnFilters.chat_id == str(chat_id)).count()
     finally:
         SESSION.close()
 
 
+def num_warn_filter_chats():
+    return get_stat("warn_filter_chats")
+
+
+register_stat("warns", __count_warns)
+register_stat("warn_chats", __count_warn_chats)
+register_stat("warn_filters", __count_warn_filters)
+register_stat("warn_filter_chats", __count_warn_filter_chats)
+
+
 def migrate_chat(old_chat_id, new_chat_id):
     with WARN_INSERTION_LOCK:
         chat_notes = SESSION.query(Warns).filter(
@@ -285,10 +331,8 @@ def migrate_chat(old_chat_id, new_chat_id):
         for filt in chat_filters:
             filt.chat_id = str(new_chat_id)
         SESSION.commit()
-        old_warn_filt = WARN_FILTERS.get(str(old_chat_id))
-        if old_warn_filt is not None:
-            WARN_FILTERS[str(new_chat_id)] = old_warn_filt
-            del WARN_FILTERS[str(old_chat_id)]
+        WARN_FILTERS.invalidate(old_chat_id, new_chat_id)
+        WARN_FILTER_MATCHERS.invalidate(old_chat_id, new_chat_id)
 
     with WARN_SETTINGS_LOCK:
         chat_settings = SESSION.query(WarnSettings).filter(
@@ -296,6 +340,4 @@ def migrate_chat(old_chat_id, new_chat_id):
         for setting in chat_settings:
             setting.chat_id = str(new_chat_id)
         SESSION.commit()
-
-
-__load_chat_warn_filters()
+        invalidate_chat_profile(old_chat_id, new_chat_id)
@@ -2,6 +2,9 @@ import random
 import threading
 from typing import Union
 
+from SaitamaRobot.modules.helper_funcs.chat_profile import (
+    get_profile_section, invalidate_chat_profile, register_section,
+    update_profile_section)
 from SaitamaRobot.modules.helper_funcs.msg_types import Types
 from SaitamaRobot.modules.sql import BASE, SESSION
 from sqlalchemy import (BigInteger, Boolean, Column, Integer, String,
@@ -128,28 +131,25 @@ class CleanServiceSetting(BASE):
         return "<Chat used clean service ({})>".format(self.chat_id)
 
 
-Welcome.__table__.create(checkfirst=True)
-WelcomeButtons.__table__.create(checkfirst=True)
-GoodbyeButtons.__table__.create(checkfirst=True)
-WelcomeMute.__table__.create(checkfirst=True)
-WelcomeMuteUsers.__table__.create(checkfirst=True)
-CleanServiceSetting.__table__.create(checkfirst=True)
-
 INSERTION_LOCK = threading.RLock()
 WELC_BTN_LOCK = threading.RLock()
 LEAVE_BTN_LOCK = threading.RLock()
 WM_LOCK = threading.RLock()
 CS_LOCK = threading.RLock()
 
+register_section("welcome", Welcome,
+                 ("should_welcome", "custom_welcome", "custom_content",
+                  "welcome_type", "should_goodbye", "custom_leave",
+                  "leave_type", "clean_welcome"))
+register_section("welcome_mutes", WelcomeMute, ("welcomemutes",))
+register_section("clean_service", CleanServiceSetting, ("clean_service",))
+
 
 def welcome_mutes(chat_id):
-    try:
-        welcomemutes = SESSION.query(WelcomeMute).get(str(chat_id))
-        if welcomemutes:
-            return welcomemutes.welcomemutes
-        return False
-    finally:
-        SESSION.close()
+    welcomemutes = get_profile_section(chat_id, "welcome_mutes")
+    if welcomemutes:
+        return welcomemutes[0]
+    return False
 
 
 def set_welcome_mutes(chat_id, welcomemutes):
@@ -160,6 +160,7 @@ def set_welcome_mutes(chat_id, welcomemutes):
         welcome_m = WelcomeMute(str(chat_id), welcomemutes)
         SESSION.add(welcome_m)
         SESSION.commit()
+        update_profile_section(chat_id, "welcome_mutes", welcome_m)
 
 
 def set_human_checks(user_id, chat_id):
@@ -191,20 +192,14 @@ def get_human_checks(user_id, chat_id):
 
 
 def get_welc_mutes_pref(chat_id):
-    welcomemutes = SESSION.query(WelcomeMute).get(str(chat_id))
-    SESSION.close()
-
-    if welcomemutes:
-        return welcomemutes.welcomemutes
-
-    return False
+    return welcome_mutes(chat_id)
 
 
 def get_welc_pref(chat_id):
-    welc = SESSION.query(Welcome).get(str(chat_id))
-    SESSION.close()
+    welc = get_profile_section(chat_id, "welcome")
     if welc:
-        return welc.should_welcome, welc.custom_welcome, welc.custom_content, welc.welcome_type
+        should_welcome, custom_welcome, custom_content, welcome_type = welc[:4]
+        return should_welcome, custom_welcome, custom_content, welcome_type
 
     else:
         # Welcome by default.
@@ -212,10 +207,10 @@ def get_welc_pref(chat_id):
 
 
 def get_gdbye_pref(chat_id):
-    welc = SESSION.query(Welcome).get(str(chat_id))
-    SESSION.close()
+    welc = get_profile_section(chat_id, "welcome")
     if welc:
-        return welc.should_goodbye, welc.custom_leave, welc.leave_type
+        should_goodbye, custom_leave, leave_type = welc[4:7]
+        return should_goodbye, custom_leave, leave_type
     else:
         # Welcome by default.
         return True, DEFAULT_GOODBYE, Types.TEXT
@@ -231,14 +226,14 @@ def set_clean_welcome(chat_id, clean_welcome):
 
         SESSION.add(curr)
         SESSION.commit()
+        update_profile_section(chat_id, "welcome", curr)
 
 
 def get_clean_pref(chat_id):
-    welc = SESSION.query(Welcome).get(str(chat_id))
-    SESSION.close()
+    welc = get_profile_section(chat_id, "welcome")
 
     if welc:
-        return welc.clean_welcome
+        return welc[7]
 
     return False
 
@@ -253,6 +248,7 @@ def set_welc_preference(chat_id, should_welcome):
 
         SESSION.add(curr)
         SESSION.commit()
+        update_profile_section(chat_id, "welcome", curr)
 
 
 def set_gdbye_preference(chat_id, should_goodbye):
@@ -265,6 +261,7 @@ def set_gdbye_preference(chat_id, should_goodbye):
 
         SESSION.add(curr)
         SESSION.commit()
+        update_profile_section(chat_id, "welcome", curr)
 
 
 def set_custom_welcome(chat_id,
@@ -302,15 +299,15 @@ def set_custom_welcome(chat_id,
                 SESSION.add(button)
 
         SESSION.commit()
+        update_profile_section(chat_id, "welcome", welcome_settings)
 
 
 def get_custom_welcome(chat_id):
-    welcome_settings = SESSION.query(Welcome).get(str(chat_id))
+    welcome_settings = get_profile_section(chat_id, "welcome")
     ret = DEFAULT_WELCOME
-    if welcome_settings and welcome_settings.custom_welcome:
-        ret = welcome_settings.custom_welcome
+    if welcome_settings and welcome_settings[1]:
+        ret = welcome_settings[1]
 
-    SESSION.close()
     return ret
 
 
@@ -344,15 +341,15 @@ def set_custom_gdbye(chat_id, custom_goodbye, goodbye_type, buttons=None):
                 SESSION.add(button)
 
         SESSION.commit()
+        update_profile_section(chat_id, "welcome", welcome_settings)
 
 
 def get_custom_gdbye(chat_id):
-    welcome_settings = SESSION.query(Welcome).get(str(chat_id))
+    welcome_settings = get_profile_section(chat_id, "welcome")
     ret = DEFAULT_GOODBYE
-    if welcome_settings and welcome_settings.custom_leave:
-        ret = welcome_settings.custom_leave
+    if welcome_settings and welcome_settings[5]:
+        ret = welcome_settings[5]
 
-    SESSION.close()
     return ret
 
 
@@ -375,13 +372,10 @@ def get_gdbye_buttons(chat_id):
 
 
 def clean_service(chat_id: Union[str, int]) -> bool:
-    try:
-        chat_setting = SESSION.query(CleanServiceSetting).get(str(chat_id))
-        if chat_setting:
-            return chat_setting.clean_service
-        return False
-    finally:
-        SESSION.close()
+    chat_setting = get_profile_section(chat_id, "clean_service")
+    if chat_setting:
+        return chat_setting[0]
+    return False
 
 
 def set_clean_service(chat_id: Union[int, str], setting: bool):
@@ -393,6 +387,7 @@ def set_clean_service(chat_id: Union[int, str], setting: bool):
         chat_setting.clean_service = setting
         SESSION.add(chat_setting)
         SESSION.commit()
+        update_profile_section(chat_id, "clean_service", chat_setting)
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -414,3 +409,4 @@ def migrate_chat(old_chat_id, new_chat_id):
                 btn.chat_id = str(new_chat_id)
 
         SESSION.commit()
+        invalidate_chat_profile(old_chat_id, new_chat_id)
@@ -15,7 +15,7 @@ from telegram.error import BadRequest
 from telegram.utils.helpers import escape_markdown, mention_html
 
 from SaitamaRobot import (DEV_USERS, OWNER_ID, DRAGONS, DEMONS, TIGERS, WOLVES,
-                          INFOPIC, dispatcher, sw)
+                          INFOPIC, dispatcher)
 from SaitamaRobot.__main__ import STATS, TOKEN, USER_INFO
 import SaitamaRobot.modules.sql.userinfo_sql as sql
 from SaitamaRobot.modules.disable import DisableAbleCommandHandler
@@ -24,6 +24,9 @@ from SaitamaRobot.modules.sql.afk_sql import is_afk, check_afk_status
 from SaitamaRobot.modules.sql.users_sql import get_user_num_chats
 from SaitamaRobot.modules.helper_funcs.chat_status import sudo_plus
 from SaitamaRobot.modules.helper_funcs.extraction import extract_user
+from SaitamaRobot.modules.helper_funcs.spamwatch_cache import get_sw_ban
+from SaitamaRobot.modules.helper_funcs.stats_registry import (get_stat,
+                                                              register_stat)
 from SaitamaRobot import telethn as SaitamaTelethonClient, TIGERS, DRAGONS, DEMONS
 
 
@@ -257,16 +260,11 @@ def info(update: Update, context: CallbackContext):
         userhp = hpmanager(user)
         text += f"\n\n<b>HP xalı:</b> <code>{userhp['earnedhp']}/{userhp['totalhp']}</code>\n[<i>{make_bar(int(userhp['percentage']))} </i>{userhp['percentage']}%]"
 
-    try:
-        spamwtc = sw.get_ban(int(user.id))
-        if spamwtc:
-            text += "\n\n<b>Bu istifadəçi SpamWatch'landı!</b>"
-            text += f"\nSəbəb: <pre>{spamwtc.reason}</pre>"
-            text += "\nBuraya müraciət edin @SpamWatchSupport"
-        else:
-            pass
-    except:
-        pass  # don't crash if api is down somehow...
+    spamwtc = get_sw_ban(user.id)
+    if spamwtc:
+        text += "\n\n<b>Bu istifadəçi SpamWatch'landı!</b>"
+        text += f"\nSəbəb: <pre>{spamwtc.reason}</pre>"
+        text += "\nBuraya müraciət edin @SpamWatchSupport"
 
     disaster_level_present = False
 
@@ -398,12 +396,20 @@ def set_about_me(update: Update, context: CallbackContext):
                     MAX_MESSAGE_LENGTH // 4, len(info[1])))
 
 
+def __neofetch():
+    process = subprocess.Popen(
+        "neofetch --stdout", shell=True, text=True, stdout=subprocess.PIPE)
+    return process.communicate()[0]
+
+
+# refreshed in the background with the counters, never while /stats waits
+register_stat("system", __neofetch)
+
+
 @run_async
 @sudo_plus
 def stats(update: Update, context: CallbackContext):
-    process = subprocess.Popen(
-        "neofetch --stdout", shell=True, text=True, stdout=subprocess.PIPE)
-    output = process.communicate()[0]
+    output = get_stat("system", "")
     stats = "<b>Statistika:</b>\n" + "\n" + output + "\n".join(
         [mod.__stats__() for mod in STATS])
     result = re.sub(r'(\d+)', r'<code>\1</code>', stats)
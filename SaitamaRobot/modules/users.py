@@ -1,11 +1,16 @@
 from io import BytesIO
-from time import sleep
 
 import SaitamaRobot.modules.sql.users_sql as sql
 from SaitamaRobot import DEV_USERS, LOGGER, OWNER_ID, dispatcher
-from SaitamaRobot.modules.helper_funcs.chat_status import dev_plus, sudo_plus
-from SaitamaRobot.modules.sql.users_sql import get_all_users
-from telegram import TelegramError, Update
+from SaitamaRobot.modules.helper_funcs.chat_status import (dev_plus,
+                                                           get_bot_member,
+                                                           sudo_plus)
+from SaitamaRobot.modules.helper_funcs.broadcast import (cancel_broadcast,
+                                                         resume_broadcasts,
+                                                         running_broadcasts,
+                                                         start_broadcast)
+from SaitamaRobot.modules.helper_funcs.startup import defer
+from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import (CallbackContext, CommandHandler, Filters,
                           MessageHandler, run_async)
@@ -23,18 +28,18 @@ def get_user_id(username):
     if username.startswith('@'):
         username = username[1:]
 
-    users = sql.get_userid_by_name(username)
+    user_ids = sql.get_userid_by_name(username)
 
-    if not users:
+    if not user_ids:
         return None
 
-    elif len(users) == 1:
-        return users[0].user_id
+    elif len(user_ids) == 1:
+        return user_ids[0]
 
     else:
-        for user_obj in users:
+        for user_id in user_ids:
             try:
-                userdat = dispatcher.bot.get_chat(user_obj.user_id)
+                userdat = dispatcher.bot.get_chat(user_id)
                 if userdat.username == username:
                     return userdat.id
 
@@ -53,43 +58,41 @@ def broadcast(update: Update, context: CallbackContext):
     to_send = update.effective_message.text.split(None, 1)
 
     if len(to_send) >= 2:
-        to_group = False
-        to_user = False
-        if to_send[0] == '/broadcastgroups':
-            to_group = True
-        if to_send[0] == '/broadcastusers':
-            to_user = True
-        else:
-            to_group = to_user = True
-        chats = sql.get_all_chats() or []
-        users = get_all_users()
-        failed = 0
-        failed_user = 0
-        if to_group:
-            for chat in chats:
-                try:
-                    context.bot.sendMessage(
-                        int(chat.chat_id),
-                        to_send[1],
-                        parse_mode="MARKDOWN",
-                        disable_web_page_preview=True)
-                    sleep(0.1)
-                except TelegramError:
-                    failed += 1
-        if to_user:
-            for user in users:
-                try:
-                    context.bot.sendMessage(
-                        int(user.user_id),
-                        to_send[1],
-                        parse_mode="MARKDOWN",
-                        disable_web_page_preview=True)
-                    sleep(0.1)
-                except TelegramError:
-                    failed_user += 1
+        command = to_send[0][1:].split("@")[0].lower()
+        to_group = command != "broadcastusers"
+        to_user = command != "broadcastgroups"
+        # sent page by page in the background, resumed after a restart
+        job_id = start_broadcast(context.bot, to_send[1], to_group, to_user,
+                                 update.effective_chat.id)
         update.effective_message.reply_text(
-            f"Yayım tamamlndı.\nUğursuz olan qruplar: {failed}.\nUğursuz olan istifadəçilər: {failed_user}."
-        )
+            f"Yayım #{job_id} başladı.\n"
+            f"Dayandırmaq üçün: /broadcastcancel {job_id}")
+
+
+@run_async
+@dev_plus
+def broadcast_status(update: Update, context: CallbackContext):
+    runners = running_broadcasts()
+    if not runners:
+        update.effective_message.reply_text("Hazırda heç bir yayım getmir.")
+        return
+    update.effective_message.reply_text("\n".join(
+        runner.status() for runner in runners))
+
+
+@run_async
+@dev_plus
+def broadcast_cancel(update: Update, context: CallbackContext):
+    args = context.args
+    if not args or not args[0].isdigit():
+        update.effective_message.reply_text(
+            "Yayımın nömrəsini yazın: /broadcastcancel <id>")
+        return
+    if cancel_broadcast(args[0]):
+        update.effective_message.reply_text(f"Yayım #{args[0]} dayandırılır.")
+    else:
+        update.effective_message.reply_text(
+            f"#{args[0]} nömrəli davam edən yayım yoxdur.")
 
 
 @run_async
@@ -137,8 +140,8 @@ def chats(update: Update, context: CallbackContext):
 @run_async
 def chat_checker(update: Update, context: CallbackContext):
     bot = context.bot
-    if update.effective_message.chat.get_member(
-            bot.id).can_send_messages is False:
+    if get_bot_member(update.effective_message.chat,
+                      bot.id).can_send_messages is False:
         bot.leaveChat(update.effective_message.chat.id)
 
 
@@ -165,13 +168,20 @@ BROADCAST_HANDLER = CommandHandler(
     ["broadcastall", "broadcastusers", "broadcastgroups"], broadcast)
 USER_HANDLER = MessageHandler(Filters.all & Filters.group, log_user)
 CHAT_CHECKER_HANDLER = MessageHandler(Filters.all & Filters.group, chat_checker)
+BROADCAST_STATUS_HANDLER = CommandHandler("broadcaststatus", broadcast_status)
+BROADCAST_CANCEL_HANDLER = CommandHandler("broadcastcancel", broadcast_cancel)
 CHATLIST_HANDLER = CommandHandler("groups", chats)
 
 dispatcher.add_handler(USER_HANDLER, USERS_GROUP)
 dispatcher.add_handler(BROADCAST_HANDLER)
+dispatcher.add_handler(BROADCAST_STATUS_HANDLER)
+dispatcher.add_handler(BROADCAST_CANCEL_HANDLER)
 dispatcher.add_handler(CHATLIST_HANDLER)
 dispatcher.add_handler(CHAT_CHECKER_HANDLER, CHAT_GROUP)
 
 __mod_name__ = "İstifadəçi"
 __handlers__ = [(USER_HANDLER, USERS_GROUP), BROADCAST_HANDLER,
+                BROADCAST_STATUS_HANDLER, BROADCAST_CANCEL_HANDLER,
                 CHATLIST_HANDLER]
+
+defer("resume_broadcasts", resume_broadcasts, dispatcher.bot)
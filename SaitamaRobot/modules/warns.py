@@ -345,18 +345,16 @@ def reply_filter(update: Update, context: CallbackContext) -> str:
     if user.id == 777000:
         return
 
-    chat_warn_filters = sql.get_chat_warn_triggers(chat.id)
     to_match = extract_text(message)
     if not to_match:
         return ""
 
-    for keyword in chat_warn_filters:
-        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            user: Optional[User] = update.effective_user
-            warn_filter = sql.get_warn_filter(chat.id, keyword)
-            return warn(user, chat, warn_filter.reply, message)
-    return ""
+    keyword = sql.get_chat_warn_matcher(chat.id).match(to_match)
+    if keyword is None:
+        return ""
+
+    warn_filter = sql.get_warn_filter(chat.id, keyword)
+    return warn(user, chat, warn_filter.reply, message)
 
 
 @run_async
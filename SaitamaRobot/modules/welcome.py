@@ -6,13 +6,15 @@ from functools import partial
 
 import SaitamaRobot.modules.sql.welcome_sql as sql
 from SaitamaRobot import (DEV_USERS, LOGGER, OWNER_ID, DRAGONS, DEMONS, TIGERS,
-                          WOLVES, sw, dispatcher, JOIN_LOGGER)
+                          WOLVES, dispatcher, JOIN_LOGGER)
+from SaitamaRobot.modules.helper_funcs.aio import get_actions
 from SaitamaRobot.modules.helper_funcs.chat_status import (
     is_user_ban_protected,
     user_admin,
 )
 from SaitamaRobot.modules.helper_funcs.misc import build_keyboard, revert_buttons
 from SaitamaRobot.modules.helper_funcs.msg_types import get_welcome_type
+from SaitamaRobot.modules.helper_funcs.spamwatch_cache import get_sw_ban
 from SaitamaRobot.modules.helper_funcs.string_handling import (
     escape_invalid_curly_brackets,
     markdown_parser,
@@ -70,7 +72,8 @@ def send(update, message, keyboard, backup_message):
     # Clean service welcome
     if cleanserv:
         try:
-            dispatcher.bot.delete_message(chat.id, update.message.message_id)
+            get_actions(dispatcher.bot, __name__).delete_message(
+                chat.id, update.message.message_id)
         except BadRequest:
             pass
         reply = False
@@ -133,6 +136,7 @@ def new_member(update: Update, context: CallbackContext):
     chat = update.effective_chat
     user = update.effective_user
     msg = update.effective_message
+    actions = get_actions(bot, __name__)
 
     should_welc, cust_welcome, cust_content, welc_type = sql.get_welc_pref(
         chat.id)
@@ -150,10 +154,9 @@ def new_member(update: Update, context: CallbackContext):
         welcome_bool = True
         media_wel = False
 
-        if sw is not None:
-            sw_ban = sw.get_ban(new_mem.id)
-            if sw_ban:
-                return
+        sw_ban = get_sw_ban(new_mem.id)
+        if sw_ban:
+            return
 
         if should_welc:
 
@@ -162,8 +165,7 @@ def new_member(update: Update, context: CallbackContext):
             # Clean service welcome
             if cleanserv:
                 try:
-                    dispatcher.bot.delete_message(chat.id,
-                                                  update.message.message_id)
+                    actions.delete_message(chat.id, update.message.message_id)
                 except BadRequest:
                     pass
                 reply = False
@@ -313,7 +315,7 @@ def new_member(update: Update, context: CallbackContext):
         if user.id == new_mem.id:
             if should_mute:
                 if welc_mutes == "soft":
-                    bot.restrict_chat_member(
+                    actions.restrict_chat_member(
                         chat.id,
                         new_mem.id,
                         permissions=ChatPermissions(
@@ -367,7 +369,7 @@ def new_member(update: Update, context: CallbackContext):
                         parse_mode=ParseMode.HTML,
                         reply_to_message_id=reply,
                     )
-                    bot.restrict_chat_member(
+                    actions.restrict_chat_member(
                         chat.id,
                         new_mem.id,
                         permissions=ChatPermissions(
@@ -403,7 +405,7 @@ def new_member(update: Update, context: CallbackContext):
             prev_welc = sql.get_clean_pref(chat.id)
             if prev_welc:
                 try:
-                    bot.delete_message(chat.id, prev_welc)
+                    actions.delete_message(chat.id, prev_welc)
                 except BadRequest:
                     pass
 
@@ -457,8 +459,8 @@ def left_member(update: Update, context: CallbackContext):
         # Clean service welcome
         if cleanserv:
             try:
-                dispatcher.bot.delete_message(chat.id,
-                                              update.message.message_id)
+                get_actions(bot, __name__).delete_message(
+                    chat.id, update.message.message_id)
             except BadRequest:
                 pass
             reply = False
@@ -467,10 +469,9 @@ def left_member(update: Update, context: CallbackContext):
         if left_mem:
 
             # Thingy for spamwatched users
-            if sw is not None:
-                sw_ban = sw.get_ban(left_mem.id)
-                if sw_ban:
-                    return
+            sw_ban = get_sw_ban(left_mem.id)
+            if sw_ban:
+                return
 
             # Dont say goodbyes to gbanned users
             if is_user_gbanned(left_mem.id):
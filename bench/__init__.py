@@ -0,0 +1 @@
+"""Offline benchmarks and load tools, see the module docstrings."""
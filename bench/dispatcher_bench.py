@@ -0,0 +1,293 @@
+"""
+Replays updates through the real dispatcher with every module loaded, against
+a stub Bot API and a local database, and reports throughput, latency per
+handler group and DB / API calls per update.
+
+    python -m bench.dispatcher_bench --updates 20000
+    python -m bench.dispatcher_bench --capture updates.jsonl.gz --json after.json
+    python -m bench.dispatcher_bench --capture updates.jsonl.gz --speed 1
+
+Run it from the repository root. The default database is a temporary SQLite
+file, pass --db postgresql://... (a scratch database!) for numbers closer to
+production. Save --json files from two commits to compare them.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from bench.stub_bot import install_stub, prepare_env
+from bench.updates import SyntheticUpdates, load_capture
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class GroupTimer:
+    """
+    Dispatcher thread time of each update per handler group, and the time
+    of the @run_async callbacks the handlers of a group started.
+    """
+
+    def __init__(self):
+        self.sync = defaultdict(list)
+        self.run = defaultdict(list)
+        self.current = {}
+        self.promises = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def install(self, dispatcher):
+        for group, handlers in dispatcher.handlers.items():
+            for handler in handlers:
+                self._wrap(handler, group)
+
+        run_async = dispatcher.run_async
+
+        def timed_run_async(func, *args, **kwargs):
+            group = getattr(self.local, "group", None)
+
+            def timed(*f_args, **f_kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*f_args, **f_kwargs)
+                finally:
+                    with self.lock:
+                        self.run[group].append(time.perf_counter() - start)
+
+            timed.__name__ = func.__name__
+            promise = run_async(timed, *args, **kwargs)
+            with self.lock:
+                self.promises.append(promise)
+            return promise
+
+        dispatcher.run_async = timed_run_async
+
+    def _wrap(self, handler, group):
+        check_update = handler.check_update
+        handle_update = handler.handle_update
+
+        def check(update):
+            start = time.perf_counter()
+            try:
+                return check_update(update)
+            finally:
+                self.current[group] = self.current.get(
+                    group, 0) + time.perf_counter() - start
+
+        def handle(update, dispatcher, check_result, context=None):
+            self.local.group = group
+            start = time.perf_counter()
+            try:
+                return handle_update(update, dispatcher, check_result, context)
+            finally:
+                self.local.group = None
+                self.current[group] = self.current.get(
+                    group, 0) + time.perf_counter() - start
+
+        handler.check_update = check
+        handler.handle_update = handle
+
+    def process(self, dispatcher, update):
+        self.current = {}
+        dispatcher.process_update(update)
+        for group, seconds in self.current.items():
+            self.sync[group].append(seconds)
+
+    def wait(self):
+        with self.lock:
+            promises, self.promises = self.promises, []
+        for promise in promises:
+            promise.done.wait()
+
+    def reset(self):
+        self.wait()
+        self.sync.clear()
+        self.run.clear()
+
+
+def group_names():
+    """handler group -> the *_GROUP constants the modules use for it"""
+    names = defaultdict(list)
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("SaitamaRobot.modules.") or module is None:
+            continue
+        for attr, value in vars(module).items():
+            if (attr.endswith("_GROUP") and attr != "DEFAULT_GROUP" and
+                    isinstance(value, int)):
+                label = "{}.{}".format(name.rsplit(".", 1)[-1], attr)
+                if label not in names[value]:
+                    names[value].append(label)
+    return names
+
+
+def run(args):
+    db_uri = args.db
+    if not db_uri:
+        db_dir = tempfile.mkdtemp(prefix="saitama_bench_")
+        db_uri = "sqlite:///" + os.path.join(db_dir, "bench.db")
+    prepare_env(db_uri)
+
+    from SaitamaRobot import dispatcher
+    stub = install_stub(dispatcher.bot, args.api_latency)
+
+    import SaitamaRobot.__main__  # noqa: F401, loads every module
+    import SaitamaRobot.modules.sql.users_sql as users_sql
+    from SaitamaRobot.modules.sql import BASE
+    from sqlalchemy import event
+    from telegram import Update
+
+    queries = Counter()
+
+    def count_query(*_):
+        queries["total"] += 1
+
+    event.listen(BASE.metadata.bind, "after_cursor_execute", count_query)
+
+    timer = GroupTimer()
+    timer.install(dispatcher)
+    # start() spawns the @run_async workers, updates are fed directly below
+    ready = threading.Event()
+    threading.Thread(
+        target=dispatcher.start, kwargs={"ready": ready}, daemon=True).start()
+    ready.wait()
+
+    arrivals = []
+    if args.capture:
+        captured = list(load_capture(args.capture, args.updates))
+        stream = [(kind, data) for _, kind, data in captured]
+        arrivals = [arrived for arrived, _, _ in captured]
+    else:
+        synthetic = SyntheticUpdates(args.chats, args.users, args.seed)
+        for data in synthetic.setup():
+            timer.process(dispatcher, Update.de_json(data, dispatcher.bot))
+        stream = list(synthetic.stream(args.updates))
+    if args.speed and (not arrivals or None in arrivals):
+        raise SystemExit("--speed needs a capture written by /capture")
+
+    # parse up front, the benchmark is about the handlers
+    updates = [(kind, Update.de_json(data, dispatcher.bot))
+               for kind, data in stream]
+
+    for kind, update in updates[:args.warmup]:
+        timer.process(dispatcher, update)
+    updates = updates[args.warmup:]
+    arrivals = arrivals[args.warmup:]
+    timer.reset()
+    users_sql.flush_users()
+    queries.clear()
+    api_before = stub.total_calls()
+
+    kinds = Counter()
+    behind = []  # with --speed, how late each update was fed in
+    start = time.perf_counter()
+    for index, (kind, update) in enumerate(updates):
+        if args.speed:
+            due = start + (arrivals[index] - arrivals[0]) / args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            behind.append(max(0, -delay))
+        kinds[kind] += 1
+        timer.process(dispatcher, update)
+    timer.wait()
+    users_sql.flush_users()
+    elapsed = time.perf_counter() - start
+
+    total = len(updates) or 1
+    names = group_names()
+    groups = {}
+    ran_groups = {group for group in timer.run if group is not None}
+    for group in sorted(set(timer.sync) | ran_groups):
+        sync, ran = timer.sync.get(group, []), timer.run.get(group, [])
+        groups[str(group)] = {
+            "names": names.get(group, []),
+            "updates": len(sync),
+            "p50_ms": percentile(sync, 0.5) * 1000,
+            "p99_ms": percentile(sync, 0.99) * 1000,
+            "async_runs": len(ran),
+            "async_p50_ms": percentile(ran, 0.5) * 1000,
+            "async_p99_ms": percentile(ran, 0.99) * 1000,
+        }
+    return {
+        "updates": len(updates),
+        "kinds": dict(kinds),
+        "seconds": elapsed,
+        "updates_per_second": len(updates) / elapsed if elapsed else 0,
+        "db_queries_per_update": queries["total"] / total,
+        "api_calls_per_update": (stub.total_calls() - api_before) / total,
+        "api_calls": dict(stub.calls),
+        "behind_p50_ms": percentile(behind, 0.5) * 1000,
+        "behind_p99_ms": percentile(behind, 0.99) * 1000,
+        "groups": groups,
+    }
+
+
+def print_report(result):
+    print("{updates} updates in {seconds:.2f}s: {updates_per_second:.1f} "
+          "updates/s".format(**result))
+    print("kinds: " + ", ".join(
+        "{} {}".format(kind, count)
+        for kind, count in sorted(result["kinds"].items())))
+    print("DB queries/update: {:.2f}   API calls/update: {:.2f}".format(
+        result["db_queries_per_update"], result["api_calls_per_update"]))
+    if result["behind_p99_ms"]:
+        print("behind the recorded pace: p50 {:.1f}ms, p99 {:.1f}ms".format(
+            result["behind_p50_ms"], result["behind_p99_ms"]))
+    print()
+    print("{:>6} {:>8} {:>9} {:>9} {:>7} {:>9} {:>9}  {}".format(
+        "group", "updates", "p50 ms", "p99 ms", "async", "a.p50 ms",
+        "a.p99 ms", "constants"))
+    for group, stats in result["groups"].items():
+        print("{:>6} {:>8} {:>9.3f} {:>9.3f} {:>7} {:>9.3f} {:>9.3f}  {}".
+              format(group, stats["updates"], stats["p50_ms"],
+                     stats["p99_ms"], stats["async_runs"],
+                     stats["async_p50_ms"], stats["async_p99_ms"],
+                     ", ".join(stats["names"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--capture", help="replay a recorded .jsonl(.gz) instead")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="replay a /capture at this multiple of the recorded pace, "
+        "0 for as fast as possible")
+    parser.add_argument(
+        "--db", help="database URL, a temporary SQLite file by default")
+    parser.add_argument(
+        "--api-latency",
+        type=float,
+        default=0.0,
+        help="seconds every stub Bot API call takes")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(result, out, indent=2)
+    sys.stdout.flush()
+    # the dispatcher workers and the module threads aren't daemons
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
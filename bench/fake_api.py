@@ -0,0 +1,448 @@
+"""
+A local Telegram Bot API over HTTP, to load test the real updater (long
+polling or webhook) and PTB's Request pool without the network.
+
+    python -m bench.fake_api --profile 50:30,200:60 --latency 0.05 --rate-limit 0.01
+
+then run the bot with BOT_API_URL=http://127.0.0.1:8081/bot, or let
+bench.updater_load start both. Updates come from SyntheticUpdates (or a
+--capture) at the rates of the profile, a list of updates/s:seconds phases.
+The load starts once the bot is ready: its first long poll, or setWebhook.
+A /capture can also be replayed at its recorded pace with --speed.
+
+Other methods are answered like StubRequest does, after --latency seconds,
+and a --rate-limit share of them get a 429 instead. The report has the calls
+and timings per method, how long updates waited to be delivered, and how
+long after an update the bot replied to it or deleted it.
+"""
+import argparse
+import cgi
+import json
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from bench.stub_bot import MESSAGE_METHODS, StubRequest
+from bench.updates import SyntheticUpdates, load_capture
+
+# never rate limited or delayed, they drive the load rather than answer it
+CONTROL_METHODS = ("getUpdates", "setWebhook", "deleteWebhook", "getMe",
+                   "getMyCommands", "getWebhookInfo")
+
+
+def parse_profile(text):
+    """"50:30,200:60" -> [(50.0, 30.0), (200.0, 60.0)]"""
+    phases = []
+    for phase in text.split(","):
+        rate, seconds = phase.split(":")
+        phases.append((float(rate), float(seconds)))
+    return phases
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _timings(values):
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.5) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": max(values, default=0) * 1000,
+    }
+
+
+class FakeBotAPI:
+
+    def __init__(self, source, phases, latency=0.0, rate_limit=0.0,
+                 retry_after=1, drain=10.0, webhook_connections=40, seed=1,
+                 speed=0):
+        # (setup updates, stream of updates), or of (arrival, update) with
+        # a speed to replay them at instead of following the phases
+        self.source = source
+        self.phases = phases
+        self.speed = speed
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.drain = drain
+        self.random = random.Random(seed)
+        self.stub = StubRequest()
+
+        self.cond = threading.Condition()
+        self.pending = deque()  # (update_id, produced_at, data)
+        self.update_id = 0
+        self.delivered_upto = 0
+        self.webhook_url = None
+        self.webhook_pool = ThreadPoolExecutor(
+            max_workers=webhook_connections, thread_name_prefix="webhook")
+
+        self.lock = threading.Lock()
+        self.calls = defaultdict(list)  # method -> seconds it took
+        self.rate_limited = Counter()
+        self.produced_at = {}  # (chat_id, message_id) -> time
+        self.delivery = []
+        self.replies = []
+        self.webhook_posts = []
+        self.webhook_errors = 0
+        self.phase_counts = []
+
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        threading.Thread(
+            target=self._produce, name="fake_api_load", daemon=True).start()
+
+    # load
+
+    def _push(self, data):
+        now = time.perf_counter()
+        with self.cond:
+            self.update_id += 1
+            data = dict(data, update_id=self.update_id)
+            message = data.get("message") or data.get("edited_message")
+            if message:
+                with self.lock:
+                    self.produced_at[(str(message["chat"]["id"]),
+                                      message["message_id"])] = now
+            if self.webhook_url:
+                self.webhook_pool.submit(self._post_webhook, self.webhook_url,
+                                         data, now)
+            else:
+                self.pending.append((self.update_id, now, data))
+                self.cond.notify_all()
+
+    def _produce(self):
+        self.started.wait()
+        setup, stream = self.source
+        for data in setup:
+            self._push(data)
+        if self.speed:
+            self._replay(stream)
+            self.phases = []
+        for rate, seconds in self.phases:
+            start = time.perf_counter()
+            produced = 0
+            while rate and time.perf_counter() - start < seconds:
+                due = start + produced / rate
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                data = next(stream, None)
+                if data is None:
+                    break
+                self._push(data)
+                produced += 1
+            if not rate:
+                time.sleep(seconds)
+            self.phase_counts.append((rate, seconds, produced,
+                                      time.perf_counter() - start))
+
+        deadline = time.perf_counter() + self.drain
+        with self.cond:
+            while self.pending and time.perf_counter() < deadline:
+                self.cond.wait(deadline - time.perf_counter())
+        # the last replies can still be on their way
+        time.sleep(min(self.drain, 1))
+        self.finished.set()
+
+    def _replay(self, stream):
+        start = time.perf_counter()
+        first = arrived = None
+        produced = 0
+        for arrived, data in stream:
+            if first is None:
+                first = arrived
+            delay = start + (arrived - first) / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._push(data)
+            produced += 1
+        recorded = (arrived - first) / self.speed if produced else 0
+        self.phase_counts.append(
+            (produced / recorded if recorded else 0, recorded, produced,
+             time.perf_counter() - start))
+
+    def _post_webhook(self, url, data, produced):
+        request = urllib.request.Request(
+            url, json.dumps(data).encode(),
+            {"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            urllib.request.urlopen(request, timeout=30).read()
+        except Exception:
+            with self.lock:
+                self.webhook_errors += 1
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.webhook_posts.append(now - start)
+            self.delivery.append(start - produced)
+
+    # methods
+
+    def get_updates(self, data):
+        offset = int(data.get("offset") or 0)
+        limit = int(data.get("limit") or 100)
+        timeout = float(data.get("timeout") or 0)
+        if timeout:
+            self.started.set()
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            while self.pending and self.pending[0][0] < offset:
+                self.pending.popleft()
+            self.cond.notify_all()
+            while not self.pending and time.perf_counter() < deadline:
+                self.cond.wait(deadline - time.perf_counter())
+            batch = list(self.pending)[:limit]
+            now = time.perf_counter()
+            fresh = [now - produced for update_id, produced, _ in batch
+                     if update_id > self.delivered_upto]
+            if batch:
+                self.delivered_upto = max(self.delivered_upto, batch[-1][0])
+        with self.lock:
+            self.delivery.extend(fresh)
+        return [data for _, _, data in batch]
+
+    def set_webhook(self, data):
+        with self.cond:
+            self.webhook_url = data.get("url") or None
+        if self.webhook_url:
+            self.started.set()
+        return True
+
+    def _answered(self, method, data):
+        """Record how long after its update the bot replied or deleted."""
+        if method == "deleteMessage":
+            message_id = data.get("message_id")
+        elif method in MESSAGE_METHODS:
+            message_id = data.get("reply_to_message_id")
+        else:
+            return
+        if message_id is None:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            produced = self.produced_at.pop(
+                (str(data.get("chat_id")), int(message_id)), None)
+            if produced is not None:
+                self.replies.append(now - produced)
+
+    def call(self, method, data):
+        """(HTTP status, response body)"""
+        start = time.perf_counter()
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self.get_updates(data)}
+        if method in ("setWebhook", "deleteWebhook"):
+            if method == "deleteWebhook":
+                data = {}
+            return 200, {"ok": True, "result": self.set_webhook(data)}
+        if method not in CONTROL_METHODS:
+            if self.latency:
+                time.sleep(self.latency)
+            if self.rate_limit and self.random.random() < self.rate_limit:
+                with self.lock:
+                    self.rate_limited[method] += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after {}".format(
+                        self.retry_after),
+                    "parameters": {
+                        "retry_after": self.retry_after
+                    },
+                }
+        result = self.stub.answer(method, data)
+        self._answered(method, data)
+        with self.lock:
+            self.calls[method].append(time.perf_counter() - start)
+        return 200, {"ok": True, "result": result}
+
+    def report(self):
+        with self.lock:
+            return {
+                "phases": [{
+                    "rate": rate,
+                    "seconds": seconds,
+                    "produced": produced,
+                    "achieved_rate": produced / elapsed if elapsed else 0,
+                } for rate, seconds, produced, elapsed in self.phase_counts],
+                "updates": self.update_id,
+                "undelivered": len(self.pending),
+                "delivery": _timings(self.delivery),
+                "replies": _timings(self.replies),
+                "webhook_posts": _timings(self.webhook_posts),
+                "webhook_errors": self.webhook_errors,
+                "methods": {
+                    method: dict(
+                        _timings(times),
+                        rate_limited=self.rate_limited.get(method, 0))
+                    for method, times in sorted(self.calls.items())
+                },
+            }
+
+
+class BotAPIRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive, PTB's urllib3 pool reuses its connections
+    protocol_version = "HTTP/1.1"
+
+    def _data(self):
+        url = urlsplit(self.path)
+        data = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = cgi.FieldStorage(
+                fp=self.rfile,
+                headers=self.headers,
+                environ={
+                    "REQUEST_METHOD": "POST",
+                    "CONTENT_TYPE": content_type,
+                    "CONTENT_LENGTH": str(length),
+                })
+            for key in form.keys():
+                field = form[key]
+                data[key] = field.value if field.filename is None else b""
+        elif length:
+            body = self.rfile.read(length)
+            if content_type.startswith("application/json"):
+                data.update(json.loads(body or b"{}"))
+            else:
+                data.update(parse_qsl(body.decode()))
+        return url.path.rsplit("/", 1)[-1], data
+
+    def do_POST(self):
+        method, data = self._data()
+        status, body = self.server.api.call(method, data)
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(api, host="127.0.0.1", port=8081):
+    server = ThreadingHTTPServer((host, port), BotAPIRequestHandler)
+    server.daemon_threads = True
+    server.api = api
+    threading.Thread(
+        target=server.serve_forever, name="fake_api", daemon=True).start()
+    return server
+
+
+def print_report(report):
+    for phase in report["phases"]:
+        print("phase {rate:g}/s for {seconds:g}s: {produced} updates, "
+              "{achieved_rate:.1f}/s".format(**phase))
+    print("{} updates, {} never fetched".format(report["updates"],
+                                                report["undelivered"]))
+    for name in ("delivery", "replies", "webhook_posts"):
+        stats = report[name]
+        if stats["count"]:
+            print("{:<14} {count:>7}  p50 {p50_ms:8.1f}ms  p99 {p99_ms:8.1f}ms"
+                  "  max {max_ms:8.1f}ms".format(name, **stats))
+    if report["webhook_errors"]:
+        print("webhook errors: {}".format(report["webhook_errors"]))
+    print()
+    print("{:<24} {:>7} {:>9} {:>9} {:>6}".format("method", "calls",
+                                                  "p50 ms", "p99 ms", "429"))
+    for method, stats in report["methods"].items():
+        print("{:<24} {:>7} {:>9.1f} {:>9.1f} {:>6}".format(
+            method, stats["count"], stats["p50_ms"], stats["p99_ms"],
+            stats["rate_limited"]))
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument(
+        "--profile",
+        default="50:30",
+        help="updates/s:seconds phases, comma separated")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--capture", help="send a recorded .jsonl(.gz) instead")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="send a /capture at this multiple of its recorded pace "
+        "instead of following the profile")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds every answered call takes")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="share of the calls answered with a 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument(
+        "--drain",
+        type=float,
+        default=10.0,
+        help="seconds to wait for the bot to catch up at the end")
+    parser.add_argument("--webhook-connections", type=int, default=40)
+    parser.add_argument("--report", help="also write the report here")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.capture and args.speed:
+        source = ((), ((arrived, data)
+                       for arrived, _, data in load_capture(args.capture)))
+    elif args.capture:
+        source = ((), (data for _, _, data in load_capture(args.capture)))
+    else:
+        synthetic = SyntheticUpdates(args.chats, args.users, args.seed)
+        # an endless stream, the profile decides how much of it is sent
+        stream = (data for _, data in iter(synthetic.one, None))
+        source = (synthetic.setup(), stream)
+
+    api = FakeBotAPI(
+        source,
+        parse_profile(args.profile),
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        drain=args.drain,
+        webhook_connections=args.webhook_connections,
+        seed=args.seed,
+        speed=args.speed)
+    server = serve(api, args.host, args.port)
+    print("Fake Bot API on http://{}:{}/bot, waiting for the bot".format(
+        args.host, args.port))
+    sys.stdout.flush()
+
+    api.finished.wait()
+    server.shutdown()
+    report = api.report()
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as out:
+            json.dump(report, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Offline stand-ins for the bot's environment: config through ENV, a local
+database and a Request that answers Bot API calls without the network.
+
+prepare_env() has to run before anything imports SaitamaRobot.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+BOT_ID = 100
+OWNER_ID = 1
+ADMIN_ID = 2  # creator of every benchmark group
+
+# Bot API methods answered with a message object
+MESSAGE_METHODS = ("sendMessage", "forwardMessage", "sendPhoto", "sendAudio",
+                   "sendDocument", "sendSticker", "sendVideo", "sendAnimation",
+                   "sendVoice", "sendVideoNote", "sendLocation", "sendVenue",
+                   "sendContact", "sendPoll", "sendDice", "editMessageText",
+                   "editMessageCaption", "editMessageReplyMarkup")
+
+
+def prepare_env(db_uri, **overrides):
+    """ENV style config for an offline run, existing variables win."""
+    defaults = {
+        "ENV": "1",
+        "TOKEN": "{}:benchmark".format(BOT_ID),
+        "OWNER_ID": str(OWNER_ID),
+        "DATABASE_URL": db_uri,
+        "API_ID": "1",
+        "API_HASH": "0" * 32,
+        # sends must not be paced by the Telegram limits here
+        "SEND_RATE_GLOBAL": "1000000",
+        "SEND_RATE_CHAT": "1000000",
+        "SEND_RATE_GROUP": "1000000",
+        "NO_LOAD": "translation",
+    }
+    if db_uri.startswith("sqlite"):
+        # sqlite takes one writer at a time anyway
+        defaults["WORKERS"] = "1"
+    defaults.update(overrides)
+    for key, value in defaults.items():
+        os.environ.setdefault(key, str(value))
+
+
+def _user(user_id):
+    return {
+        "id": user_id,
+        "is_bot": user_id == BOT_ID,
+        "first_name": "bench_{}".format(user_id),
+        "username": "bench_bot" if user_id == BOT_ID else
+                    "bench_{}".format(user_id),
+    }
+
+
+def _chat(chat_id):
+    # "@username" chats are answered as some supergroup
+    chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else -1
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": "bench"}
+    return {
+        "id": chat_id,
+        "type": "supergroup",
+        "title": "bench {}".format(chat_id)
+    }
+
+
+def _member(user_id, chat_id):
+    if str(chat_id).isdigit():
+        status = "member"
+    elif user_id == ADMIN_ID:
+        status = "creator"
+    elif user_id == BOT_ID:
+        status = "administrator"
+    else:
+        status = "member"
+    member = {"user": _user(user_id), "status": status}
+    if status == "administrator":
+        member.update({
+            "can_be_edited": False,
+            "can_change_info": True,
+            "can_delete_messages": True,
+            "can_invite_users": True,
+            "can_restrict_members": True,
+            "can_pin_messages": True,
+            "can_promote_members": True,
+        })
+    return member
+
+
+class StubRequest:
+    """
+    Takes the place of telegram.utils.request.Request. Every call is counted
+    and answered with a plausible result after `latency` seconds.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.message_id = 0
+
+    @property
+    def con_pool_size(self):
+        return 1
+
+    def stop(self):
+        pass
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def answer(self, method, data):
+        chat_id = data.get("chat_id", 0)
+        user_id = int(data.get("user_id", 0) or 0)
+        if method == "getMe":
+            return _user(BOT_ID)
+        if method in MESSAGE_METHODS:
+            with self.lock:
+                self.message_id += 1
+                message_id = self.message_id
+            return {
+                "message_id": data.get("message_id", message_id),
+                "date": int(time.time()),
+                "chat": _chat(chat_id or -1),
+                "from": _user(BOT_ID),
+                "text": str(data.get("text", "")),
+            }
+        if method == "getChat":
+            return _chat(chat_id)
+        if method == "getChatMember":
+            return _member(user_id, chat_id)
+        if method == "getChatAdministrators":
+            return [_member(ADMIN_ID, chat_id), _member(BOT_ID, chat_id)]
+        if method == "getChatMembersCount":
+            return 100
+        if method == "getUserProfilePhotos":
+            return {"total_count": 0, "photos": []}
+        if method == "exportChatInviteLink":
+            return "https://t.me/joinchat/benchmark"
+        if method in ("getUpdates", "getMyCommands"):
+            return []
+        return True
+
+    def post(self, url, data, timeout=None):
+        method = url.rsplit("/", 1)[-1]
+        with self.lock:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.answer(method, data or {})
+
+    def get(self, url, timeout=None):
+        return self.post(url, {}, timeout)
+
+    def retrieve(self, url, timeout=None):
+        return b""
+
+    def download(self, url, filename, timeout=None):
+        with open(filename, "wb"):
+            pass
+
+
+def install_stub(bot, latency=0.0):
+    bot._request = StubRequest(latency)
+    return bot._request
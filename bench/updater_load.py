@@ -0,0 +1,83 @@
+"""
+Runs the bot's real updater, long polling or with a webhook, against
+bench.fake_api in a separate process and prints the fake API's report.
+
+    python -m bench.updater_load --profile 50:30,200:60 --latency 0.05
+    python -m bench.updater_load --webhook --profile 100:60
+
+Every bench.fake_api option is accepted. Like the dispatcher benchmark it
+uses a temporary SQLite file unless --db is given.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.fake_api import add_arguments
+from bench.stub_bot import prepare_env
+
+
+def _wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("the fake Bot API didn't start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    add_arguments(parser)
+    parser.add_argument("--db", help="database URL")
+    parser.add_argument("--webhook", action="store_true")
+    parser.add_argument(
+        "--webhook-port",
+        type=int,
+        default=5000,
+        help="where the bot listens for the webhook")
+    args = parser.parse_args()
+
+    # the fake API gets its own options back, it only takes valued ones
+    api_parser = argparse.ArgumentParser(allow_abbrev=False)
+    add_arguments(api_parser)
+    api_args = []
+    for key, value in vars(api_parser.parse_known_args()[0]).items():
+        if value is not None:
+            api_args += ["--" + key.replace("_", "-"), str(value)]
+    fake_api = subprocess.Popen([sys.executable, "-m", "bench.fake_api"] +
+                                api_args)
+    _wait_for_port(args.host, args.port)
+
+    db_uri = args.db
+    if not db_uri:
+        db_dir = tempfile.mkdtemp(prefix="saitama_load_")
+        db_uri = "sqlite:///" + os.path.join(db_dir, "bench.db")
+    prepare_env(
+        db_uri,
+        BOT_API_URL="http://{}:{}/bot".format(args.host, args.port),
+        PORT=args.webhook_port,
+        URL="http://127.0.0.1:{}/".format(args.webhook_port))
+
+    from SaitamaRobot import TOKEN, URL, PORT, updater
+    import SaitamaRobot.__main__  # noqa: F401, loads every module
+
+    # as in __main__.main, without telethon which needs the real network
+    if args.webhook:
+        updater.start_webhook(listen="127.0.0.1", port=PORT, url_path=TOKEN)
+        updater.bot.set_webhook(url=URL + TOKEN)
+    else:
+        updater.start_polling(timeout=15, read_latency=4, clean=True)
+
+    code = fake_api.wait()
+    sys.stdout.flush()
+    os._exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Streams of raw update dicts for the benchmarks: synthetic traffic, or a
+recorded JSON lines file (optionally gzip compressed).
+"""
+import gzip
+import json
+import random
+import time
+
+from bench.stub_bot import ADMIN_ID, BOT_ID
+
+WORDS = ("salam", "necəsən", "bu", "gün", "hava", "çox", "gözəl", "qrup",
+         "bot", "mesaj", "link", "https://example.com", "hello", "spamword")
+
+# sent by the group creator first, so the filters, blacklists, notes and
+# flood settings have something to match against
+SETUP_COMMANDS = ("/setflood 8", "/filter hello Salam!",
+                  "/addblacklist spamword", "/save qayda Qrupun qaydaları",
+                  "/setrules Qaydalar", "/warnlimit 3", "/lock url")
+
+USER_COMMANDS = ("/rules", "/notes", "/flood", "/id", "/locks", "/admins",
+                 "/get qayda", "#qayda", "/filters", "/warns", "/blacklist",
+                 "/ping")
+
+# kind -> weight
+DEFAULT_MIX = {
+    "text": 60,
+    "command": 10,
+    "sticker": 8,
+    "reply": 10,
+    "edit": 6,
+    "join": 4,
+    "leave": 2,
+}
+
+
+class SyntheticUpdates:
+    """Random but reproducible group traffic across `chats` groups."""
+
+    def __init__(self, chats=50, users=2000, seed=1, mix=None):
+        self.random = random.Random(seed)
+        self.chats = [-1001000000000 - i for i in range(1, chats + 1)]
+        self.users = [1000 + i for i in range(users)]
+        self.mix = mix or DEFAULT_MIX
+        self.update_id = 0
+        self.message_ids = {chat: 0 for chat in self.chats}
+
+    def _user(self, user_id):
+        return {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": "user_{}".format(user_id),
+            "username": "user_{}".format(user_id),
+        }
+
+    def _message(self, chat_id, user_id, **fields):
+        self.message_ids[chat_id] += 1
+        message = {
+            "message_id": self.message_ids[chat_id],
+            "date": int(time.time()),
+            "chat": {
+                "id": chat_id,
+                "type": "supergroup",
+                "title": "bench {}".format(chat_id),
+            },
+            "from": self._user(user_id),
+        }
+        message.update(fields)
+        return message
+
+    def _update(self, **fields):
+        self.update_id += 1
+        return dict(update_id=self.update_id, **fields)
+
+    def _text(self):
+        return " ".join(
+            self.random.choice(WORDS)
+            for _ in range(self.random.randint(1, 12)))
+
+    def setup(self):
+        for chat_id in self.chats:
+            yield self._update(message=self._message(
+                chat_id,
+                ADMIN_ID,
+                new_chat_members=[{
+                    "id": BOT_ID,
+                    "is_bot": True,
+                    "first_name": "bench",
+                    "username": "bench_bot"
+                }]))
+            for command in SETUP_COMMANDS:
+                yield self._update(
+                    message=self._message(chat_id, ADMIN_ID, text=command))
+
+    def one(self):
+        kind = self.random.choices(
+            list(self.mix), weights=list(self.mix.values()))[0]
+        chat_id = self.random.choice(self.chats)
+        user_id = self.random.choice(self.users)
+        if kind == "command":
+            return kind, self._update(message=self._message(
+                chat_id, user_id, text=self.random.choice(USER_COMMANDS)))
+        if kind == "sticker":
+            return kind, self._update(message=self._message(
+                chat_id,
+                user_id,
+                sticker={
+                    "file_id": "sticker{}".format(self.random.randint(1, 50)),
+                    "file_unique_id": "u{}".format(user_id),
+                    "width": 512,
+                    "height": 512,
+                    "is_animated": False,
+                }))
+        if kind == "reply":
+            replied = self._message(chat_id, self.random.choice(self.users),
+                                    text=self._text())
+            return kind, self._update(message=self._message(
+                chat_id, user_id, text=self._text(),
+                reply_to_message=replied))
+        if kind == "edit":
+            message = self._message(chat_id, user_id, text=self._text())
+            message["edit_date"] = message["date"]
+            return kind, self._update(edited_message=message)
+        if kind == "join":
+            return kind, self._update(message=self._message(
+                chat_id, user_id, new_chat_members=[self._user(user_id)]))
+        if kind == "leave":
+            return kind, self._update(message=self._message(
+                chat_id, user_id, left_chat_member=self._user(user_id)))
+        return "text", self._update(
+            message=self._message(chat_id, user_id, text=self._text()))
+
+    def stream(self, count):
+        for _ in range(count):
+            yield self.one()
+
+
+def _kind(data):
+    message = data.get("message") or {}
+    if "edited_message" in data:
+        return "edit"
+    if "callback_query" in data:
+        return "callback"
+    if message.get("new_chat_members"):
+        return "join"
+    if message.get("left_chat_member"):
+        return "leave"
+    if message.get("sticker"):
+        return "sticker"
+    if message.get("reply_to_message"):
+        return "reply"
+    if message.get("text", "").startswith(("/", "!")):
+        return "command"
+    return "text" if message else "other"
+
+
+def load_capture(path, count=None):
+    """
+    (arrival time or None, kind, update) from a recorded file: one Bot API
+    update per line, or {"t": arrival, "update": ...} lines as /capture
+    writes them.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as capture:
+        for index, line in enumerate(capture):
+            if count is not None and index >= count:
+                return
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            arrived = None
+            if "update" in data:
+                arrived, data = data.get("t"), data["update"]
+            yield arrived, _kind(data), data
+
+
+def load_updates(path, count=None):
+    for _, kind, data in load_capture(path, count):
+        yield kind, data